@@ -1,23 +1,96 @@
+import argparse
+import sys
 import pygame
-from src.constants import FPS, TILE_SIZE, UI_H
+from src.actionlog import ActionLog
+from src.events import EventLog, JsonlSink, TextSink
+from src.snapshot import AutoSaver
+from src.startup import StartupTimer
+from src.constants import FPS, UI_H, SCREEN_W, SCREEN_H
+from src.defs import DefsWatcher
 from src.ui import UI
 from src.game import Game
+from src.grid import Grid
+from src.mapfile import open_map
+from src.mapgen import generate
+from src.netclient import NetClient, RemoteGame
 from src.units import init_assets
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--record", metavar="FILE", help="write a binary action log")
+    ap.add_argument("--autosave", metavar="DIR", help="save a snapshot every turn")
+    ap.add_argument("--resume", action="store_true", help="continue from the latest autosave")
+    ap.add_argument("--connect", metavar="HOST:PORT", help="play on a match server")
+    ap.add_argument("--match", default="default")
+    ap.add_argument("--team", type=int, default=0)
+    ap.add_argument("--events", metavar="FILE", help="append game events as JSON lines")
+    ap.add_argument("--map-seed", type=int, help="play on a generated map")
+    ap.add_argument("--size", type=int, default=64, help="generated map side in cells")
+    ap.add_argument("--map", metavar="FILE", help="play on a chunked map file")
+    ap.add_argument("--startup-report", action="store_true", help="print startup phase timings")
+    args = ap.parse_args()
+    if args.size < 2:
+        ap.error("--size must be at least 2, one column per team")
+
+    timer = StartupTimer() if args.startup_report else None
     pygame.init()
     pygame.display.set_caption("GRIDS v0.1")
     clock = pygame.time.Clock()
 
     ui = UI()
-    game = Game(ui)
+    if timer:
+        timer.mark("pygame init")
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        client = NetClient(host or "127.0.0.1", int(port))
+        client.start()
+        game = RemoteGame(ui, client, args.team, args.match)
+        screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+        init_assets()
+        run_loop(game, screen, clock, timer, DefsWatcher())
+        client.close()
+        pygame.quit()
+        return
+
+    sinks = [TextSink(sys.stdout)]
+    if args.events:
+        sinks.append(JsonlSink(args.events))
+    events = EventLog(sinks)
 
-    screen = pygame.display.set_mode(
-        (game.grid.w * TILE_SIZE, game.grid.h * TILE_SIZE + UI_H)
-    )
+    if args.map:
+        grid, units = open_map(args.map)
+        game = Game(ui, units=units, grid=grid, events=events)
+    elif args.map_seed is not None:
+        grid = Grid()
+        gen = generate(args.size, args.size, seed=args.map_seed)
+        gen.apply(grid)
+        game = Game(ui, units=gen.make_units(), grid=grid, seed=args.map_seed, events=events)
+    else:
+        game = Game(ui, events=events)
+    if args.autosave:
+        saver = AutoSaver(args.autosave)
+        if args.resume:
+            game = saver.load_latest(ui, events=events) or game
+        game.autosave = saver
+    if args.record:
+        game.action_log = ActionLog.open(args.record, game, game.seed)
+    if timer:
+        timer.mark("game")
+
+    # Large maps scroll inside a screen-sized view.
+    screen = pygame.display.set_mode((game.camera.view_w, game.camera.view_h + UI_H))
 
     init_assets()
+    if timer:
+        timer.mark("display")
+    run_loop(game, screen, clock, timer, DefsWatcher())
 
+    if game.action_log:
+        game.action_log.close()
+    game.events.close()
+    pygame.quit()
+
+def run_loop(game, screen, clock, timer=None, watcher=None):
     running = True
     while running:
         dt_ms = clock.tick(FPS)
@@ -28,11 +101,22 @@ def main():
             else:
                 game.handle_event(e)
 
+        if watcher is not None:
+            change = watcher.poll()
+            if change is not None:
+                game.defs_changed(change)
+
         game.update(dt_ms)
         game.draw(screen)
         pygame.display.flip()
 
-    pygame.quit()
+        if timer:
+            # Sprites for what is on screen are loaded during the first frame.
+            timer.mark("first frame")
+            print("startup:")
+            for line in timer.report():
+                print(line)
+            timer = None
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
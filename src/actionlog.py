@@ -0,0 +1,176 @@
+import struct
+
+MAGIC = b"TGAL"
+FORMAT_VERSION = 2
+
+REC_SELECT = 1
+REC_MOVE = 2
+REC_ATTACK = 3
+REC_WAIT = 4
+REC_END_TURN = 5
+
+REC_NAMES = {
+    REC_SELECT: "select",
+    REC_MOVE: "move",
+    REC_ATTACK: "attack",
+    REC_WAIT: "wait",
+    REC_END_TURN: "end_turn",
+}
+
+REC_HEAD = struct.Struct("<BH")
+_U16 = struct.Struct("<H")
+_U16X2 = struct.Struct("<HH")
+# kind, team, x, y, hp, flags (bit 0 acted, bit 1 has_moved)
+_UNIT = struct.Struct("<BBHHHB")
+_HEADER = struct.Struct("<HQHHBH")
+
+FLUSH_BYTES = 64 * 1024
+
+
+def _pack_names(names):
+    out = bytearray(_U16.pack(len(names)))
+    for name in names:
+        raw = name.encode("utf-8")
+        out += struct.pack("<B", len(raw)) + raw
+    return bytes(out)
+
+
+def _unpack_names(data, off):
+    (n,) = _U16.unpack_from(data, off)
+    off += 2
+    names = []
+    for _ in range(n):
+        ln = data[off]
+        off += 1
+        names.append(data[off:off + ln].decode("utf-8"))
+        off += ln
+    return names, off
+
+
+def encode_header(game, seed=0):
+    grid = game.grid
+    tile_names = sorted({t for row in grid.tiles for t in row})
+    tile_ids = {t: i for i, t in enumerate(tile_names)}
+    kind_names = sorted({u.kind for u in game.units})
+    kind_ids = {k: i for i, k in enumerate(kind_names)}
+
+    out = bytearray(MAGIC)
+    out += _HEADER.pack(
+        FORMAT_VERSION, seed, grid.w, grid.h, game.turn_team, game.turn_number & 0xFFFF
+    )
+    out += _pack_names(tile_names)
+    out += bytes(tile_ids[t] for row in grid.tiles for t in row)
+    out += _pack_names(kind_names)
+    out += _U16.pack(len(game.units))
+    for u in game.units:
+        flags = (1 if u.acted else 0) | (2 if getattr(u, "has_moved", False) else 0)
+        out += _UNIT.pack(kind_ids[u.kind], u.team, u.x, u.y, u.hp, flags)
+    return bytes(out)
+
+
+def decode_header(data):
+    if data[:4] != MAGIC:
+        raise ValueError("not an action log")
+    (version,) = _U16.unpack_from(data, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported action log version {version}")
+    _v, seed, w, h, turn_team, turn_number = _HEADER.unpack_from(data, 4)
+    off = 4 + _HEADER.size
+
+    tile_names, off = _unpack_names(data, off)
+    raw = data[off:off + w * h]
+    off += w * h
+    tiles = [[tile_names[raw[y * w + x]] for x in range(w)] for y in range(h)]
+
+    kind_names, off = _unpack_names(data, off)
+    (n,) = _U16.unpack_from(data, off)
+    off += 2
+    units = []
+    for _ in range(n):
+        k, team, x, y, hp, flags = _UNIT.unpack_from(data, off)
+        off += _UNIT.size
+        units.append((kind_names[k], team, x, y, hp, bool(flags & 1), bool(flags & 2)))
+
+    header = {
+        "version": version,
+        "seed": seed,
+        "w": w,
+        "h": h,
+        "turn_team": turn_team,
+        "turn_number": turn_number,
+        "tiles": tiles,
+        "units": units,
+    }
+    return header, off
+
+
+class ActionLog:
+    def __init__(self, fileobj, game, seed=0):
+        self.f = fileobj
+        self.game = game
+        self._index = {u_id: i for i, u_id in enumerate(map(id, game.units))}
+        self._buf = bytearray(encode_header(game, seed))
+        self.records = 0
+
+    @classmethod
+    def open(cls, path, game, seed=0):
+        return cls(open(path, "wb"), game, seed)
+
+    def _uid(self, unit):
+        return self._index[id(unit)]
+
+    def _rec(self, kind, payload=b""):
+        self._buf += REC_HEAD.pack(kind, len(payload))
+        self._buf += payload
+        self.records += 1
+        if len(self._buf) >= FLUSH_BYTES:
+            self.flush()
+
+    def select(self, unit):
+        self._rec(REC_SELECT, _U16.pack(self._uid(unit)))
+
+    def move(self, unit, path):
+        payload = bytearray(_U16X2.pack(self._uid(unit), len(path)))
+        for x, y in path:
+            payload += _U16X2.pack(x, y)
+        self._rec(REC_MOVE, bytes(payload))
+
+    def attack(self, attacker, defender):
+        self._rec(REC_ATTACK, _U16X2.pack(self._uid(attacker), self._uid(defender)))
+
+    def wait(self, unit):
+        self._rec(REC_WAIT, _U16.pack(self._uid(unit)))
+
+    def end_turn(self, turn_number):
+        self._rec(REC_END_TURN, _U16.pack(turn_number & 0xFFFF))
+        self.flush()
+
+    def flush(self):
+        if self._buf:
+            self.f.write(self._buf)
+            self.f.flush()
+            self._buf = bytearray()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+def iter_records(data, off):
+    end = len(data)
+    head = REC_HEAD
+    while off < end:
+        kind, n = head.unpack_from(data, off)
+        off += head.size
+        yield kind, data[off:off + n]
+        off += n
+
+
+def decode_record(kind, payload):
+    if kind == REC_MOVE:
+        uid, n = _U16X2.unpack_from(payload, 0)
+        path = [_U16X2.unpack_from(payload, 4 + i * 4) for i in range(n)]
+        return (uid, path)
+    if kind == REC_ATTACK:
+        return _U16X2.unpack_from(payload, 0)
+    return _U16.unpack_from(payload, 0)
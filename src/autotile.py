@@ -0,0 +1,138 @@
+# Neighbour bits, clockwise from north. Cells outside the map count as the
+# same terrain so borders are only drawn between terrains, not at map edges.
+N, NE, E, SE, S, SW, W, NW = (1 << i for i in range(8))
+
+# Terrains with a transition set: (family id, base subtile, edge prefix).
+FAMILIES = {
+    "DIRT": (1, "D", ""),
+    "WATER": (2, "W", "W"),
+}
+FAMILY_OF = {name: fam for name, (fam, _base, _prefix) in FAMILIES.items()}
+PLAIN_KEY = "P"
+
+
+def _quadrant_key(base, prefix, mask, vert_bit, horiz_bit, vert, horiz):
+    open_v = not mask & vert_bit
+    open_h = not mask & horiz_bit
+    if open_v and open_h:
+        return prefix + vert + horiz
+    if open_v:
+        return prefix + vert
+    if open_h:
+        return prefix + horiz
+    return base
+
+
+def _build_table(base, prefix):
+    # The loaded sets have edges and outer corners but no inner corners, so
+    # only the orthogonal bits select a piece; the diagonals are kept in the
+    # mask so an inner-corner set can be added by extending this table.
+    table = []
+    for mask in range(256):
+        table.append((
+            _quadrant_key(base, prefix, mask, N, W, "T", "L"),
+            _quadrant_key(base, prefix, mask, N, E, "T", "R"),
+            _quadrant_key(base, prefix, mask, S, W, "B", "L"),
+            _quadrant_key(base, prefix, mask, S, E, "B", "R"),
+        ))
+    return table
+
+
+TABLES = [None] * (max(fam for fam, _b, _p in FAMILIES.values()) + 1)
+for _fam, _base, _prefix in FAMILIES.values():
+    TABLES[_fam] = _build_table(_base, _prefix)
+
+
+def _family_rows(tiles):
+    fam = FAMILY_OF
+    return [bytes([fam.get(name, 0) for name in row]) for row in tiles]
+
+
+def neighbour_mask(above, row, below, x, f):
+    # Rows are padded by one cell on each side, so x is already offset.
+    return (
+        (above[x] == f)
+        | (above[x + 1] == f) << 1
+        | (row[x + 1] == f) << 2
+        | (below[x + 1] == f) << 3
+        | (below[x] == f) << 4
+        | (below[x - 1] == f) << 5
+        | (row[x - 1] == f) << 6
+        | (above[x - 1] == f) << 7
+    )
+
+
+def _pad(row):
+    return row[:1] + row + row[-1:]
+
+
+def paint_all(tiles):
+    # Rows without transition terrain stay plain; only family cells are
+    # looked up, so cost follows the amount of dirt and water on the map.
+    fams = _family_rows(tiles)
+    h = len(fams)
+    w = len(fams[0])
+    padded = [_pad(r) for r in fams]
+    paint = []
+    for y in range(h):
+        row = fams[y]
+        top = [PLAIN_KEY] * (w * 2)
+        bot = [PLAIN_KEY] * (w * 2)
+        if row.count(0) != w:
+            above = padded[y - 1] if y > 0 else padded[y]
+            cur = padded[y]
+            below = padded[y + 1] if y + 1 < h else padded[y]
+            for x in [i for i, f in enumerate(row) if f]:
+                f = row[x]
+                tl, tr, bl, br = TABLES[f][neighbour_mask(above, cur, below, x + 1, f)]
+                top[x * 2] = tl
+                top[x * 2 + 1] = tr
+                bot[x * 2] = bl
+                bot[x * 2 + 1] = br
+        paint.append(top)
+        paint.append(bot)
+    return paint
+
+
+def _family_at(tiles, x, y):
+    h = len(tiles)
+    w = len(tiles[0])
+    x = min(max(x, 0), w - 1)
+    y = min(max(y, 0), h - 1)
+    return FAMILY_OF.get(tiles[y][x], 0)
+
+
+def cell_keys(tiles, x, y):
+    f = _family_at(tiles, x, y)
+    if not f:
+        return (PLAIN_KEY,) * 4
+    mask = 0
+    bit = 1
+    for dx, dy in ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)):
+        if _family_at(tiles, x + dx, y + dy) == f:
+            mask |= bit
+        bit <<= 1
+    return TABLES[f][mask]
+
+
+def repaint_around(tiles, paint, x, y):
+    # A cell's keys depend only on its 8 neighbours, so a terrain change can
+    # alter at most the 3x3 block around it. Returns the cells whose paint
+    # actually changed.
+    h = len(tiles)
+    w = len(tiles[0])
+    changed = []
+    for cy in range(max(0, y - 1), min(h, y + 2)):
+        for cx in range(max(0, x - 1), min(w, x + 2)):
+            tl, tr, bl, br = cell_keys(tiles, cx, cy)
+            top = paint[cy * 2]
+            bot = paint[cy * 2 + 1]
+            px = cx * 2
+            if (top[px], top[px + 1], bot[px], bot[px + 1]) == (tl, tr, bl, br):
+                continue
+            top[px] = tl
+            top[px + 1] = tr
+            bot[px] = bl
+            bot[px + 1] = br
+            changed.append((cx, cy))
+    return changed
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+
+from .constants import TILE_SIZE, ZOOM_TILE_SIZES, ZOOM_CACHE_BYTES
+
+
+class ZoomCache:
+    # Scaled copies of sprites per zoom level, built on first use and evicted
+    # least recently used once the byte budget is exceeded. Level 0 is the
+    # source image itself and is never stored.
+    def __init__(self, max_bytes=ZOOM_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, level, build, size=None):
+        # build() returns the level 0 surface; size overrides the scaled size.
+        if level == 0:
+            return build()
+        k = (key, level)
+        img = self._items.get(k)
+        if img is not None:
+            self._items.move_to_end(k)
+            self.hits += 1
+            return img
+        self.misses += 1
+        img = self._make(build(), level, size)
+        self._items[k] = img
+        self.bytes += img.get_width() * img.get_height() * 4
+        while self.bytes > self.max_bytes and len(self._items) > 1:
+            _k, old = self._items.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * 4
+        return img
+
+    def _make(self, base, level, size):
+        import pygame
+
+        if size is None:
+            s = ZOOM_TILE_SIZES[level] / TILE_SIZE
+            size = (max(1, int(round(base.get_width() * s))), max(1, int(round(base.get_height() * s))))
+        if size == base.get_size():
+            return base
+        if base.get_bitsize() >= 24:
+            return pygame.transform.smoothscale(base, size)
+        return pygame.transform.scale(base, size)
+
+    def clear(self, match=None):
+        if match is None:
+            self._items.clear()
+            self.bytes = 0
+            return
+        for k in [k for k in self._items if match(k[0])]:
+            img = self._items.pop(k)
+            self.bytes -= img.get_width() * img.get_height() * 4
+
+
+ZOOM_CACHE = ZoomCache()
+
+
+class Camera:
+    # Game state stays in level 0 world pixels (TILE_SIZE per cell); the
+    # camera maps them to the view at the current zoom level.
+    def __init__(self, view_w, view_h, grid_w, grid_h, level=0):
+        self.view_w = view_w
+        self.view_h = view_h
+        self.grid_w = grid_w
+        self.grid_h = grid_h
+        self.level = level
+        self.ox = 0
+        self.oy = 0
+        self.version = 0
+        self.clamp()
+
+    @property
+    def tile(self):
+        return ZOOM_TILE_SIZES[self.level]
+
+    @property
+    def scale(self):
+        return self.tile / TILE_SIZE
+
+    @property
+    def key(self):
+        return (self.level, self.ox, self.oy, self.view_w, self.view_h)
+
+    def resize_world(self, grid_w, grid_h):
+        self.grid_w = grid_w
+        self.grid_h = grid_h
+        self.clamp()
+
+    def clamp(self):
+        t = self.tile
+        max_x = max(0, self.grid_w * t - self.view_w)
+        max_y = max(0, self.grid_h * t - self.view_h)
+        self.ox = min(max(0, int(self.ox)), max_x)
+        self.oy = min(max(0, int(self.oy)), max_y)
+        self.version += 1
+
+    def set_level(self, level, anchor=None):
+        level = min(max(0, level), len(ZOOM_TILE_SIZES) - 1)
+        if level == self.level:
+            return False
+        ax, ay = anchor if anchor is not None else (self.view_w // 2, self.view_h // 2)
+        old = self.tile
+        wx = (ax + self.ox) / old
+        wy = (ay + self.oy) / old
+        self.level = level
+        self.ox = int(wx * self.tile - ax)
+        self.oy = int(wy * self.tile - ay)
+        self.clamp()
+        return True
+
+    def zoom_in(self, anchor=None):
+        return self.set_level(self.level - 1, anchor)
+
+    def zoom_out(self, anchor=None):
+        return self.set_level(self.level + 1, anchor)
+
+    def pan(self, dx, dy):
+        self.ox += dx
+        self.oy += dy
+        self.clamp()
+
+    def center_on_cell(self, x, y):
+        t = self.tile
+        self.ox = int((x + 0.5) * t - self.view_w / 2)
+        self.oy = int((y + 0.5) * t - self.view_h / 2)
+        self.clamp()
+
+    def world_to_screen(self, wx, wy):
+        s = self.scale
+        return (int(wx * s) - self.ox, int(wy * s) - self.oy)
+
+    def cell_rect(self, x, y):
+        import pygame
+
+        t = self.tile
+        return pygame.Rect(x * t - self.ox, y * t - self.oy, t, t)
+
+    def cell_at(self, px, py):
+        if not (0 <= px < self.view_w and 0 <= py < self.view_h):
+            return None
+        t = self.tile
+        return ((px + self.ox) // t, (py + self.oy) // t)
+
+    def visible_cells(self, clip=None):
+        # Cell bounds (x0, y0, x1, y1), end exclusive, covering the view or clip.
+        t = self.tile
+        left, top, right, bottom = 0, 0, self.view_w, self.view_h
+        if clip is not None:
+            left = max(left, clip.left)
+            top = max(top, clip.top)
+            right = min(right, clip.right)
+            bottom = min(bottom, clip.bottom)
+        return (
+            max(0, (left + self.ox) // t),
+            max(0, (top + self.oy) // t),
+            min(self.grid_w, (right + self.ox + t - 1) // t),
+            min(self.grid_h, (bottom + self.oy + t - 1) // t),
+        )
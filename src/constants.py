@@ -11,6 +11,17 @@ SCREEN_H = GRID_H * TILE_SIZE + UI_H
 
 FPS = 60
 
+# Tile sizes in pixels for each zoom level; level 0 is the native size.
+ZOOM_TILE_SIZES = (64, 48, 32, 16, 8)
+ZOOM_CACHE_BYTES = 48 * 1024 * 1024
+CAMERA_PAN_PX = 48
+
+# Longest side of the minimap in the UI panel.
+MINIMAP_PX = UI_H - 20
+MINIMAP_MARGIN = 10
+
+FOG_OF_WAR = True
+
 WHITE = (245, 245, 245)
 BLACK = (20, 20, 20)
 GRAY = (110, 110, 110)
@@ -23,14 +34,9 @@ TEAM_BLUE = TEAM_GREEN
 HIGHLIGHT_MOVE = (245, 245, 120)
 HIGHLIGHT_ATTACK = (255, 140, 140)
 HIGHLIGHT_SELECT = (255, 255, 255)
-
-TILES = {
-    "PLAIN": {"move_cost": 1, "def_bonus": 0},
-    "DIRT": {"move_cost": 1, "def_bonus": 0},
-    "FOREST": {"move_cost": 2, "def_bonus": 1},
-    "HILL": {"move_cost": 2, "def_bonus": 2},
-    "WATER": {"move_cost": 999, "def_bonus": 0},
-}
+HIGHLIGHT_DANGER = (200, 30, 30)
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-ASSETS_DIR = os.path.join(BASE_DIR, "assets")
\ No newline at end of file
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+# Unit and terrain definitions, see src/defs.py.
+DATA_DIR = os.path.join(BASE_DIR, "data")
\ No newline at end of file
@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from .constants import DATA_DIR
+
+UNITS_FILE = os.path.join(DATA_DIR, "units.json")
+TERRAIN_FILE = os.path.join(DATA_DIR, "terrain.json")
+WATCH_INTERVAL_MS = 500
+
+# Compiled columns and their defaults; None marks a required field.
+UNIT_COLUMNS = {
+    "max_hp": None,
+    "move": None,
+    "atk": 20,
+    "armor": 0,
+    "attack_range": 1,
+    "sight": 4,
+}
+TERRAIN_COLUMNS = {
+    "move_cost": None,
+    "def_bonus": None,
+    "sight_bonus": 0,
+    "blocks_sight": False,
+    "color": (0, 0, 0),
+}
+# Unit fields that only change how a kind is drawn.
+SPRITE_FIELDS = ("sprite", "sprite_mode", "anchor", "attack_sheet", "attack_frames", "target_height_px")
+
+# Names whose definitions changed in a reload; sprites is the subset of
+# units whose sprite fields changed.
+DefsChange = namedtuple("DefsChange", "units sprites terrain")
+
+
+class DefsError(ValueError):
+    pass
+
+
+class DefTable:
+    # Dense columns indexed by ID, compiled from a {name: fields} dict. IDs
+    # are stable for the life of the process; new names are appended.
+    def __init__(self, columns):
+        self.columns = columns
+        self.names = []
+        self.ids = {}
+        self.revision = 0
+        for col in columns:
+            setattr(self, col, [])
+
+    def compile(self, defs):
+        for name in defs:
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+        for col, default in self.columns.items():
+            old = getattr(self, col)
+            values = []
+            for i, name in enumerate(self.names):
+                fields = defs.get(name)
+                if fields is None:
+                    values.append(old[i])
+                    continue
+                v = fields.get(col, default)
+                values.append(tuple(v) if isinstance(v, list) else v)
+            setattr(self, col, values)
+        self.revision += 1
+
+
+UNIT_DEFS = {}
+TILES = {}
+UNITS = DefTable(UNIT_COLUMNS)
+TERRAIN = DefTable(TERRAIN_COLUMNS)
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise DefsError(f"{path}: {e}") from e
+    if not isinstance(data, dict):
+        raise DefsError(f"{path}: expected an object of definitions")
+    return data
+
+
+def _check(path, defs, columns):
+    for name, fields in defs.items():
+        if not isinstance(fields, dict):
+            raise DefsError(f"{path}: {name} must be an object")
+        for col, default in columns.items():
+            if col not in fields:
+                if default is None:
+                    raise DefsError(f"{path}: {name} is missing {col}")
+                continue
+            v = fields[col]
+            if isinstance(default, tuple):
+                ok = isinstance(v, list) and len(v) == len(default)
+            elif isinstance(default, bool):
+                ok = isinstance(v, bool)
+            else:
+                ok = isinstance(v, int) and not isinstance(v, bool)
+            if not ok:
+                raise DefsError(f"{path}: {name}.{col} has the wrong type")
+
+
+def compile_defs():
+    UNITS.compile(UNIT_DEFS)
+    TERRAIN.compile(TILES)
+
+
+def load_defs(units_path=UNITS_FILE, terrain_path=TERRAIN_FILE):
+    # Reads both files and swaps them in only if both are valid, so a
+    # half-saved file leaves the running tables alone.
+    units = _read(units_path)
+    terrain = _read(terrain_path)
+    _check(units_path, units, UNIT_COLUMNS)
+    _check(terrain_path, terrain, TERRAIN_COLUMNS)
+    gone = sorted((set(UNIT_DEFS) - set(units)) | (set(TILES) - set(terrain)))
+    if gone:
+        raise DefsError(f"cannot remove definitions: {', '.join(gone)}")
+
+    change = DefsChange(
+        frozenset(k for k, v in units.items() if UNIT_DEFS.get(k) != v),
+        frozenset(
+            k for k, v in units.items()
+            if k in UNIT_DEFS and any(UNIT_DEFS[k].get(f) != v.get(f) for f in SPRITE_FIELDS)
+        ),
+        frozenset(k for k, v in terrain.items() if TILES.get(k) != v),
+    )
+    UNIT_DEFS.clear()
+    UNIT_DEFS.update(units)
+    TILES.clear()
+    TILES.update(terrain)
+    compile_defs()
+    return change
+
+
+class DefsWatcher:
+    # Polls the definition files' mtimes; no platform file events needed.
+    def __init__(self, paths=(UNITS_FILE, TERRAIN_FILE), interval_ms=WATCH_INTERVAL_MS):
+        self.paths = tuple(paths)
+        self.interval = interval_ms / 1000.0
+        self._next = 0.0
+        self._mtimes = self._stat()
+
+    def _stat(self):
+        out = []
+        for p in self.paths:
+            try:
+                out.append(os.stat(p).st_mtime_ns)
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self._next:
+            return None
+        self._next = now + self.interval
+        mtimes = self._stat()
+        if mtimes == self._mtimes:
+            return None
+        self._mtimes = mtimes
+        try:
+            return load_defs(*self.paths)
+        except DefsError as e:
+            print(f"defs: {e}", file=sys.stderr)
+            return None
+
+
+load_defs()
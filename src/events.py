@@ -0,0 +1,161 @@
+import json
+import queue
+import threading
+from collections import deque, namedtuple
+
+from .units import team_name
+
+RING_CAPACITY = 1024
+WRITER_BATCH = 512
+
+AttackEvent = namedtuple(
+    "AttackEvent",
+    "turn attacker_team attacker_kind defender_team defender_kind dmg hp_before hp_after",
+)
+DeathEvent = namedtuple("DeathEvent", "turn team kind")
+TurnEvent = namedtuple("TurnEvent", "turn team")
+WinEvent = namedtuple("WinEvent", "turn team")
+MessageEvent = namedtuple("MessageEvent", "turn text")
+
+
+def format_event(ev):
+    kind = type(ev)
+    if kind is AttackEvent:
+        return (
+            f"{team_name(ev.attacker_team)} {ev.attacker_kind} attacked "
+            f"{team_name(ev.defender_team)} {ev.defender_kind} for {ev.dmg} "
+            f"({ev.hp_before}->{ev.hp_after})"
+        )
+    if kind is DeathEvent:
+        return f"{team_name(ev.team)} {ev.kind} died."
+    if kind is TurnEvent:
+        return f"Turn: {team_name(ev.team)}"
+    if kind is WinEvent:
+        return f"{team_name(ev.team)} wins!"
+    return ev.text
+
+
+def event_dict(ev):
+    d = ev._asdict()
+    d["type"] = type(ev).__name__
+    return d
+
+
+class MemorySink:
+    def __init__(self):
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.f = open(path, "a", encoding="utf-8")
+
+    def write(self, events):
+        self.f.write("".join(json.dumps(event_dict(ev)) + "\n" for ev in events))
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class TextSink:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, events):
+        self.stream.write("".join(format_event(ev) + "\n" for ev in events))
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+_STOP = object()
+
+
+class EventLog:
+    enabled = True
+
+    def __init__(self, sinks=(), capacity=RING_CAPACITY, batch=WRITER_BATCH):
+        self.ring = deque(maxlen=capacity)
+        self.sinks = list(sinks)
+        self.batch = batch
+        self.subscribers = []
+        self._queue = None
+        self._thread = None
+        if self.sinks:
+            self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(target=self._writer, daemon=True)
+            self._thread.start()
+
+    def subscribe(self, fn):
+        self.subscribers.append(fn)
+
+    def emit(self, ev):
+        self.ring.append(ev)
+        for fn in self.subscribers:
+            fn(ev)
+        if self._queue is not None:
+            self._queue.put(ev)
+
+    def _writer(self):
+        q = self._queue
+        stop = False
+        while not stop:
+            item = q.get()
+            batch = []
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                for sink in self.sinks:
+                    sink.write(batch)
+
+    def recent(self, n=None):
+        if n is None:
+            return list(self.ring)
+        return list(self.ring)[-n:]
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        for sink in self.sinks:
+            sink.close()
+
+
+class DisabledEventLog:
+    # Game checks `enabled` before building a record, so nothing is allocated.
+    enabled = False
+    ring = ()
+    subscribers = ()
+
+    def subscribe(self, fn):
+        pass
+
+    def emit(self, ev):
+        pass
+
+    def recent(self, n=None):
+        return []
+
+    def close(self):
+        pass
+
+
+NULL_EVENTS = DisabledEventLog()
@@ -0,0 +1,94 @@
+from collections import namedtuple
+
+Forecast = namedtuple("Forecast", "attacker defender dmg hp_before hp_after kills")
+
+
+def raw_damage(attacker_hp, atk, armor, def_bonus):
+    base = int(round(attacker_hp * (atk / 100.0)))
+    return max(1, base - (armor + def_bonus))
+
+
+class CombatForecast:
+    def __init__(self, game):
+        self.game = game
+        self._dmg = {}
+        self._pairs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._dmg.clear()
+        self._pairs.clear()
+
+    def damage(self, attacker, defender):
+        tile = self.game.grid.tile_type(defender.x, defender.y)
+        key = (attacker.hp, attacker.kind, defender.kind, tile)
+        dmg = self._dmg.get(key)
+        if dmg is None:
+            self.misses += 1
+            dmg = raw_damage(
+                attacker.hp, attacker.atk, defender.armor,
+                self.game.grid.def_bonus(defender.x, defender.y),
+            )
+            self._dmg[key] = dmg
+        else:
+            self.hits += 1
+        return dmg
+
+    def preview(self, attacker, defender):
+        dmg = self.damage(attacker, defender)
+        after = max(0, defender.hp - dmg)
+        return Forecast(attacker, defender, dmg, defender.hp, after, after == 0)
+
+    def _state_key(self):
+        g = self.game
+        return (g.hash, g.hp_version, g.board_version)
+
+    def all_pairs(self, team):
+        # Every attacker/target pair for a side in one pass, reused until a
+        # position, hp or acted flag changes.
+        key = (team, self._state_key())
+        cached = self._pairs.get(key)
+        if cached is not None:
+            return cached
+
+        g = self.game
+        g.sync_visibility()
+        enemies = [u for u in g.units if u.is_alive() and u.team != team]
+        out = []
+        for a in g.units:
+            if a.team != team or not a.is_alive() or a.acted:
+                continue
+            r = a.attack_range
+            for d in enemies:
+                if abs(a.x - d.x) + abs(a.y - d.y) > r:
+                    continue
+                if not g.can_see(team, d.x, d.y):
+                    continue
+                out.append(self.preview(a, d))
+
+        if len(self._pairs) > 64:
+            self._pairs.clear()
+        self._pairs[key] = out
+        return out
+
+    def for_attacker(self, attacker):
+        return [f for f in self.all_pairs(attacker.team) if f.attacker is attacker]
+
+    def target(self, attacker, defender):
+        for f in self.for_attacker(attacker):
+            if f.defender is defender:
+                return f
+        return None
+
+    def best_target(self, attacker, cells):
+        best = None
+        best_score = None
+        for f in self.for_attacker(attacker):
+            if (f.defender.x, f.defender.y) not in cells:
+                continue
+            score = (f.kills, f.dmg, -f.hp_after)
+            if best_score is None or score > best_score:
+                best_score = score
+                best = f
+        return best
@@ -1,8 +1,22 @@
-import pygame
-from collections import deque
+from collections import deque, namedtuple
 from .grid import Grid
-from .units import make_starting_units, team_name, get_arrow_sprite
-from .constants import TILE_SIZE, BLACK, HIGHLIGHT_MOVE, HIGHLIGHT_ATTACK, HIGHLIGHT_SELECT
+from .mapgen import spawn_units
+from .units import team_name, get_arrow_sprite, drop_sprites
+from .zobrist import ZobristKeys, TranspositionTable
+from .influence import InfluenceMap
+from .events import (
+    EventLog, NULL_EVENTS, AttackEvent, DeathEvent, TurnEvent, WinEvent, MessageEvent, format_event
+)
+from .visibility import Visibility, FogLayer
+from .forecast import CombatForecast
+from .hpa import HierarchicalPathfinder
+from .undo import UndoStack
+from .camera import Camera
+from .minimap import Minimap
+from .constants import (
+    TILE_SIZE, BLACK, HIGHLIGHT_MOVE, HIGHLIGHT_ATTACK, HIGHLIGHT_SELECT, HIGHLIGHT_DANGER,
+    FOG_OF_WAR, SCREEN_W, SCREEN_H, UI_H, CAMERA_PAN_PX,
+)
 
 AI_TEAM = 1
 
@@ -13,13 +27,32 @@ ARROW_SPEED_PX_PER_MS = 0.2
 ARROW_MAX_LIFE_MS = 2000
 ARROW_SPAWN_OX = 10
 ARROW_SPAWN_OY = -7
+DANGER_MAX_ALPHA = 150
+# Per game, sized to the map: position keys leave out the map and unit stats.
+AI_TT_MIN_BITS = 6
+AI_TT_MAX_BITS = 12
+PATH_PREVIEW_COLOR = (255, 255, 255)
+
+# Cached per unit until the board changes; prev maps each reachable cell to
+# the cell it is entered from, or is empty once the unit has moved.
+Reach = namedtuple("Reach", "reachable attackables prev")
 
 class Game:
-    def __init__(self, ui):
+    def __init__(self, ui, units=None, grid=None, ai_teams=(AI_TEAM,), headless=False, seed=0,
+                 events=None):
         self.ui = ui
-        self.grid = Grid()
-        self.units = make_starting_units()
+        self.headless = headless
+        self.seed = seed
+        self.action_log = None
+        self.autosave = None
+        self.replaying = False
+        self.grid = grid if grid is not None else Grid(load_assets=not headless)
+        self.units = units if units is not None else spawn_units(self.grid)
+        self.ai_teams = set(ai_teams)
+        self.view_team = next((t for t in (0, 1) if t not in self.ai_teams), 0)
         self.turn_team = 0
+        self.turn_number = 1
+        self.damage_dealt = {}
         self.selected = None
         self.reachable = set()
         self.attackables = set()
@@ -33,12 +66,68 @@ class Game:
         self.ai_phase = "idle"
         self.ai_current = None
 
+        self.zobrist = ZobristKeys()
+        cells = self.grid.w * self.grid.h
+        self.tt = TranspositionTable(min(AI_TT_MAX_BITS, max(AI_TT_MIN_BITS, cells.bit_length())))
+        self.hash = self.zobrist.full_hash(self.units, self.turn_team)
+        self.hp_version = 0
+        # Bumped when a cell's occupant or terrain changes; keys _reach.
+        self.board_version = 0
+        self._reach = {}
+        self._reach_version = 0
+        self._path_key = None
+        self._path_cells = None
+
+        self.forecast = CombatForecast(self)
+        self.pathfinder = HierarchicalPathfinder(self)
+        self.undo = UndoStack(self)
+        self.hover_cell = None
+        self._hover_key = None
+        self._hover_text = None
+
+        self.influence = InfluenceMap(self)
+        self.show_danger = False
+        self._danger_surf = None
+        self._danger_key = None
+
+        self.fog = FOG_OF_WAR
+        self.visibility = Visibility(self)
+        self._vis_version = self.board_version
+        self.fog_layer = FogLayer(self.visibility, self.view_team)
+
+        self.camera = Camera(
+            min(self.grid.w * TILE_SIZE, SCREEN_W),
+            min(self.grid.h * TILE_SIZE, SCREEN_H - UI_H),
+            self.grid.w, self.grid.h,
+        )
+        self._overlays = {}
+        self.minimap = Minimap(self)
+
+        if events is None:
+            events = NULL_EVENTS if headless else EventLog()
+        self.events = events
         self.log_lines = deque(maxlen=4)
+        self.events.subscribe(lambda ev: self.log_lines.appendleft(format_event(ev)))
         self._log(f"Game start. Turn: {team_name(self.turn_team)}")
 
     def _log(self, msg):
-        print(msg)
-        self.log_lines.appendleft(msg)
+        if self.events.enabled:
+            self.events.emit(MessageEvent(self.turn_number, msg))
+
+    def _xor_unit(self, unit):
+        self.hash ^= self.zobrist.unit_key(unit)
+
+    def recompute_hash(self):
+        self.hash = self.zobrist.full_hash(self.units, self.turn_team)
+        self.hp_version += 1
+        self.board_version += 1
+        return self.hash
+
+    def unit_index(self, unit):
+        for i, u in enumerate(self.units):
+            if u is unit:
+                return i
+        return -1
 
     def units_alive(self, team):
         return [u for u in self.units if u.team == team and u.is_alive()]
@@ -55,6 +144,18 @@ class Game:
     def enemy_occupied_cells(self, team):
         return {(u.x, u.y) for u in self.units if u.is_alive() and u.team != team}
 
+    def sync_visibility(self):
+        # Once per board change, before code that asks can_see in a loop.
+        # A walking unit is synced every frame by update.
+        if self.fog and self._vis_version != self.board_version:
+            self.visibility.sync()
+            self._vis_version = self.board_version
+
+    def can_see(self, team, x, y):
+        if not self.fog:
+            return True
+        return self.visibility.is_visible(team, x, y)
+
     def clear_selection(self):
         self.selected = None
         self.reachable = set()
@@ -65,10 +166,14 @@ class Game:
             unit.has_moved = False
 
     def find_path(self, start, goal):
-        q = deque([start])
-        came_from = {start: None}
         moving_unit = self.unit_at(*start)
         moving_team = moving_unit.team if moving_unit else self.turn_team
+        if abs(start[0] - goal[0]) + abs(start[1] - goal[1]) > self.pathfinder.cs:
+            if self.unit_at(*goal) is None:
+                return self.pathfinder.find_path(start, goal, moving_team)
+
+        q = deque([start])
+        came_from = {start: None}
         blocked = self.enemy_occupied_cells(moving_team) - {start}
 
         while q:
@@ -96,29 +201,102 @@ class Game:
         path.reverse()
         return path
 
+    def _route_towards(self, unit, targets):
+        tx, ty = min(targets, key=lambda t: abs(t[0] - unit.x) + abs(t[1] - unit.y))
+        route = self.pathfinder.find_path(unit.pos(), (tx, ty), unit.team)
+        for c in reversed(route):
+            if c in self.reachable:
+                return c
+        return None
+
+    def set_tile(self, x, y, name):
+        changed = self.grid.set_tile(x, y, name)
+        self.board_version += 1
+        self.tt.clear()
+        # Recorded positions may no longer be passable.
+        self.undo.clear()
+        self.pathfinder.tile_changed(x, y)
+        self.minimap.tile_changed(x, y)
+        self.influence.rebuild()
+        self.visibility.rebuild()
+        return changed
+
+    def defs_changed(self, change):
+        # After a hot reload of data/*.json: drop what was derived from the
+        # old tables. Terrain costs feed the pathfinder, sight and danger.
+        if change.sprites:
+            drop_sprites(change.sprites)
+        if change.terrain:
+            self.pathfinder.rebuild()
+        if change.units or change.terrain:
+            self.board_version += 1
+            self.influence.rebuild()
+            self.visibility.rebuild()
+            self.forecast.clear()
+            self.tt.clear()
+            self._hover_key = None
+            if self.selected is not None:
+                self.compute_reachable_and_attackables(self.selected)
+        names = sorted(change.units | change.terrain)
+        if names:
+            self._log(f"Reloaded {', '.join(names)}")
+
     def compute_reachable_and_attackables(self, unit):
-        self.ensure_flags(unit)
+        r = self.reach(unit)
+        self.reachable = r.reachable
+        self.attackables = r.attackables
 
+    def reach(self, unit):
+        # Shared by selection, the AI and the hover preview. The sets are
+        # handed out as-is, so callers must not modify them.
+        self.ensure_flags(unit)
+        if self._reach_version != self.board_version:
+            self._reach.clear()
+            self._reach_version = self.board_version
+        key = (id(unit), unit.x, unit.y, unit.has_moved)
+        r = self._reach.get(key)
+        if r is None:
+            r = self._compute_reach(unit)
+            self._reach[key] = r
+        return r
+
+    def _compute_reach(self, unit):
         if unit.has_moved:
-            self.reachable = set()
+            reachable = set()
+            prev = {}
         else:
             blocked = self.enemy_occupied_cells(unit.team) - {unit.pos()}
-            self.reachable = self.grid.reachable_cells(unit.pos(), unit.move_points, blocked)
+            prev = self.grid.reachable_map(unit.pos(), unit.move_points, blocked)
 
             occupied = self.occupied_cells() - {unit.pos()}
-            self.reachable = self.reachable - occupied
+            reachable = set(prev.keys()) - occupied
 
-        self.attackables = set()
+        attackables = set()
         ux, uy = unit.pos()
+        self.sync_visibility()
 
         attack_range = unit.attack_range
 
-        for x in range(self.grid.w):
-            for y in range(self.grid.h):
+        for x in range(max(0, ux - attack_range), min(self.grid.w, ux + attack_range + 1)):
+            for y in range(max(0, uy - attack_range), min(self.grid.h, uy + attack_range + 1)):
                 if abs(x - ux) + abs(y - uy) <= attack_range and (x, y) != (ux, uy):
                     enemy = self.unit_at(x, y)
-                    if enemy and enemy.team != unit.team:
-                        self.attackables.add((x, y))
+                    if enemy and enemy.team != unit.team and self.can_see(unit.team, x, y):
+                        attackables.add((x, y))
+        return Reach(reachable, attackables, prev)
+
+    def path_to(self, unit, cell):
+        # The cheapest path within the unit's move, read from the cached
+        # predecessor map; [] when the cell is out of reach.
+        prev = self.reach(unit).prev
+        if cell not in prev or cell == unit.pos():
+            return []
+        path = []
+        while cell is not None and cell != unit.pos():
+            path.append(cell)
+            cell = prev[cell]
+        path.reverse()
+        return path
 
     def check_win(self):
         if not self.units_alive(0):
@@ -127,7 +305,8 @@ class Game:
             self.winner = 0
 
         if self.winner is not None:
-            self._log(f"{team_name(self.winner)} wins!")
+            if self.events.enabled:
+                self.events.emit(WinEvent(self.turn_number, self.winner))
 
     def check_auto_end_turn(self):
         for u in self.units:
@@ -136,8 +315,16 @@ class Game:
         self.end_turn()
 
     def finish_unit_turn(self, unit):
+        if self.action_log:
+            self.action_log.wait(unit)
+        self._finish_unit_turn(unit)
+
+    def _finish_unit_turn(self, unit):
         self.ensure_flags(unit)
+        self.undo.touch(unit)
+        self._xor_unit(unit)
         unit.acted = True
+        self._xor_unit(unit)
         unit.has_moved = False
         self.clear_selection()
 
@@ -145,7 +332,7 @@ class Game:
         if self.winner is not None:
             return
 
-        if not self.in_ai_turn:
+        if not self.in_ai_turn and not self.replaying:
             self.check_auto_end_turn()
 
     def start_ai_turn(self):
@@ -153,24 +340,38 @@ class Game:
             return
 
         self.in_ai_turn = True
-        self.ai_queue = deque([u for u in self.units_alive(AI_TEAM) if not u.acted])
+        self.ai_queue = deque([u for u in self.units_alive(self.turn_team) if not u.acted])
         self.ai_timer_ms = AI_DELAY_UNIT_START_MS
         self.ai_phase = "next_unit"
         self.ai_current = None
 
     def end_turn(self):
         self.clear_selection()
+        self.hash ^= self.zobrist.turn_key(self.turn_team)
         self.turn_team = 1 - self.turn_team
+        self.hash ^= self.zobrist.turn_key(self.turn_team)
+        self.turn_number += 1
+        if self.action_log:
+            self.action_log.end_turn(self.turn_number)
 
         for u in self.units:
             if u.team == self.turn_team:
                 self.ensure_flags(u)
-                u.acted = False
+                if u.acted or u.has_moved:
+                    self.undo.touch(u)
+                if u.acted:
+                    self._xor_unit(u)
+                    u.acted = False
+                    self._xor_unit(u)
                 u.has_moved = False
 
-        self._log(f"Turn: {team_name(self.turn_team)}")
+        if self.events.enabled:
+            self.events.emit(TurnEvent(self.turn_number, self.turn_team))
+
+        if self.autosave:
+            self.autosave.save(self)
 
-        if self.turn_team == AI_TEAM and self.winner is None:
+        if self.turn_team in self.ai_teams and self.winner is None and not self.replaying:
             self.start_ai_turn()
 
     def spawn_arrow_projectile(self, attacker, defender):
@@ -212,19 +413,30 @@ class Game:
         if attacker.acted:
             return
 
+        if self.action_log:
+            self.action_log.attack(attacker, defender)
+
+        self.undo.touch(attacker)
+        self.undo.touch(defender)
         before = defender.hp
-        base = int(round(attacker.hp * (attacker.atk / 100.0)))
-        mitigation = defender.armor + self.grid.def_bonus(defender.x, defender.y)
-        dmg = max(1, base - mitigation)
+        dmg = self.forecast.damage(attacker, defender)
 
+        self._xor_unit(defender)
         defender.hp -= dmg
         if defender.hp < 0:
             defender.hp = 0
-
-        self._log(
-            f"{team_name(attacker.team)} {attacker.kind} attacked "
-            f"{team_name(defender.team)} {defender.kind} for {dmg} ({before}->{defender.hp})"
-        )
+        self._xor_unit(defender)
+        self.hp_version += 1
+        if defender.hp == 0:
+            self.board_version += 1
+        dealt = before - defender.hp
+        self.damage_dealt[attacker.kind] = self.damage_dealt.get(attacker.kind, 0) + dealt
+
+        if self.events.enabled:
+            self.events.emit(AttackEvent(
+                self.turn_number, attacker.team, attacker.kind,
+                defender.team, defender.kind, dmg, before, defender.hp,
+            ))
 
         attacker.start_attack_anim()
 
@@ -233,9 +445,65 @@ class Game:
 
 
         if defender.hp <= 0:
-            self._log(f"{team_name(defender.team)} {defender.kind} died.")
+            if self.events.enabled:
+                self.events.emit(DeathEvent(self.turn_number, defender.team, defender.kind))
 
-        self.finish_unit_turn(attacker)
+        self._finish_unit_turn(attacker)
+
+    def start_unit_path(self, unit, path):
+        if self.action_log:
+            self.action_log.move(unit, path)
+        self.ensure_flags(unit)
+        self.undo.touch(unit)
+        # The hash tracks the destination as soon as the move is committed so
+        # the per-cell steps of the walk animation cost nothing.
+        dx, dy = path[-1]
+        self.hash ^= self.zobrist.unit_key(unit) ^ self.zobrist.piece_key(
+            dx, dy, unit.kind, unit.team, unit.hp, unit.acted
+        )
+        unit.start_path(path)
+        unit.has_moved = True
+        self.animating_unit = unit
+        self.board_version += 1
+
+    def move_unit_now(self, unit, path):
+        self.start_unit_path(unit, path)
+        unit.snap_to(*path[-1])
+        self.animating_unit = None
+        self.board_version += 1
+
+        self.selected = unit
+        self.compute_reachable_and_attackables(unit)
+        if not self.attackables:
+            self.finish_unit_turn(unit)
+
+    def _end_walk(self):
+        moved_unit = self.animating_unit
+        self.animating_unit = None
+        self.board_version += 1
+
+        if moved_unit.team in self.ai_teams:
+            self.ai_current = moved_unit
+            self.selected = moved_unit
+            self.compute_reachable_and_attackables(moved_unit)
+            self.ai_phase = "post_move"
+            self.ai_timer_ms = AI_DELAY_AFTER_MOVE_MS
+            return
+
+        self.selected = moved_unit
+        self.compute_reachable_and_attackables(moved_unit)
+
+        if not self.attackables:
+            self.finish_unit_turn(moved_unit)
+
+    def settle_walk(self):
+        # Jumps a walk to its end, with the auto-wait it would have ended in.
+        u = self.animating_unit
+        if u is None:
+            return
+        if u._path:
+            u.snap_to(*u._path[-1])
+        self._end_walk()
 
     def try_select(self, cell):
         u = self.unit_at(*cell)
@@ -252,6 +520,8 @@ class Game:
 
         self.ensure_flags(u)
         self.selected = u
+        if self.action_log:
+            self.action_log.select(u)
         self.compute_reachable_and_attackables(u)
 
     def try_move_or_attack(self, cell):
@@ -267,6 +537,7 @@ class Game:
         self.ensure_flags(self.selected)
 
         if cell in self.attackables:
+            self.undo.begin("attack")
             self.attack(self.selected, self.unit_at(*cell))
             return
 
@@ -274,24 +545,111 @@ class Game:
             return
 
         if cell in self.reachable and self.unit_at(*cell) is None:
-            path = self.find_path(self.selected.pos(), cell)
+            # The walk follows the previewed path.
+            path = self.path_to(self.selected, cell) or self.find_path(self.selected.pos(), cell)
             if path:
-                self.selected.start_path(path)
-                self.selected.has_moved = True
-                self.animating_unit = self.selected
+                self.undo.begin("move")
+                self.start_unit_path(self.selected, path)
+
+    def can_undo(self):
+        # Recorded logs and replays must see every action, and the AI's moves
+        # are only undone together with the player command that led to them.
+        return (
+            self.action_log is None
+            and not self.replaying
+            and not self.in_ai_turn
+            and self.turn_team not in self.ai_teams
+        )
+
+    def undo_action(self):
+        if not self.can_undo() or not self.undo.can_undo():
+            return
+        # The walk is finished first so the recorded move, and a redo of it,
+        # includes the auto-wait.
+        self.settle_walk()
+        action = self.undo.undo()
+        if action is not None:
+            self._log(f"Undo {action.label}")
+
+    def redo_action(self):
+        if not self.can_undo() or not self.undo.can_redo():
+            return
+        action = self.undo.redo()
+        if action is not None:
+            self._log(f"Redo {action.label}")
+
+    def handle_view_event(self, e):
+        # Zoom and pan only change the view, so they work in any phase.
+        import pygame
+
+        cam = self.camera
+        if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1 or (
+            e.type == pygame.MOUSEMOTION and e.buttons[0]
+        ):
+            cell = self.minimap.cell_at(*e.pos)
+            if cell is not None:
+                cam.center_on_cell(*cell)
+                return True
+        if e.type == pygame.MOUSEWHEEL:
+            anchor = pygame.mouse.get_pos()
+            if cam.cell_at(*anchor) is None:
+                anchor = None
+            if e.y > 0:
+                cam.zoom_in(anchor)
+            elif e.y < 0:
+                cam.zoom_out(anchor)
+            return True
+        if e.type != pygame.KEYDOWN:
+            return False
+        if e.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+            cam.zoom_in()
+        elif e.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            cam.zoom_out()
+        elif e.key == pygame.K_LEFT:
+            cam.pan(-CAMERA_PAN_PX, 0)
+        elif e.key == pygame.K_RIGHT:
+            cam.pan(CAMERA_PAN_PX, 0)
+        elif e.key == pygame.K_UP:
+            cam.pan(0, -CAMERA_PAN_PX)
+        elif e.key == pygame.K_DOWN:
+            cam.pan(0, CAMERA_PAN_PX)
+        else:
+            return False
+        return True
 
     def handle_event(self, e):
-        if self.turn_team == AI_TEAM or self.animating_unit or self.winner is not None:
+        import pygame
+
+        if self.handle_view_event(e):
+            return
+
+        if e.type == pygame.KEYDOWN and e.key in (pygame.K_z, pygame.K_y):
+            # Allowed mid-walk and after a win: undo settles the animation
+            # and restores the earlier state.
+            if e.key == pygame.K_z:
+                self.undo_action()
+            else:
+                self.redo_action()
+            return
+
+        if self.turn_team in self.ai_teams or self.animating_unit or self.winner is not None:
             return
 
         if e.type == pygame.KEYDOWN:
             if e.key == pygame.K_SPACE:
+                self.undo.begin("end turn")
                 self.end_turn()
             if e.key == pygame.K_w and self.selected:
+                self.undo.begin("wait")
                 self.finish_unit_turn(self.selected)
+            if e.key == pygame.K_d:
+                self.show_danger = not self.show_danger
+
+        if e.type == pygame.MOUSEMOTION:
+            self.hover_cell = self.grid.cell_from_pixel(*e.pos, self.camera)
 
         if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
-            cell = self.grid.cell_from_pixel(*e.pos)
+            cell = self.grid.cell_from_pixel(*e.pos, self.camera)
             if cell is None:
                 return
             if self.selected:
@@ -349,8 +707,9 @@ class Game:
             self.selected = unit
             self.compute_reachable_and_attackables(unit)
 
-            if self.attackables:
-                self.attack(unit, self.unit_at(*next(iter(self.attackables))))
+            best = self.forecast.best_target(unit, self.attackables) if self.attackables else None
+            if best is not None:
+                self.attack(unit, best.defender)
                 if self.winner is not None:
                     self.in_ai_turn = False
                     self.ai_phase = "idle"
@@ -374,8 +733,9 @@ class Game:
             self.selected = unit
             self.compute_reachable_and_attackables(unit)
 
-            if self.attackables:
-                self.attack(unit, self.unit_at(*next(iter(self.attackables))))
+            best = self.forecast.best_target(unit, self.attackables) if self.attackables else None
+            if best is not None:
+                self.attack(unit, best.defender)
                 if self.winner is not None:
                     self.in_ai_turn = False
                     self.ai_phase = "idle"
@@ -385,7 +745,7 @@ class Game:
                 self.ai_timer_ms = AI_DELAY_BETWEEN_UNITS_MS
                 return
 
-            enemies = self.units_alive(0)
+            enemies = self.units_alive(1 - unit.team)
             if not enemies:
                 self.finish_unit_turn(unit)
                 if self.winner is not None:
@@ -397,21 +757,46 @@ class Game:
                 self.ai_timer_ms = AI_DELAY_BETWEEN_UNITS_MS
                 return
 
-            best_cell = None
-            best_dist = 10**9
-            for e in enemies:
-                for c in (self.reachable if self.reachable else {unit.pos()}):
-                    d = abs(e.x - c[0]) + abs(e.y - c[1])
-                    if d < best_dist:
-                        best_dist = d
-                        best_cell = c
+            # Only enemies this team can see are chased; with none in sight the
+            # unit advances towards the enemy's spawn edge.
+            self.sync_visibility()
+            targets = [(e.x, e.y) for e in enemies if self.can_see(unit.team, e.x, e.y)]
+            if not targets:
+                targets = [(self.grid.w - 1 if unit.team == 0 else 0, unit.y)]
+
+            tt_key = self.zobrist.derive(self.hash, self.unit_index(unit) + 1)
+            best_cell = self.tt.probe(tt_key)
+            if best_cell is None or best_cell not in (self.reachable or {unit.pos()}):
+                best_cell = None
+                best_dist = 10**9
+                for tx, ty in targets:
+                    for c in (self.reachable if self.reachable else {unit.pos()}):
+                        d = abs(tx - c[0]) + abs(ty - c[1])
+                        if d < best_dist:
+                            best_dist = d
+                            best_cell = c
+                if best_cell is not None and best_dist > self.pathfinder.cs:
+                    # Far targets are routed around lakes on the abstract graph
+                    # instead of by straight-line distance.
+                    best_cell = self._route_towards(unit, targets) or best_cell
+                elif best_cell is not None:
+                    # Among equally close cells prefer the one with the least enemy damage
+                    # able to reach it.
+                    danger = self.influence.danger_map(unit.team)
+                    w = self.grid.w
+                    best_danger = danger[best_cell[1] * w + best_cell[0]]
+                    for tx, ty in targets:
+                        for c in self.reachable:
+                            d = abs(tx - c[0]) + abs(ty - c[1])
+                            if d == best_dist and danger[c[1] * w + c[0]] < best_danger:
+                                best_danger = danger[c[1] * w + c[0]]
+                                best_cell = c
+                    self.tt.store(tt_key, best_cell)
 
             if best_cell and best_cell != unit.pos():
                 path = self.find_path(unit.pos(), best_cell)
                 if path:
-                    unit.start_path(path)
-                    unit.has_moved = True
-                    self.animating_unit = unit
+                    self.start_unit_path(unit, path)
                     self.ai_phase = "moving"
                     return
 
@@ -448,63 +833,141 @@ class Game:
 
         if self.animating_unit:
             self.animating_unit.update(dt_ms)
+            if self.fog:
+                self.visibility.sync()
             if not self.animating_unit.moving:
-                moved_unit = self.animating_unit
-                self.animating_unit = None
-
-                if moved_unit.team == AI_TEAM:
-                    self.ai_current = moved_unit
-                    self.selected = moved_unit
-                    self.compute_reachable_and_attackables(moved_unit)
-                    self.ai_phase = "post_move"
-                    self.ai_timer_ms = AI_DELAY_AFTER_MOVE_MS
-                    return
-
-                self.selected = moved_unit
-                self.compute_reachable_and_attackables(moved_unit)
-
-                if not self.attackables:
-                    self.finish_unit_turn(moved_unit)
+                self._end_walk()
                 return
 
-        if self.turn_team == AI_TEAM and self.winner is None:
+        if self.turn_team in self.ai_teams and self.winner is None:
             self.update_ai(dt_ms)
 
     def draw_highlights(self, surf):
-        if self.turn_team == AI_TEAM:
+        import pygame
+
+        if self.turn_team in self.ai_teams:
             return
 
         if self.selected and self.selected.team != self.turn_team:
             return
 
+        cam = self.camera
+        move = self._overlay(HIGHLIGHT_MOVE, 70, cam.tile)
         for x, y in self.reachable:
-            r = self.grid.cell_rect(x, y)
-            overlay = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-            overlay.fill((*HIGHLIGHT_MOVE, 70))
-            surf.blit(overlay, r.topleft)
+            surf.blit(move, cam.cell_rect(x, y).topleft)
 
+        hit = self._overlay(HIGHLIGHT_ATTACK, 90, cam.tile)
         for x, y in self.attackables:
-            r = self.grid.cell_rect(x, y)
-            overlay = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-            overlay.fill((*HIGHLIGHT_ATTACK, 90))
-            surf.blit(overlay, r.topleft)
+            surf.blit(hit, cam.cell_rect(x, y).topleft)
 
         if self.selected:
-            r = self.grid.cell_rect(*self.selected.pos())
+            r = cam.cell_rect(*self.selected.pos())
             pygame.draw.rect(surf, HIGHLIGHT_SELECT, r, 3)
 
+            path = self.hover_path()
+            if path:
+                points = [cam.cell_rect(*c).center for c in [self.selected.pos()] + path]
+                pygame.draw.lines(surf, PATH_PREVIEW_COLOR, False, points, max(1, cam.tile // 16))
+
+    def hover_path(self):
+        # Rebuilt only when the hovered cell, the selection or the board
+        # changes; MOUSEMOTION within a cell costs nothing.
+        sel = self.selected
+        cell = self.hover_cell
+        if sel is None or cell is None or cell not in self.reachable:
+            return None
+        key = (cell, id(sel), sel.x, sel.y, self.board_version)
+        if key != self._path_key:
+            self._path_key = key
+            self._path_cells = self.path_to(sel, cell)
+        return self._path_cells
+
+    def _overlay(self, color, alpha, size):
+        import pygame
+
+        key = (color, alpha, size)
+        overlay = self._overlays.get(key)
+        if overlay is None:
+            overlay = pygame.Surface((size, size), pygame.SRCALPHA)
+            overlay.fill((*color, alpha))
+            self._overlays[key] = overlay
+        return overlay
+
+    def hover_preview(self):
+        sel = self.selected
+        cell = self.hover_cell
+        if sel is None or cell is None or cell not in self.attackables:
+            return None
+
+        # Rebuilt only when the hovered cell, the selection or the board changes.
+        key = (cell, id(sel), self.hash, self.hp_version)
+        if key != self._hover_key:
+            self._hover_key = key
+            self._hover_text = None
+            defender = self.unit_at(*cell)
+            f = self.forecast.target(sel, defender) if defender is not None else None
+            if f is not None:
+                outcome = "KO" if f.kills else f"{f.hp_before}->{f.hp_after}"
+                self._hover_text = f"Attack: {f.dmg} dmg ({outcome})"
+        return self._hover_text
+
+    def draw_danger_overlay(self, surf):
+        import pygame
+
+        team = self.view_team
+        cam = self.camera
+        self.influence.sync()
+        key = (self.influence.version, team, cam.key)
+        if self._danger_surf is None or self._danger_key != key:
+            w = self.grid.w
+            overlay = pygame.Surface((cam.view_w, cam.view_h), pygame.SRCALPHA)
+            danger = self.influence.danger_map(team)
+            peak = max(danger) if danger else 0
+            if peak > 0:
+                x0, y0, x1, y1 = cam.visible_cells()
+                for y in range(y0, y1):
+                    for x in range(x0, x1):
+                        d = danger[y * w + x]
+                        if d <= 0:
+                            continue
+                        a = int(DANGER_MAX_ALPHA * d / peak)
+                        overlay.fill((*HIGHLIGHT_DANGER, max(20, a)), cam.cell_rect(x, y))
+            self._danger_surf = overlay
+            self._danger_key = key
+        surf.blit(self._danger_surf, (0, 0))
+
     def draw(self, surf):
+        import pygame
+
+        cam = self.camera
         surf.fill(BLACK)
-        self.grid.draw(surf)
+        surf.set_clip(pygame.Rect(0, 0, cam.view_w, cam.view_h))
+        self.grid.draw(surf, cam)
+        if self.show_danger:
+            self.draw_danger_overlay(surf)
+        if self.fog:
+            self.sync_visibility()
+            self.fog_layer.draw(surf, cam)
         self.draw_highlights(surf)
 
+        x0, y0, x1, y1 = cam.visible_cells()
         for u in self.units:
-            if u.is_alive():
-                u.draw(surf, self.ui.small, self.turn_team)
+            if not u.is_alive():
+                continue
+            # One cell of margin keeps walking units and tall sprites drawn.
+            if not (x0 - 1 <= u.x <= x1 and y0 - 1 <= u.y <= y1):
+                continue
+            if u.team != self.view_team and not self.can_see(self.view_team, u.x, u.y):
+                continue
+            u.draw(surf, self.ui.small, self.turn_team, cam)
 
         for p in self.projectiles:
             img = p["img"]
-            surf.blit(img, img.get_rect(center=(int(p["x"]), int(p["y"])))) 
+            if img is None or cam.level:
+                img = get_arrow_sprite(p["vx"], p["vy"], cam.level)
+            if img:
+                surf.blit(img, img.get_rect(center=cam.world_to_screen(p["x"], p["y"])))
+        surf.set_clip(None)
 
         label = (
             f"Turn: {team_name(self.turn_team)}"
@@ -512,5 +975,10 @@ class Game:
             else f"{team_name(self.winner)} wins"
         )
 
+        preview = self.hover_preview()
+        if preview:
+            label = f"{label}   {preview}"
+
         panel_lines = [label] + list(self.log_lines)
-        self.ui.draw_panel(surf, panel_lines)
\ No newline at end of file
+        self.ui.draw_panel(surf, panel_lines)
+        self.minimap.draw(surf)
\ No newline at end of file
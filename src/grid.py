@@ -1,20 +1,150 @@
-import pygame
 import os
 from collections import deque
-from .constants import GRID_W, GRID_H, TILE_SIZE, SUBTILE_SIZE, TILES, ASSETS_DIR
+from .autotile import paint_all, repaint_around
+from .camera import ZOOM_CACHE
+from .constants import GRID_W, GRID_H, TILE_SIZE, SUBTILE_SIZE, ASSETS_DIR, ZOOM_TILE_SIZES
+from .defs import TERRAIN
+
+PRESET_ROWS = [
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P TL T T T T T T T T T T T T T T T TR P",
+    "P L D D D D D D D D D D D D D D D R P",
+    "P L D D D D D D D D D D D D D D D R P",
+    "P L D D D D D D D D D D D D D D D R P",
+    "P BL B B B B B B B B B B B B B B B BR P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P WTL WT WT WT WT WT WT WT WT WT WT WT WT WT WT WT WTR P",
+    "P WL W W W W W W W W W W W W W W W WR P",
+    "P WL W W W W W W W W W W W W W W W WR P",
+    "P WL W W W W W W W W W W W W W W W WR P",
+    "P WBL WB WB WB WB WB WB WB WB WB WB WB WB WB WB WB WBR P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+    "P P P P P P P P P P P P P P P P P P P P",
+]
+
+
+def paint_from_rows(rows, paint_w, paint_h):
+    preset = [r.split() for r in rows]
+
+    while len(preset) < paint_h:
+        preset.append(["P"] * paint_w)
+    preset = preset[:paint_h]
+
+    for i in range(len(preset)):
+        if len(preset[i]) < paint_w:
+            preset[i] = preset[i] + (["P"] * (paint_w - len(preset[i])))
+        else:
+            preset[i] = preset[i][:paint_w]
+    return preset
+
+
+def tiles_from_paint(paint, w, h):
+    # A cell is water or dirt when at least half of its subtiles are.
+    tiles = []
+    for y in range(h):
+        row = []
+        for x in range(w):
+            keys = (
+                paint[y * 2][x * 2], paint[y * 2][x * 2 + 1],
+                paint[y * 2 + 1][x * 2], paint[y * 2 + 1][x * 2 + 1],
+            )
+            if keys.count("W") >= 2:
+                row.append("WATER")
+            elif keys.count("D") >= 2:
+                row.append("DIRT")
+            else:
+                row.append("PLAIN")
+        tiles.append(row)
+    return tiles
+
+
+# Side in cells of the blocks TerrainCells fills at a time.
+TERRAIN_REGION = 32
+
+
+class TerrainCells:
+    # Per-cell TERRAIN columns as flat lists indexed y * w + x. They are
+    # filled one region at a time, as callers ask for the box around a unit,
+    # so a streamed grid only pages in chunks near units.
+    def __init__(self, grid):
+        self.grid = grid
+        self.w = grid.w
+        self.h = grid.h
+        self.key = grid.terrain_key()
+        n = self.w * self.h
+        self.move_cost = [0] * n
+        self.def_bonus = [0] * n
+        self.sight_bonus = [0] * n
+        self.opaque = bytearray(n)
+        self.rw = (self.w + TERRAIN_REGION - 1) // TERRAIN_REGION
+        self.rh = (self.h + TERRAIN_REGION - 1) // TERRAIN_REGION
+        self.filled = bytearray(self.rw * self.rh)
+        # Bounds how far a move can go in cells; 0-cost terrain reaches anywhere.
+        cheapest = min(TERRAIN.move_cost, default=1)
+        self.min_cost = cheapest if cheapest > 0 else 0
+
+    def reach_box(self, x, y, move_points, margin=0):
+        # One ring past the furthest reachable cell, whose cost is still read.
+        if self.min_cost:
+            r = move_points // self.min_cost + margin + 1
+        else:
+            r = max(self.w, self.h)
+        self.ensure(x - r, y - r, x + r, y + r)
+
+    def ensure(self, x0, y0, x1, y1):
+        # Inclusive cell box, clipped to the map.
+        r = TERRAIN_REGION
+        for ry in range(max(0, y0) // r, min(self.h - 1, y1) // r + 1):
+            for rx in range(max(0, x0) // r, min(self.w - 1, x1) // r + 1):
+                if not self.filled[ry * self.rw + rx]:
+                    self._fill(rx, ry)
+
+    def _fill(self, rx, ry):
+        self.filled[ry * self.rw + rx] = 1
+        r = TERRAIN_REGION
+        w = self.w
+        ids = TERRAIN.ids
+        cost, bonus, sight, blocks = (
+            TERRAIN.move_cost, TERRAIN.def_bonus, TERRAIN.sight_bonus, TERRAIN.blocks_sight
+        )
+        x0 = rx * r
+        x1 = min(w, x0 + r)
+        for y in range(ry * r, min(self.h, ry * r + r)):
+            row = self.grid.tiles[y]
+            base = y * w
+            for x in range(x0, x1):
+                t = ids[row[x]]
+                self.move_cost[base + x] = cost[t]
+                self.def_bonus[base + x] = bonus[t]
+                self.sight_bonus[base + x] = sight[t]
+                self.opaque[base + x] = 1 if blocks[t] else 0
+
 
 class Grid:
-    def __init__(self):
-        self.w = GRID_W
-        self.h = GRID_H
-        self.tiles = [["PLAIN" for _ in range(self.w)] for _ in range(self.h)]
-        self.paint_w = self.w * 2
-        self.paint_h = self.h * 2
-        self.paint = [["P" for _ in range(self.paint_w)] for _ in range(self.paint_h)]
-        self._seed_map()
-        self._load_tiles()
+    def __init__(self, load_assets=True, tiles=None):
+        # Bumped on any terrain change; keys the rendered view.
+        self.version = 0
+        self._view = None
+        self._view_key = None
+        self._cells = None
+        self.tiles = None
+        if tiles is not None:
+            self.set_tiles(tiles)
+        else:
+            self._seed_map()
+        # Subtile images are read on the first draw, so headless grids and
+        # tools never touch pygame.
+        self.subtiles = None if load_assets else {}
 
     def _load_tiles(self):
+        import pygame
+
         def load(name):
             img = pygame.image.load(os.path.join(ASSETS_DIR, name))
             if img.get_width() != SUBTILE_SIZE or img.get_height() != SUBTILE_SIZE:
@@ -47,46 +177,29 @@ class Grid:
     def _seed_map(self):
         self.w = GRID_W
         self.h = GRID_H
-        self.tiles = [["PLAIN" for _ in range(self.w)] for _ in range(self.h)]
         self.paint_w = self.w * 2
         self.paint_h = self.h * 2
 
-        rows = [
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P TL T T T T T T T T T T T T T T T TR P",
-            "P L D D D D D D D D D D D D D D D R P",
-            "P L D D D D D D D D D D D D D D D R P",
-            "P L D D D D D D D D D D D D D D D R P",
-            "P BL B B B B B B B B B B B B B B B BR P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P WTL WT WT WT WT WT WT WT WT WT WT WT WT WT WT WT WTR P",
-            "P WL W W W W W W W W W W W W W W W WR P",
-            "P WL W W W W W W W W W W W W W W W WR P",
-            "P WL W W W W W W W W W W W W W W W WR P",
-            "P WBL WB WB WB WB WB WB WB WB WB WB WB WB WB WB WB WBR P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-            "P P P P P P P P P P P P P P P P P P P P",
-        ]
-
-        preset = [r.split() for r in rows]
-
-        while len(preset) < self.paint_h:
-            preset.append(["P"] * self.paint_w)
-        preset = preset[:self.paint_h]
-
-        for i in range(len(preset)):
-            if len(preset[i]) < self.paint_w:
-                preset[i] = preset[i] + (["P"] * (self.paint_w - len(preset[i])))
-            else:
-                preset[i] = preset[i][:self.paint_w]
+        self.paint = paint_from_rows(PRESET_ROWS, self.paint_w, self.paint_h)
+        self.tiles = tiles_from_paint(self.paint, self.w, self.h)
+
+    def set_tiles(self, tiles):
+        if tiles == self.tiles:
+            return
+        self.h = len(tiles)
+        self.w = len(tiles[0])
+        self.tiles = [list(row) for row in tiles]
+        self.paint_w = self.w * 2
+        self.paint_h = self.h * 2
+        self.paint = paint_all(self.tiles)
+        self.version += 1
 
-        self.paint = preset
+    def set_tile(self, x, y, name):
+        if self.tiles[y][x] == name:
+            return []
+        self.tiles[y][x] = name
+        self.version += 1
+        return repaint_around(self.tiles, self.paint, x, y)
 
     def in_bounds(self, x, y):
         return 0 <= x < self.w and 0 <= y < self.h
@@ -94,15 +207,29 @@ class Grid:
     def tile_type(self, x, y):
         return self.tiles[y][x]
 
+    def terrain_key(self):
+        return (self.version, TERRAIN.revision, self.w, self.h)
+
+    def terrain_cells(self):
+        # Terrain is read lazily around each unit through this table, shared by
+        # the influence and visibility layers; replaced after any terrain or
+        # definition change.
+        if self._cells is None or self._cells.key != self.terrain_key():
+            self._cells = TerrainCells(self)
+        return self._cells
+
     def move_cost(self, x, y):
-        t = self.tile_type(x, y)
-        return TILES[t]["move_cost"]
+        return TERRAIN.move_cost[TERRAIN.ids[self.tiles[y][x]]]
 
     def def_bonus(self, x, y):
-        t = self.tile_type(x, y)
-        return TILES[t]["def_bonus"]
+        return TERRAIN.def_bonus[TERRAIN.ids[self.tiles[y][x]]]
 
-    def cell_from_pixel(self, px, py):
+    def cell_from_pixel(self, px, py, camera=None):
+        if camera is not None:
+            cell = camera.cell_at(px, py)
+            if cell is None or not self.in_bounds(*cell):
+                return None
+            return cell
         if py >= self.h * TILE_SIZE:
             return None
         x = px // TILE_SIZE
@@ -111,7 +238,11 @@ class Grid:
             return None
         return (x, y)
 
-    def cell_rect(self, x, y):
+    def cell_rect(self, x, y, camera=None):
+        import pygame
+
+        if camera is not None:
+            return camera.cell_rect(x, y)
         return pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
 
     def neighbors4(self, x, y):
@@ -120,34 +251,82 @@ class Grid:
             if self.in_bounds(nx, ny):
                 yield (nx, ny)
 
-    def draw(self, surf):
-        for y in range(self.h):
-            for x in range(self.w):
-                r = self.cell_rect(x, y)
-                px = x * 2
-                py = y * 2
+    def level_subtiles(self, level):
+        # One cache lookup per subtile key per frame, not per blit.
+        if self.subtiles is None:
+            self._load_tiles()
+        if level == 0:
+            return self.subtiles
+        st = ZOOM_TILE_SIZES[level] // 2
+        size = (st, st)
+        return {
+            key: ZOOM_CACHE.get(("subtile", key), level, lambda img=img: img, size)
+            for key, img in self.subtiles.items()
+        }
 
-                k_tl = self.paint[py][px]
-                k_tr = self.paint[py][px + 1]
-                k_bl = self.paint[py + 1][px]
-                k_br = self.paint[py + 1][px + 1]
+    def draw(self, surf, camera=None):
+        import pygame
 
-                tl = self.subtiles.get(k_tl, self.subtiles["P"])
-                tr = self.subtiles.get(k_tr, self.subtiles["P"])
-                bl = self.subtiles.get(k_bl, self.subtiles["P"])
-                br = self.subtiles.get(k_br, self.subtiles["P"])
+        if camera is None:
+            self.draw_cells(surf)
+            return
+        # The terrain under the camera is rendered once into a view-sized
+        # surface and reused until the camera or the terrain changes.
+        key = (camera.key, self.version)
+        size = (camera.view_w, camera.view_h)
+        if self._view is None or self._view.get_size() != size:
+            self._view = pygame.Surface(size)
+            self._view_key = None
+        if key != self._view_key:
+            self._view.fill((0, 0, 0))
+            self.draw_cells(self._view, camera)
+            self._view_key = key
+        surf.blit(self._view, (0, 0))
 
-                ox = r.left
-                oy = r.top
+    def draw_cells(self, surf, camera=None):
+        # Only cells under the clip rect are drawn, so streamed maps page in
+        # just the chunks that are on screen.
+        clip = surf.get_clip()
+        if camera is None:
+            level = 0
+            t = TILE_SIZE
+            ox = oy = 0
+            x0 = max(0, clip.left // t)
+            y0 = max(0, clip.top // t)
+            x1 = min(self.w, (clip.right + t - 1) // t)
+            y1 = min(self.h, (clip.bottom + t - 1) // t)
+        else:
+            level = camera.level
+            t = camera.tile
+            ox, oy = camera.ox, camera.oy
+            x0, y0, x1, y1 = camera.visible_cells(clip)
 
-                surf.blit(tl, (ox, oy))
-                surf.blit(tr, (ox + SUBTILE_SIZE, oy))
-                surf.blit(bl, (ox, oy + SUBTILE_SIZE))
-                surf.blit(br, (ox + SUBTILE_SIZE, oy + SUBTILE_SIZE))
+        subtiles = self.level_subtiles(level)
+        plain = subtiles["P"]
+        st = t // 2
+        blits = []
+        for y in range(y0, y1):
+            top = self.paint[y * 2]
+            bot = self.paint[y * 2 + 1]
+            sy = y * t - oy
+            for x in range(x0, x1):
+                px = x * 2
+                sx = x * t - ox
+                blits.append((subtiles.get(top[px], plain), (sx, sy)))
+                blits.append((subtiles.get(top[px + 1], plain), (sx + st, sy)))
+                blits.append((subtiles.get(bot[px], plain), (sx, sy + st)))
+                blits.append((subtiles.get(bot[px + 1], plain), (sx + st, sy + st)))
+        surf.blits(blits, doreturn=False)
 
     def reachable_cells(self, start, move_points, blocked_cells):
+        return set(self.reachable_map(start, move_points, blocked_cells).keys())
+
+    def reachable_map(self, start, move_points, blocked_cells):
+        # Cheapest predecessor of every cell within move_points; the start
+        # maps to None, so following it back from a cell gives its path.
         sx, sy = start
         dist = {(sx, sy): 0}
+        prev = {(sx, sy): None}
         q = deque([(sx, sy)])
 
         while q:
@@ -163,6 +342,7 @@ class Grid:
                     continue
                 if (nx, ny) not in dist or nd < dist[(nx, ny)]:
                     dist[(nx, ny)] = nd
+                    prev[(nx, ny)] = (x, y)
                     q.append((nx, ny))
 
-        return set(dist.keys())
\ No newline at end of file
+        return prev
\ No newline at end of file
@@ -0,0 +1,352 @@
+import heapq
+
+IMPASSABLE_COST = 999
+DEFAULT_CLUSTER = 16
+# Runs of open border at least this long get an entrance at each end.
+WIDE_ENTRANCE = 6
+# Inflates the distance estimate on the abstract graph so a long route
+# expands, and reads, fewer clusters; the corridor search that turns it into
+# cells is exact, which wins back most of the slack.
+ROUTE_WEIGHT = 1.5
+_NEIGHBOURS = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class _Layer:
+    # Abstract graph for one team; enemies of that team block cells.
+    def __init__(self):
+        self.blocked = set()
+        self.borders = {}
+        self.inter = {}
+        self.intra = {}
+        self.dirty_borders = set()
+        self.dirty_clusters = set()
+
+
+class HierarchicalPathfinder:
+    def __init__(self, game, cluster=DEFAULT_CLUSTER, teams=(0, 1)):
+        self.game = game
+        self.cs = cluster
+        self.teams = tuple(teams)
+        self.rebuilds = 0
+        self.rebuild()
+
+    def rebuild(self):
+        grid = self.game.grid
+        self.w = grid.w
+        self.h = grid.h
+        self.ncx = (self.w + self.cs - 1) // self.cs
+        self.ncy = (self.h + self.cs - 1) // self.cs
+        self.layers = {t: _Layer() for t in self.teams}
+        self._sig = {}
+        for layer in self.layers.values():
+            self._dirty_all(layer)
+        self.sync()
+
+    def _dirty_all(self, layer):
+        for cy in range(self.ncy):
+            for cx in range(self.ncx):
+                layer.dirty_clusters.add((cx, cy))
+                if cx + 1 < self.ncx:
+                    layer.dirty_borders.add((0, cx, cy))
+                if cy + 1 < self.ncy:
+                    layer.dirty_borders.add((1, cx, cy))
+
+    def cluster_of(self, x, y):
+        return (x // self.cs, y // self.cs)
+
+    def _bounds(self, c):
+        cx, cy = c
+        x0 = cx * self.cs
+        y0 = cy * self.cs
+        return x0, y0, min(self.w, x0 + self.cs), min(self.h, y0 + self.cs)
+
+    def _mark(self, layer, c):
+        # A cluster change can move entrances on any of its four borders,
+        # which changes the node sets, and so the intra edges, of the
+        # neighbours sharing them.
+        cx, cy = c
+        if cx + 1 < self.ncx:
+            layer.dirty_borders.add((0, cx, cy))
+        if cy + 1 < self.ncy:
+            layer.dirty_borders.add((1, cx, cy))
+        if cx > 0:
+            layer.dirty_borders.add((0, cx - 1, cy))
+        if cy > 0:
+            layer.dirty_borders.add((1, cx, cy - 1))
+        for dx, dy in _NEIGHBOURS:
+            n = (cx + dx, cy + dy)
+            if 0 <= n[0] < self.ncx and 0 <= n[1] < self.ncy:
+                layer.dirty_clusters.add(n)
+
+    def tile_changed(self, x, y):
+        c = self.cluster_of(x, y)
+        for layer in self.layers.values():
+            self._mark(layer, c)
+
+    def sync(self):
+        # Unit cells block enemy layers only; a moved or killed unit dirties
+        # the clusters it left and entered.
+        seen = set()
+        for u in self.game.units:
+            key = id(u)
+            seen.add(key)
+            sig = (u.x, u.y, u.team) if u.is_alive() else None
+            old = self._sig.get(key)
+            if old == sig:
+                continue
+            self._sig[key] = sig
+            for s, add in ((old, False), (sig, True)):
+                if s is None:
+                    continue
+                x, y, team = s
+                for t, layer in self.layers.items():
+                    if t == team:
+                        continue
+                    if add:
+                        layer.blocked.add((x, y))
+                    else:
+                        layer.blocked.discard((x, y))
+                    self._mark(layer, self.cluster_of(x, y))
+        for key in list(self._sig):
+            if key not in seen:
+                old = self._sig.pop(key)
+                if old is not None:
+                    x, y, team = old
+                    for t, layer in self.layers.items():
+                        if t != team:
+                            layer.blocked.discard((x, y))
+                            self._mark(layer, self.cluster_of(x, y))
+
+    def _open(self, layer, x, y):
+        return (
+            self.game.grid.move_cost(x, y) < IMPASSABLE_COST
+            and (x, y) not in layer.blocked
+        )
+
+    def _build_border(self, layer, key):
+        axis, cx, cy = key
+        grid = self.game.grid
+        old = layer.borders.get(key, ())
+        for a, b in old:
+            layer.inter.get(a, {}).pop(b, None)
+            layer.inter.get(b, {}).pop(a, None)
+
+        x0, y0, x1, y1 = self._bounds((cx, cy))
+        if axis == 0:
+            cells = [((x1 - 1, y), (x1, y)) for y in range(y0, y1)]
+        else:
+            cells = [((x, y1 - 1), (x, y1)) for x in range(x0, x1)]
+
+        pairs = []
+        run = []
+        for pair in cells + [None]:
+            if pair is not None and self._open(layer, *pair[0]) and self._open(layer, *pair[1]):
+                run.append(pair)
+                continue
+            if run:
+                if len(run) >= WIDE_ENTRANCE:
+                    pairs.append(run[0])
+                    pairs.append(run[-1])
+                else:
+                    pairs.append(run[len(run) // 2])
+                run = []
+
+        for a, b in pairs:
+            layer.inter.setdefault(a, {})[b] = grid.move_cost(*b)
+            layer.inter.setdefault(b, {})[a] = grid.move_cost(*a)
+        layer.borders[key] = pairs
+        self.rebuilds += 1
+
+    def _flush_borders(self, layer, c):
+        # Only the four borders of a cluster the search is about to expand;
+        # the rest of the map is never read.
+        cx, cy = c
+        for key in ((0, cx, cy), (1, cx, cy), (0, cx - 1, cy), (1, cx, cy - 1)):
+            if key in layer.dirty_borders:
+                layer.dirty_borders.discard(key)
+                self._build_border(layer, key)
+
+    def _cluster_nodes(self, layer, c):
+        cx, cy = c
+        nodes = set()
+        for key in ((0, cx, cy), (1, cx, cy), (0, cx - 1, cy), (1, cx, cy - 1)):
+            for a, b in layer.borders.get(key, ()):
+                for n in (a, b):
+                    if self.cluster_of(*n) == c:
+                        nodes.add(n)
+        return nodes
+
+    def _local(self, layer, src, bounds, reverse=False, goal=None, allow=None):
+        # Dijkstra inside one cluster. Entering a cell costs its move cost;
+        # with reverse=True distances are to src instead of from it.
+        grid = self.game.grid
+        x0, y0, x1, y1 = bounds
+        dist = {src: 0}
+        prev = {src: None}
+        heap = [(0, src)]
+        while heap:
+            d, cur = heapq.heappop(heap)
+            if d > dist[cur]:
+                continue
+            if cur == goal:
+                break
+            step = grid.move_cost(*cur) if reverse else 0
+            x, y = cur
+            for n in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                nx, ny = n
+                if not (x0 <= nx < x1 and y0 <= ny < y1):
+                    continue
+                if n != allow and not self._open(layer, nx, ny):
+                    continue
+                nd = d + (step if reverse else grid.move_cost(nx, ny))
+                if nd < dist.get(n, 1 << 30):
+                    dist[n] = nd
+                    prev[n] = cur
+                    heapq.heappush(heap, (nd, n))
+        return dist, prev
+
+    def _build_cluster(self, layer, c):
+        nodes = self._cluster_nodes(layer, c)
+        bounds = self._bounds(c)
+        edges = {}
+        for n in nodes:
+            dist, _prev = self._local(layer, n, bounds)
+            edges[n] = {m: dist[m] for m in nodes if m != n and m in dist}
+        layer.intra[c] = edges
+        self.rebuilds += 1
+
+    def _edges(self, layer, c):
+        # A dirty border always has both its clusters dirty, so borders that
+        # are still dirty after this belong to clusters not yet expanded.
+        if c in layer.dirty_clusters:
+            self._flush_borders(layer, c)
+            self._build_cluster(layer, c)
+            layer.dirty_clusters.discard(c)
+        return layer.intra.get(c, {})
+
+    def _walk(self, prev, goal):
+        out = []
+        cur = goal
+        while cur is not None:
+            out.append(cur)
+            cur = prev[cur]
+        out.reverse()
+        return out
+
+    def _refine(self, layer, a, b, allow=None):
+        ca = self.cluster_of(*a)
+        if ca != self.cluster_of(*b):
+            return [b]
+        _dist, prev = self._local(layer, a, self._bounds(ca), goal=b, allow=allow)
+        if b not in prev:
+            return None
+        return self._walk(prev, b)[1:]
+
+    def find_path(self, start, goal, team):
+        # Same result shape as Game.find_path: cells after start up to goal,
+        # or [] when there is no route. The goal may hold an enemy.
+        self.sync()
+        layer = self.layers[team]
+        if start == goal:
+            return []
+        if not self.game.grid.in_bounds(*goal):
+            return []
+        if self.game.grid.move_cost(*goal) >= IMPASSABLE_COST:
+            return []
+
+        cs_ = self.cluster_of(*start)
+        cg = self.cluster_of(*goal)
+        if cs_ == cg:
+            path = self._refine(layer, start, goal, allow=goal)
+            if path is not None:
+                return path
+
+        # Temporary edges from the start and into the goal.
+        d_start, _p = self._local(layer, start, self._bounds(cs_), allow=start)
+        d_goal, _p = self._local(layer, goal, self._bounds(cg), reverse=True, allow=goal)
+        start_edges = {n: d for n, d in d_start.items() if n in self._node_set(layer, cs_)}
+        goal_edges = {n: d for n, d in d_goal.items() if n in self._node_set(layer, cg)}
+        if not start_edges or not goal_edges:
+            # Walled in within its cluster: every route out or in crosses an
+            # entrance, so searching the rest of the map cannot help.
+            return []
+
+        gx, gy = goal
+        dist = {start: 0}
+        prev = {start: None}
+        heap = [(abs(start[0] - gx) + abs(start[1] - gy), 0, start)]
+        while heap:
+            _f, d, cur = heapq.heappop(heap)
+            if cur == goal:
+                break
+            if d > dist[cur]:
+                continue
+            if cur == start:
+                # A start on a border is itself an entrance with a way across.
+                nbrs = list(start_edges.items()) + list(layer.inter.get(start, {}).items())
+            else:
+                nbrs = list(self._edges(layer, self.cluster_of(*cur)).get(cur, {}).items())
+                nbrs += layer.inter.get(cur, {}).items()
+                if cur in goal_edges:
+                    nbrs.append((goal, goal_edges[cur]))
+            for n, c in nbrs:
+                nd = d + c
+                if nd < dist.get(n, 1 << 30):
+                    dist[n] = nd
+                    prev[n] = cur
+                    heapq.heappush(heap, (nd + ROUTE_WEIGHT * (abs(n[0] - gx) + abs(n[1] - gy)), nd, n))
+
+        if goal not in prev:
+            return []
+
+        # The clusters on the route and their neighbours, so the refined path
+        # can cut corners the entrances would otherwise force.
+        route = {self.cluster_of(*n) for n in self._walk(prev, goal)}
+        corridor = {(cx + dx, cy + dy) for cx, cy in route for dx, dy in _NEIGHBOURS}
+        return self._corridor_path(layer, start, goal, corridor) or []
+
+    def _corridor_path(self, layer, start, goal, clusters):
+        # A* over the cells of the clusters the abstract route passes through.
+        # Entrances sit at fixed points on each border, so stitching the
+        # entrance-to-entrance legs together zigzags; searching the corridor
+        # as a whole never does worse and is usually optimal.
+        grid = self.game.grid
+        cs = self.cs
+        w, h = self.w, self.h
+        gx, gy = goal
+        dist = {start: 0}
+        prev = {start: None}
+        heap = [(abs(start[0] - gx) + abs(start[1] - gy), 0, start)]
+        while heap:
+            _f, d, cur = heapq.heappop(heap)
+            if cur == goal:
+                break
+            if d > dist[cur]:
+                continue
+            x, y = cur
+            for n in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                nx, ny = n
+                if not (0 <= nx < w and 0 <= ny < h):
+                    continue
+                if (nx // cs, ny // cs) not in clusters:
+                    continue
+                if n != goal and not self._open(layer, nx, ny):
+                    continue
+                nd = d + grid.move_cost(nx, ny)
+                if nd < dist.get(n, 1 << 30):
+                    dist[n] = nd
+                    prev[n] = cur
+                    heapq.heappush(heap, (nd + abs(nx - gx) + abs(ny - gy), nd, n))
+        if goal not in prev:
+            return None
+        return self._walk(prev, goal)[1:]
+
+    def _node_set(self, layer, c):
+        return self._edges(layer, c).keys()
+
+    def stats(self):
+        return {
+            "clusters": self.ncx * self.ncy,
+            "rebuilds": self.rebuilds,
+            "nodes": {t: sum(len(e) for e in layer.intra.values()) for t, layer in self.layers.items()},
+        }
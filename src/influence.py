@@ -0,0 +1,147 @@
+IMPASSABLE_COST = 999
+
+
+def _diamond(r):
+    return [
+        (dx, dy)
+        for dy in range(-r, r + 1)
+        for dx in range(-r, r + 1)
+        if 0 < abs(dx) + abs(dy) <= r
+    ]
+
+
+class InfluenceMap:
+    def __init__(self, game, teams=(0, 1)):
+        self.game = game
+        self.teams = tuple(teams)
+        self.version = 0
+        self._offsets = {}
+        self.rebuild()
+
+    def rebuild(self):
+        grid = self.game.grid
+        self.w = grid.w
+        self.h = grid.h
+        self.cells = grid.terrain_cells()
+        self.move_cost = self.cells.move_cost
+        self.def_bonus = self.cells.def_bonus
+        n = self.w * self.h
+        self.damage = {t: [0] * n for t in self.teams}
+        self._contrib = {}
+        self._sig = {}
+        for i, u in enumerate(self.game.units):
+            self._apply(i, u)
+        self.version += 1
+
+    def _signature(self, u):
+        if not u.is_alive():
+            return None
+        return (u.x, u.y, u.hp, u.kind, u.team)
+
+    def _reach(self, sx, sy, move_points):
+        # Potential threat ignores unit blocking, so a change to one unit
+        # never invalidates the cached contribution of another.
+        w, h = self.w, self.h
+        cost = self.move_cost
+        start = sy * w + sx
+        dist = {start: 0}
+        frontier = [start]
+        while frontier:
+            nxt = []
+            for i in frontier:
+                x = i % w
+                y = i // w
+                d = dist[i]
+                if x > 0:
+                    nxt.append((i - 1, d))
+                if x < w - 1:
+                    nxt.append((i + 1, d))
+                if y > 0:
+                    nxt.append((i - w, d))
+                if y < h - 1:
+                    nxt.append((i + w, d))
+            frontier = []
+            for j, d in nxt:
+                c = cost[j]
+                if c >= IMPASSABLE_COST:
+                    continue
+                nd = d + c
+                if nd > move_points:
+                    continue
+                if j not in dist or nd < dist[j]:
+                    dist[j] = nd
+                    frontier.append(j)
+        return dist.keys()
+
+    def _threat_cells(self, u):
+        w, h = self.w, self.h
+        r = u.attack_range
+        offsets = self._offsets.get(r)
+        if offsets is None:
+            offsets = _diamond(r)
+            self._offsets[r] = offsets
+
+        cells = set()
+        for i in self._reach(u.x, u.y, u.move_points):
+            x = i % w
+            y = i // w
+            for dx, dy in offsets:
+                nx = x + dx
+                ny = y + dy
+                if 0 <= nx < w and 0 <= ny < h:
+                    cells.add(ny * w + nx)
+        return cells
+
+    def _apply(self, idx, u):
+        sig = self._signature(u)
+        self._sig[idx] = sig
+        if sig is None:
+            self._contrib[idx] = None
+            return
+
+        base = int(round(u.hp * (u.atk / 100.0)))
+        self.cells.reach_box(u.x, u.y, u.move_points, u.attack_range)
+        cells = sorted(self._threat_cells(u))
+        bonus = self.def_bonus
+        dmgs = [max(1, base - bonus[i]) for i in cells]
+
+        for t in self.teams:
+            if t == u.team:
+                continue
+            damage = self.damage[t]
+            for i, d in zip(cells, dmgs):
+                damage[i] += d
+
+        self._contrib[idx] = (u.team, cells, dmgs)
+
+    def _remove(self, idx):
+        contrib = self._contrib.get(idx)
+        if not contrib:
+            return
+        team, cells, dmgs = contrib
+        for t in self.teams:
+            if t == team:
+                continue
+            damage = self.damage[t]
+            for i, d in zip(cells, dmgs):
+                damage[i] -= d
+        self._contrib[idx] = None
+
+    def sync(self):
+        grid = self.game.grid
+        if grid.w != self.w or grid.h != self.h:
+            self.rebuild()
+            return
+
+        changed = False
+        for i, u in enumerate(self.game.units):
+            if self._sig.get(i, ()) != self._signature(u):
+                self._remove(i)
+                self._apply(i, u)
+                changed = True
+        if changed:
+            self.version += 1
+
+    def danger_map(self, team):
+        self.sync()
+        return self.damage[team]
@@ -0,0 +1,428 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from .defs import TILES
+from .grid import PRESET_ROWS, Grid, paint_from_rows, tiles_from_paint
+from .mapgen import generate, spawn_layout
+from .units import UNIT_DEFS, Unit
+
+MAGIC = b"GMAP"
+FORMAT_VERSION = 1
+DEFAULT_CHUNK = 32
+PAGE_ALIGN = 4096
+
+# magic, version, chunk size, w, h, terrain names, paint names, unit kinds
+_HEAD = struct.Struct("<4sHHIIHHH")
+
+# Spawn bytes: 0 is empty, otherwise team in the high nibble and kind index
+# plus one in the low nibble.
+MAX_TEAMS = 16
+MAX_KINDS = 15
+
+
+def _pack_names(names):
+    out = bytearray()
+    for name in names:
+        raw = name.encode("utf-8")
+        out.append(len(raw))
+        out += raw
+    return bytes(out)
+
+
+def _unpack_names(data, off, count):
+    names = []
+    for _ in range(count):
+        n = data[off]
+        names.append(bytes(data[off + 1:off + 1 + n]).decode("utf-8"))
+        off += 1 + n
+    return names, off
+
+
+def _align(n):
+    return (n + PAGE_ALIGN - 1) // PAGE_ALIGN * PAGE_ALIGN
+
+
+def chunk_bytes(cs):
+    # terrain cs*cs, paint (2cs)*(2cs), spawns cs*cs
+    return cs * cs * 6
+
+
+def write_map(path, tiles, paint, spawns=(), chunk=DEFAULT_CHUNK):
+    h = len(tiles)
+    w = len(tiles[0])
+    terrain_names = sorted({t for row in tiles for t in row})
+    paint_names = sorted({k for row in paint for k in row})
+    kind_names = sorted({kind for _team, kind, _x, _y in spawns})
+    if len(terrain_names) > 255 or len(paint_names) > 255:
+        raise ValueError("too many distinct terrain or paint names")
+    if len(kind_names) > MAX_KINDS:
+        raise ValueError("too many unit kinds")
+    tid = {n: i for i, n in enumerate(terrain_names)}
+    pid = {n: i for i, n in enumerate(paint_names)}
+    kid = {n: i for i, n in enumerate(kind_names)}
+
+    chunk_spawns = {}
+    for team, kind, x, y in spawns:
+        if not 0 <= team < MAX_TEAMS:
+            raise ValueError(f"team {team} out of range")
+        chunk_spawns.setdefault((x // chunk, y // chunk), []).append(
+            ((y % chunk) * chunk + x % chunk, (team << 4) | (kid[kind] + 1))
+        )
+
+    head = _HEAD.pack(
+        MAGIC, FORMAT_VERSION, chunk, w, h,
+        len(terrain_names), len(paint_names), len(kind_names),
+    )
+    head += _pack_names(terrain_names) + _pack_names(paint_names) + _pack_names(kind_names)
+    data_off = _align(len(head))
+
+    ncx = (w + chunk - 1) // chunk
+    ncy = (h + chunk - 1) // chunk
+    pc = chunk * 2
+    with open(path, "wb") as f:
+        f.write(head.ljust(data_off, b"\0"))
+        for cy in range(ncy):
+            for cx in range(ncx):
+                x0 = cx * chunk
+                y0 = cy * chunk
+                terrain = bytearray(chunk * chunk)
+                spawn = bytearray(chunk * chunk)
+                for ly in range(min(chunk, h - y0)):
+                    span = tiles[y0 + ly][x0:x0 + chunk]
+                    terrain[ly * chunk:ly * chunk + len(span)] = bytes([tid[t] for t in span])
+                for i, b in chunk_spawns.get((cx, cy), ()):
+                    spawn[i] = b
+                pbuf = bytearray(pc * pc)
+                for ly in range(min(pc, h * 2 - y0 * 2)):
+                    span = paint[y0 * 2 + ly][x0 * 2:x0 * 2 + pc]
+                    pbuf[ly * pc:ly * pc + len(span)] = bytes([pid[k] for k in span])
+                f.write(terrain)
+                f.write(pbuf)
+                f.write(spawn)
+
+
+class Chunk:
+    __slots__ = ("tiles", "paint")
+
+    def __init__(self, tiles, paint):
+        self.tiles = tiles
+        self.paint = paint
+
+
+class MapFile:
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.chunk, self.w, self.h,
+         nt, np_, nk) = _HEAD.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a map file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported map version {version}")
+        off = _HEAD.size
+        self.terrain_names, off = _unpack_names(self.mm, off, nt)
+        self.paint_names, off = _unpack_names(self.mm, off, np_)
+        self.kind_names, off = _unpack_names(self.mm, off, nk)
+        self.data_off = _align(off)
+        self.chunk_size = chunk_bytes(self.chunk)
+        self.ncx = (self.w + self.chunk - 1) // self.chunk
+        self.ncy = (self.h + self.chunk - 1) // self.chunk
+        self.chunks = {}
+        self.page_ins = 0
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    def close(self):
+        self.mm.close()
+        self._f.close()
+
+    def _offset(self, cx, cy):
+        return self.data_off + (cy * self.ncx + cx) * self.chunk_size
+
+    def _sections(self, cx, cy):
+        cs = self.chunk
+        off = self._offset(cx, cy)
+        t_end = off + cs * cs
+        p_end = t_end + cs * cs * 4
+        return off, t_end, p_end, p_end + cs * cs
+
+    def chunk_at(self, cx, cy):
+        c = self.chunks.get((cx, cy))
+        if c is not None:
+            return c
+        # Only this chunk's pages of the mapping are touched.
+        cs = self.chunk
+        pc = cs * 2
+        off, t_end, p_end, _end = self._sections(cx, cy)
+        terrain = self.mm[off:t_end]
+        praw = self.mm[t_end:p_end]
+        tn = self.terrain_names
+        pn = self.paint_names
+        tiles = [[tn[b] for b in terrain[r * cs:(r + 1) * cs]] for r in range(cs)]
+        paint = [[pn[b] for b in praw[r * pc:(r + 1) * pc]] for r in range(pc)]
+        c = Chunk(tiles, paint)
+        self.chunks[(cx, cy)] = c
+        self.page_ins += 1
+        return c
+
+    def spawns(self):
+        # Reads only the spawn section of each chunk.
+        cs = self.chunk
+        out = []
+        for cy in range(self.ncy):
+            for cx in range(self.ncx):
+                _o, _t, start, end = self._sections(cx, cy)
+                raw = self.mm[start:end]
+                if not raw.strip(b"\0"):
+                    continue
+                for i, b in enumerate(raw):
+                    if not b:
+                        continue
+                    x = cx * cs + i % cs
+                    y = cy * cs + i // cs
+                    out.append((b >> 4, self.kind_names[(b & 15) - 1], x, y))
+        out.sort(key=lambda s: (s[0], s[3], s[2]))
+        return out
+
+    def make_units(self):
+        return [
+            Unit(team=team, kind=kind, x=x, y=y, hp=UNIT_DEFS[kind]["max_hp"])
+            for team, kind, x, y in self.spawns()
+        ]
+
+
+class _ChunkRow:
+    __slots__ = ("mf", "layer", "shift", "cy", "ly", "length", "cache")
+
+    def __init__(self, mf, layer, shift, y, length):
+        self.mf = mf
+        self.layer = layer
+        self.shift = shift
+        self.cy = y >> shift
+        self.ly = y & ((1 << shift) - 1)
+        self.length = length
+        self.cache = [None] * mf.ncx
+
+    def _chunk(self, x):
+        cx = x >> self.shift
+        c = self.cache[cx]
+        if c is None:
+            c = self.cache[cx] = self.mf.chunk_at(cx, self.cy)
+        return c
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [self[i] for i in range(*x.indices(self.length))]
+        if x < 0:
+            x += self.length
+        if not 0 <= x < self.length:
+            raise IndexError(x)
+        c = self._chunk(x)
+        return getattr(c, self.layer)[self.ly][x & ((1 << self.shift) - 1)]
+
+    def __setitem__(self, x, value):
+        c = self._chunk(x)
+        getattr(c, self.layer)[self.ly][x & ((1 << self.shift) - 1)] = value
+
+    def __iter__(self):
+        for x in range(self.length):
+            yield self[x]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+class ChunkedLayer:
+    def __init__(self, mf, layer, scale):
+        shift = (mf.chunk * scale).bit_length() - 1
+        self.rows = [
+            _ChunkRow(mf, layer, shift, y, mf.w * scale) for y in range(mf.h * scale)
+        ]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, y):
+        return self.rows[y]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class StreamedGrid(Grid):
+    # A Grid whose tiles and paint are views over a MapFile; chunks are
+    # decoded the first time a cell in them is read. The file is read-only:
+    # edits change the decoded chunks in memory and are kept only if the
+    # grid is written out with save_grid.
+    def __init__(self, mapfile, load_assets=True):
+        # Grid.__init__ is skipped: it would build the preset map first.
+        if mapfile.chunk & (mapfile.chunk - 1):
+            raise ValueError("chunk size must be a power of two")
+        self.version = 0
+        self._view = None
+        self._view_key = None
+        self._cells = None
+        self.subtiles = None if load_assets else {}
+        self.mapfile = mapfile
+        self.w = mapfile.w
+        self.h = mapfile.h
+        self.paint_w = self.w * 2
+        self.paint_h = self.h * 2
+        self.tiles = ChunkedLayer(mapfile, "tiles", 1)
+        self.paint = ChunkedLayer(mapfile, "paint", 2)
+
+
+def open_map(path, load_assets=True):
+    mf = MapFile.open(path)
+    return StreamedGrid(mf, load_assets=load_assets), mf.make_units()
+
+
+def convert_rows(rows, out_path, w=None, h=None, spawns=None, chunk=DEFAULT_CHUNK):
+    # Converts the hand-written paint rows used by Grid._seed_map; logical
+    # tiles are derived from the paint and spawns are placed on them unless
+    # given.
+    w = w or max(len(r.split()) for r in rows) // 2
+    h = h or len(rows) // 2
+    paint = paint_from_rows(rows, w * 2, h * 2)
+    tiles = tiles_from_paint(paint, w, h)
+    if spawns is None:
+        spawns = spawn_layout(tiles)
+    write_map(out_path, tiles, paint, spawns, chunk)
+    return w, h, spawns
+
+
+def save_grid(path, grid, units=(), chunk=DEFAULT_CHUNK):
+    spawns = [(u.team, u.kind, u.x, u.y) for u in units]
+    write_map(path, [list(r) for r in grid.tiles], [list(r) for r in grid.paint], spawns, chunk)
+
+
+def validate(path):
+    errors = []
+    size = os.path.getsize(path)
+    if size < _HEAD.size:
+        return [f"file too short ({size} bytes)"]
+    try:
+        mf = MapFile.open(path)
+    except ValueError as e:
+        return [str(e)]
+    try:
+        cs = mf.chunk
+        if cs <= 0 or cs & (cs - 1):
+            errors.append(f"chunk size {cs} is not a power of two")
+            return errors
+        if mf.w <= 0 or mf.h <= 0:
+            errors.append(f"bad map size {mf.w}x{mf.h}")
+            return errors
+        expected = mf.data_off + mf.ncx * mf.ncy * mf.chunk_size
+        if size != expected:
+            errors.append(f"size {size} != expected {expected}")
+            return errors
+        for name in mf.terrain_names:
+            if name not in TILES:
+                errors.append(f"unknown terrain {name!r}")
+        for name in mf.kind_names:
+            if name not in UNIT_DEFS:
+                errors.append(f"unknown unit kind {name!r}")
+
+        nt = len(mf.terrain_names)
+        np_ = len(mf.paint_names)
+        nk = len(mf.kind_names)
+        pc = cs * 2
+        for cy in range(mf.ncy):
+            for cx in range(mf.ncx):
+                off, t_end, p_end, end = mf._sections(cx, cy)
+                terrain = mf.mm[off:t_end]
+                praw = mf.mm[t_end:p_end]
+                spawn = mf.mm[p_end:end]
+                vw = min(cs, mf.w - cx * cs)
+                vh = min(cs, mf.h - cy * cs)
+                if max(terrain) >= nt:
+                    errors.append(f"chunk {cx},{cy}: terrain id out of range")
+                if max(praw) >= np_:
+                    errors.append(f"chunk {cx},{cy}: paint id out of range")
+                for i, b in enumerate(spawn):
+                    if not b:
+                        continue
+                    lx, ly = i % cs, i // cs
+                    where = f"spawn at {cx * cs + lx},{cy * cs + ly}"
+                    if lx >= vw or ly >= vh:
+                        errors.append(f"{where}: outside the map")
+                    elif not 1 <= (b & 15) <= nk:
+                        errors.append(f"{where}: bad kind index")
+                    elif TILES.get(mf.terrain_names[terrain[i]], {}).get("move_cost", 999) >= 999:
+                        errors.append(f"{where}: impassable terrain")
+                pad = b"".join(
+                    terrain[r * cs + (vw if r < vh else 0):(r + 1) * cs] for r in range(cs)
+                )
+                if pad.strip(b"\0"):
+                    errors.append(f"chunk {cx},{cy}: non-zero padding")
+                if len(errors) > 100:
+                    errors.append("too many errors")
+                    return errors
+        return errors
+    finally:
+        mf.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert, generate and check chunked map files.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    conv = sub.add_parser("convert", help="write the built-in string-row map")
+    conv.add_argument("out")
+    conv.add_argument("--rows", metavar="FILE", help="text file with one paint row per line")
+    conv.add_argument("--chunk", type=int, default=DEFAULT_CHUNK)
+    gen = sub.add_parser("generate", help="write a procedurally generated map")
+    gen.add_argument("out")
+    gen.add_argument("--size", type=int, default=256)
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--chunk", type=int, default=DEFAULT_CHUNK)
+    val = sub.add_parser("validate")
+    val.add_argument("path")
+    info = sub.add_parser("info")
+    info.add_argument("path")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "convert":
+        rows = PRESET_ROWS
+        if args.rows:
+            with open(args.rows, encoding="utf-8") as f:
+                rows = [line for line in f.read().splitlines() if line.strip()]
+        w, h, spawns = convert_rows(rows, args.out, chunk=args.chunk)
+        print(f"wrote {args.out}: {w}x{h}, {len(spawns)} spawns")
+    elif args.cmd == "generate":
+        started = time.perf_counter()
+        gen = generate(args.size, args.size, seed=args.seed)
+        grid = Grid(load_assets=False, tiles=gen.tiles())
+        write_map(args.out, grid.tiles, grid.paint, gen.spawns, args.chunk)
+        secs = time.perf_counter() - started
+        print(f"wrote {args.out}: {args.size}x{args.size} in {secs:.2f}s")
+    elif args.cmd == "validate":
+        errors = validate(args.path)
+        for e in errors:
+            print(e)
+        print("ok" if not errors else f"{len(errors)} error(s)")
+        sys.exit(1 if errors else 0)
+    else:
+        started = time.perf_counter()
+        mf = MapFile.open(args.path)
+        secs = time.perf_counter() - started
+        print(
+            f"{args.path}: {mf.w}x{mf.h}, chunk {mf.chunk}, {mf.ncx * mf.ncy} chunks, "
+            f"{len(mf.terrain_names)} terrains, {len(mf.paint_names)} paint keys, "
+            f"opened in {secs * 1000:.2f}ms"
+        )
+        mf.close()
+
+
+if __name__ == "__main__":
+    main()
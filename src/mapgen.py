@@ -0,0 +1,325 @@
+import random
+import sys
+import time
+from array import array
+
+from .defs import TERRAIN
+from .units import UNIT_DEFS, Unit
+
+TERRAIN_IDS = ("PLAIN", "DIRT", "FOREST", "HILL", "WATER")
+TERRAIN_INDEX = {name: i for i, name in enumerate(TERRAIN_IDS)}
+PLAIN, DIRT, FOREST, HILL, WATER = range(len(TERRAIN_IDS))
+
+WATER_LEVEL = 0.34
+HILL_LEVEL = 0.68
+FOREST_LEVEL = 0.6
+DIRT_LEVEL = 0.38
+
+FEATURE_SCALE = 32
+OCTAVES = 3
+ELEV_LEVELS = 32
+MOIST_LEVELS = 8
+SPAWN_BAND = 3
+# Fixed-point bits for noise values and row weights. A packed row holds one
+# 64-bit lane per cell, wide enough for three octaves at 2 * FRAC_BITS.
+FRAC_BITS = 16
+LANE_BYTES = 8
+
+DEFAULT_ROSTERS = (
+    ("ARCHER",) * 9,
+    ("SOLDIER",) * 6,
+)
+
+
+def _smooth_weights(n):
+    return [(i / n) * (i / n) * (3 - 2 * (i / n)) for i in range(n)]
+
+
+def _pack(values):
+    lanes = array("Q", values)
+    if sys.byteorder != "little":
+        lanes.byteswap()
+    return int.from_bytes(lanes.tobytes(), "little")
+
+
+def _octave(rng, w, h, scale, gain):
+    # Value noise is separable: each lattice row is interpolated along x once
+    # and packed into one int, so an output row is top * (1 - t) + bot * t
+    # for every cell at once. Both terms are non-negative, so lanes never
+    # borrow from each other.
+    gw = w // scale + 2
+    gh = h // scale + 2
+    one = 1 << FRAC_BITS
+    wts = _smooth_weights(scale)
+    xrows = []
+    for _ in range(gh):
+        lrow = [rng.random() * gain * one for _ in range(gw)]
+        out = []
+        for gx in range(gw - 1):
+            a = lrow[gx]
+            d = lrow[gx + 1] - a
+            out.extend([int(a + d * t) for t in wts])
+        xrows.append(_pack(out[:w]))
+    bands = list(zip(xrows, xrows[1:]))
+    return bands, [int(t * one) for t in wts], scale
+
+
+def _octaves(rng, w, h, scale, levels):
+    norm = sum(0.5 ** i for i in range(OCTAVES))
+    return [
+        _octave(rng, w, h, max(2, scale >> i), levels * 0.5 ** i / norm)
+        for i in range(OCTAVES)
+    ]
+
+
+def _field_row(octaves, y):
+    one = 1 << FRAC_BITS
+    acc = 0
+    for bands, wts, scale in octaves:
+        g, f = divmod(y, scale)
+        top, bot = bands[g]
+        t = wts[f]
+        acc += top * (one - t) + bot * t
+    return acc
+
+
+def _classify_table():
+    # Index is elevation (0..31) * 8 + moisture (0..7), one byte per cell.
+    table = bytearray(256)
+    for e in range(ELEV_LEVELS):
+        for m in range(MOIST_LEVELS):
+            ev = (e + 0.5) / ELEV_LEVELS
+            mv = (m + 0.5) / MOIST_LEVELS
+            if ev < WATER_LEVEL:
+                t = WATER
+            elif ev > HILL_LEVEL:
+                t = HILL
+            elif mv > FOREST_LEVEL:
+                t = FOREST
+            elif mv < DIRT_LEVEL:
+                t = DIRT
+            else:
+                t = PLAIN
+            table[e * MOIST_LEVELS + m] = t
+    return bytes(table)
+
+
+_CLASSIFY = _classify_table()
+
+
+def terrain_rows(rng, w, h, scale=FEATURE_SCALE):
+    # Three octaves of elevation and moisture are summed a whole row at a
+    # time in packed ints, floored to their integer levels, combined into
+    # one byte per cell and mapped to terrain ids with bytes.translate.
+    elev = _octaves(rng, w, h, scale, ELEV_LEVELS)
+    moist = _octaves(rng, w, h, scale, MOIST_LEVELS)
+    shift = 2 * FRAC_BITS
+    low = _pack([0xFF] * w)
+    size = w * LANE_BYTES
+    rows = []
+    for y in range(h):
+        e = (_field_row(elev, y) >> shift) & low
+        m = (_field_row(moist, y) >> shift) & low
+        cells = (e * MOIST_LEVELS + m).to_bytes(size, "little")[::LANE_BYTES]
+        rows.append(bytearray(cells.translate(_CLASSIFY)))
+    return rows
+
+
+def rows_from_tiles(tiles):
+    index = TERRAIN_INDEX
+    return [bytearray([index[name] for name in row]) for row in tiles]
+
+
+def tiles_from_rows(rows):
+    names = TERRAIN_IDS
+    return [[names[b] for b in row] for row in rows]
+
+
+def _passable_table():
+    table = bytearray(256)
+    for i, name in enumerate(TERRAIN_IDS):
+        table[i] = 1 if TERRAIN.move_cost[TERRAIN.ids[name]] < 999 else 0
+    return bytes(table)
+
+
+def passable_rows(rows):
+    table = _passable_table()
+    return [bytes(r).translate(table) for r in rows]
+
+
+def _ford_id(table):
+    # Terrain used to open a path: DIRT unless the defs made it impassable.
+    return DIRT if table[DIRT] else table.index(1)
+
+
+def flood_fill(passable, sx, sy):
+    # Scanline fill over rows of 0/1 bytes; the work scales with the number of
+    # horizontal spans rather than the number of cells.
+    h = len(passable)
+    w = len(passable[0]) if h else 0
+    seen = [bytearray(w) for _ in range(h)]
+    if not passable[sy][sx]:
+        return seen
+    stack = [(sx, sy)]
+    while stack:
+        x, y = stack.pop()
+        row = passable[y]
+        if seen[y][x]:
+            continue
+        left = row.rfind(b"\0", 0, x) + 1
+        right = row.find(b"\0", x)
+        if right < 0:
+            right = w
+        seen[y][left:right] = b"\1" * (right - left)
+        for ny in (y - 1, y + 1):
+            if not 0 <= ny < h:
+                continue
+            nrow = passable[ny]
+            nseen = seen[ny]
+            x0 = left
+            while x0 < right:
+                x0 = nrow.find(b"\1", x0, right)
+                if x0 < 0:
+                    break
+                end = nrow.find(b"\0", x0, right)
+                if end < 0:
+                    end = right
+                gap = nseen.find(b"\0", x0, end)
+                if gap >= 0:
+                    stack.append((gap, ny))
+                x0 = end
+    return seen
+
+
+def _zone(w, team, band):
+    # Never past the middle column, so on a small map each team keeps its
+    # own half instead of the first roster taking every cell.
+    band = min(band, max(1, w // 2))
+    return range(0, band) if team == 0 else range(w - 1, w - 1 - band, -1)
+
+
+def _anchor(passable, team, band):
+    # Passable cell in a spawn zone closest to the middle row.
+    h = len(passable)
+    w = len(passable[0])
+    mid = h // 2
+    for x in _zone(w, team, band):
+        for dy in range(h):
+            for y in (mid - dy, mid + dy):
+                if 0 <= y < h and passable[y][x]:
+                    return (x, y)
+    return None
+
+
+def _carve(rows, ax, ay, bx, by):
+    # Fords any impassable cell along an L-shaped line so every cell on it
+    # is walkable.
+    table = _passable_table()
+    ford = _ford_id(table)
+    x, y = ax, ay
+    while True:
+        if not table[rows[y][x]]:
+            rows[y][x] = ford
+        if x != bx:
+            x += 1 if bx > x else -1
+        elif y != by:
+            y += 1 if by > y else -1
+        else:
+            return
+
+
+def ensure_connected(rows, band=SPAWN_BAND):
+    h = len(rows)
+    w = len(rows[0])
+    passable = passable_rows(rows)
+    for team in (0, 1):
+        if _anchor(passable, team, band) is None:
+            rows[h // 2][0 if team == 0 else w - 1] = _ford_id(_passable_table())
+            passable = passable_rows(rows)
+
+    a = _anchor(passable, 0, band)
+    b = _anchor(passable, 1, band)
+    seen = flood_fill(passable, *a)
+    if not seen[b[1]][b[0]]:
+        _carve(rows, a[0], a[1], b[0], b[1])
+        passable = passable_rows(rows)
+        seen = flood_fill(passable, *a)
+    return seen
+
+
+def place_spawns(seen, rosters=DEFAULT_ROSTERS, band=SPAWN_BAND):
+    h = len(seen)
+    w = len(seen[0])
+    mid = h // 2
+    spawns = []
+    taken = set()
+    for team, roster in enumerate(rosters):
+        zone_band = band
+        while True:
+            xs = list(_zone(w, team, zone_band))
+            cells = [
+                (x, y) for x in xs for y in range(h)
+                if seen[y][x] and (x, y) not in taken
+            ]
+            if len(cells) >= len(roster) or zone_band >= w // 2:
+                break
+            zone_band += 1
+        edge = 0 if team == 0 else w - 1
+        cells.sort(key=lambda c: (abs(c[1] - mid) + abs(c[0] - edge), c[1], c[0]))
+        for kind, (x, y) in zip(roster, cells):
+            taken.add((x, y))
+            spawns.append((team, kind, x, y))
+    return spawns
+
+
+def units_from_spawns(spawns):
+    return [
+        Unit(team=team, kind=kind, x=x, y=y, hp=UNIT_DEFS[kind]["max_hp"])
+        for team, kind, x, y in spawns
+    ]
+
+
+def spawn_layout(tiles, rosters=DEFAULT_ROSTERS, band=SPAWN_BAND):
+    passable = passable_rows(rows_from_tiles(tiles))
+    a = _anchor(passable, 0, band)
+    if a is None:
+        return []
+    return place_spawns(flood_fill(passable, *a), rosters, band)
+
+
+def spawn_units(grid, rosters=DEFAULT_ROSTERS, band=SPAWN_BAND):
+    return units_from_spawns(spawn_layout(grid.tiles, rosters, band))
+
+
+class GeneratedMap:
+    def __init__(self, seed, rows, spawns, elapsed_ms):
+        self.seed = seed
+        self.rows = rows
+        self.w = len(rows[0])
+        self.h = len(rows)
+        self.spawns = spawns
+        self.elapsed_ms = elapsed_ms
+
+    def tiles(self):
+        return tiles_from_rows(self.rows)
+
+    def make_units(self):
+        return units_from_spawns(self.spawns)
+
+    def apply(self, grid):
+        grid.set_tiles(self.tiles())
+        return grid
+
+
+def generate(w, h, seed=0, scale=FEATURE_SCALE, rosters=DEFAULT_ROSTERS,
+             band=SPAWN_BAND):
+    if w < 2 or h < 1:
+        raise ValueError("a map needs at least two columns, one per team")
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    scale = max(2, min(scale, min(w, h) // 2))
+    rows = terrain_rows(rng, w, h, scale)
+    seen = ensure_connected(rows, band)
+    spawns = place_spawns(seen, rosters, band)
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    return GeneratedMap(seed, rows, spawns, elapsed_ms)
@@ -0,0 +1,123 @@
+from bisect import bisect_left, bisect_right
+
+from .constants import MINIMAP_PX, MINIMAP_MARGIN, UI_H, TEAM_GREEN, TEAM_RED, WHITE, BLACK
+from .defs import TERRAIN
+
+UNKNOWN_COLOR = (0, 0, 0)
+
+
+class Minimap:
+    # Two cached layers: terrain, sampled one cell per pixel, and unit
+    # markers. A frame blits both and outlines the camera view.
+    def __init__(self, game, size=MINIMAP_PX):
+        self.game = game
+        self.size = size
+        self.rect = None
+        self._layout_key = None
+        self.terrain = None
+        self.markers = None
+        self._version = None
+        self._colors = None
+        self._marks = None
+        self.rebuilds = 0
+
+    def _layout(self, surf):
+        import pygame
+
+        grid = self.game.grid
+        scale = self.size / max(grid.w, grid.h)
+        mw = max(1, int(grid.w * scale))
+        mh = max(1, int(grid.h * scale))
+        w, h = surf.get_size()
+        rect = pygame.Rect(w - MINIMAP_MARGIN - mw, h - UI_H + (UI_H - mh) // 2, mw, mh)
+        if self._layout_key != (rect.size, grid.w, grid.h):
+            self._layout_key = (rect.size, grid.w, grid.h)
+            self._xs = [(2 * px + 1) * grid.w // (2 * mw) for px in range(mw)]
+            self._ys = [(2 * py + 1) * grid.h // (2 * mh) for py in range(mh)]
+            self.terrain = pygame.Surface((mw, mh))
+            self.markers = pygame.Surface((mw, mh), pygame.SRCALPHA)
+            self._version = None
+            self._marks = None
+        self.rect = rect
+
+    def _rebuild_terrain(self):
+        grid = self.game.grid
+        colors = dict(zip(TERRAIN.names, TERRAIN.color))
+        surf = self.terrain
+        for py, y in enumerate(self._ys):
+            row = grid.tiles[y]
+            for px, x in enumerate(self._xs):
+                surf.set_at((px, py), colors.get(row[x], UNKNOWN_COLOR))
+        self._version = grid.version
+        self._colors = TERRAIN.revision
+        self.rebuilds += 1
+
+    def tile_changed(self, x, y):
+        # Called after a single-cell change; any other terrain change leaves
+        # the versions apart and the next draw rebuilds the whole layer.
+        grid = self.game.grid
+        if self._version != grid.version - 1:
+            return
+        color = TERRAIN.color[TERRAIN.ids[grid.tiles[y][x]]]
+        for py in range(bisect_left(self._ys, y), bisect_right(self._ys, y)):
+            for px in range(bisect_left(self._xs, x), bisect_right(self._xs, x)):
+                self.terrain.set_at((px, py), color)
+        self._version = grid.version
+
+    def _unit_marks(self):
+        g = self.game
+        g.sync_visibility()
+        marks = []
+        for u in g.units:
+            if not u.is_alive():
+                continue
+            if u.team != g.view_team and not g.can_see(g.view_team, u.x, u.y):
+                continue
+            marks.append((u.x, u.y, u.team))
+        return tuple(marks)
+
+    def _draw_markers(self, marks):
+        grid = self.game.grid
+        mw, mh = self.markers.get_size()
+        self.markers.fill((0, 0, 0, 0))
+        for x, y, team in marks:
+            px = x * mw // grid.w
+            py = y * mh // grid.h
+            color = TEAM_GREEN if team == 0 else TEAM_RED
+            self.markers.fill(color, (px - 1, py - 1, 3, 3))
+        self._marks = marks
+
+    def draw(self, surf):
+        import pygame
+
+        self._layout(surf)
+        if self._version != self.game.grid.version or self._colors != TERRAIN.revision:
+            self._rebuild_terrain()
+        marks = self._unit_marks()
+        if marks != self._marks:
+            self._draw_markers(marks)
+
+        surf.blit(self.terrain, self.rect.topleft)
+        surf.blit(self.markers, self.rect.topleft)
+        pygame.draw.rect(surf, BLACK, self.rect.inflate(2, 2), 1)
+        pygame.draw.rect(surf, WHITE, self._view_rect(), 1)
+
+    def _view_rect(self):
+        import pygame
+
+        cam = self.game.camera
+        grid = self.game.grid
+        mw, mh = self.rect.size
+        t = cam.tile
+        x0 = cam.ox * mw // (grid.w * t)
+        y0 = cam.oy * mh // (grid.h * t)
+        x1 = min(mw, (cam.ox + cam.view_w) * mw // (grid.w * t))
+        y1 = min(mh, (cam.oy + cam.view_h) * mh // (grid.h * t))
+        return pygame.Rect(self.rect.left + x0, self.rect.top + y0, max(2, x1 - x0), max(2, y1 - y0))
+
+    def cell_at(self, px, py):
+        if self.rect is None or not self.rect.collidepoint(px, py):
+            return None
+        grid = self.game.grid
+        mw, mh = self.rect.size
+        return ((px - self.rect.left) * grid.w // mw, (py - self.rect.top) * grid.h // mh)
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import queue
+import threading
+
+import pygame
+
+from .game import Game
+from .server import DEFAULT_PORT, encode
+from .units import Unit
+
+
+class NetClient:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.inbox = queue.Queue()
+        self._loop = None
+        self._writer = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, timeout=5.0):
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise ConnectionError(f"could not connect to {self.host}:{self.port}")
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._main())
+
+    async def _main(self):
+        try:
+            reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        finally:
+            self._ready.set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                self.inbox.put({"type": "closed"})
+                return
+            self.inbox.put(json.loads(line))
+
+    def send(self, msg):
+        if self._writer is None:
+            return
+        self._loop.call_soon_threadsafe(self._writer.write, encode(msg))
+
+    def close(self):
+        if self._writer is not None:
+            self._loop.call_soon_threadsafe(self._writer.close)
+
+
+class RemoteGame:
+    def __init__(self, ui, client, team, match="default"):
+        self.ui = ui
+        self.client = client
+        self.team = team
+        self.game = None
+        self.seq = 0
+        # Server unit index -> local Unit; enemies in fog are not sent.
+        self.units = {}
+        client.send({"op": "join", "match": match, "team": team})
+
+    def _build(self, msg):
+        game = Game(self.ui, units=[], ai_teams=msg["ai_teams"])
+        game.replaying = True
+        game.view_team = self.team
+        game.fog_layer.team = self.team
+        game.grid.set_tiles(msg["tiles"])
+        game.pathfinder.rebuild()
+        game.camera.resize_world(game.grid.w, game.grid.h)
+        self.game = game
+        self.units = {}
+        self._apply_units(msg["units"], ())
+        game.visibility.rebuild()
+        game.influence.rebuild()
+        self._apply_meta(msg)
+
+    def _apply_units(self, rows, hidden):
+        # Returns whether units were added or removed.
+        g = self.game
+        added = False
+        for i, kind, team, x, y, hp, acted, moved in rows:
+            u = self.units.get(i)
+            if u is None:
+                u = Unit(team=team, kind=kind, x=x, y=y, hp=hp)
+                self.units[i] = u
+                g.units.append(u)
+                added = True
+            elif (u.x, u.y) != (x, y):
+                u.snap_to(x, y)
+            u.hp = hp
+            u.acted = bool(acted)
+            u.has_moved = bool(moved)
+        for i in hidden:
+            u = self.units.pop(i, None)
+            if u is not None:
+                g.units.remove(u)
+                if g.selected is u:
+                    g.clear_selection()
+        return added or bool(hidden)
+
+    def _server_index(self, unit):
+        for i, u in self.units.items():
+            if u is unit:
+                return i
+        return -1
+
+    def _apply_meta(self, msg):
+        g = self.game
+        g.turn_team = msg["turn_team"]
+        g.turn_number = msg["turn_number"]
+        g.winner = msg["winner"]
+        self.seq = msg["seq"]
+        g.recompute_hash()
+        if g.selected is not None:
+            if g.selected.acted or not g.selected.is_alive() or g.turn_team != self.team:
+                g.clear_selection()
+            else:
+                g.compute_reachable_and_attackables(g.selected)
+
+    def poll(self):
+        while True:
+            try:
+                msg = self.client.inbox.get_nowait()
+            except queue.Empty:
+                return
+            kind = msg.get("type")
+            if kind == "state":
+                self._build(msg)
+            elif kind == "delta" and self.game is not None:
+                if self._apply_units(msg["units"], msg.get("hidden", ())):
+                    # Both layers track units by list index, which shifts
+                    # when the roster changes.
+                    self.game.visibility.rebuild()
+                    self.game.influence.rebuild()
+                self._apply_meta(msg)
+            elif kind == "error" and self.game is not None:
+                self.game._log(f"server: {msg['msg']}")
+            elif kind == "closed" and self.game is not None:
+                self.game._log("disconnected")
+
+    def handle_event(self, e):
+        g = self.game
+        if g is not None and g.handle_view_event(e):
+            return
+        if g is None or g.winner is not None or g.turn_team != self.team:
+            return
+
+        if e.type == pygame.KEYDOWN:
+            if e.key == pygame.K_SPACE:
+                self.client.send({"op": "end_turn"})
+            if e.key == pygame.K_w and g.selected:
+                self.client.send({"op": "wait", "unit": self._server_index(g.selected)})
+
+        if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
+            cell = g.grid.cell_from_pixel(*e.pos, g.camera)
+            if cell is None:
+                return
+            sel = g.selected
+            if sel is not None and cell in g.attackables:
+                self.client.send({"op": "attack", "unit": self._server_index(sel), "x": cell[0], "y": cell[1]})
+            elif sel is not None and cell in g.reachable and g.unit_at(*cell) is None:
+                self.client.send({"op": "move", "unit": self._server_index(sel), "x": cell[0], "y": cell[1]})
+            else:
+                g.try_select(cell)
+
+    def defs_changed(self, change):
+        if self.game is not None:
+            self.game.defs_changed(change)
+
+    def update(self, dt_ms):
+        # All rules and AI run on the server; the local Game is only drawn.
+        self.poll()
+
+    def draw(self, surf):
+        if self.game is not None:
+            self.game.draw(surf)
@@ -0,0 +1,163 @@
+import argparse
+import bisect
+import time
+
+from .actionlog import (
+    REC_ATTACK,
+    REC_END_TURN,
+    REC_MOVE,
+    REC_SELECT,
+    REC_WAIT,
+    REC_HEAD,
+    decode_header,
+    decode_record,
+)
+from .game import Game
+from .grid import Grid
+from .units import Unit, team_name
+
+SNAPSHOT_EVERY_TURNS = 10
+
+
+def build_game(header):
+    grid = Grid(load_assets=False)
+    grid.set_tiles(header["tiles"])
+
+    units = []
+    for kind, team, x, y, hp, acted, has_moved in header["units"]:
+        u = Unit(team=team, kind=kind, x=x, y=y, hp=hp)
+        u.acted = acted
+        u.has_moved = has_moved
+        units.append(u)
+    game = Game(None, units=units, grid=grid, ai_teams=(), headless=True, seed=header["seed"])
+    game.replaying = True
+    game.turn_team = header["turn_team"]
+    game.turn_number = header["turn_number"]
+    game.recompute_hash()
+    return game
+
+
+class ReplayEngine:
+    def __init__(self, data, snapshot_every=SNAPSHOT_EVERY_TURNS):
+        self.data = data
+        self.header, self.start = decode_header(data)
+        self.snapshot_every = snapshot_every
+        self.reset()
+        self._snap_turns = []
+        self._snaps = {}
+        self._take_snapshot()
+
+    @classmethod
+    def load(cls, path, **kw):
+        with open(path, "rb") as f:
+            return cls(f.read(), **kw)
+
+    def reset(self):
+        self.game = build_game(self.header)
+        self.offset = self.start
+        self.applied = 0
+
+    def done(self):
+        return self.offset >= len(self.data)
+
+    def _capture(self):
+        g = self.game
+        units = [(u.x, u.y, u.hp, u.acted, getattr(u, "has_moved", False)) for u in g.units]
+        return (units, g.turn_team, g.turn_number, g.winner)
+
+    def _restore(self, state):
+        g = self.game
+        units, g.turn_team, g.turn_number, g.winner = state
+        for u, (x, y, hp, acted, has_moved) in zip(g.units, units):
+            u.snap_to(x, y)
+            u.hp = hp
+            u.acted = acted
+            u.has_moved = has_moved
+            u.attacking = False
+        g.projectiles = []
+        g.animating_unit = None
+        g.clear_selection()
+        g.recompute_hash()
+
+    def _take_snapshot(self):
+        turn = self.game.turn_number
+        if turn in self._snaps:
+            return
+        bisect.insort(self._snap_turns, turn)
+        self._snaps[turn] = (self.offset, self.applied, self._capture())
+
+    def step(self):
+        if self.done():
+            return None
+        kind, n = REC_HEAD.unpack_from(self.data, self.offset)
+        off = self.offset + REC_HEAD.size
+        payload = self.data[off:off + n]
+        self.offset = off + n
+        self.applied += 1
+        self._apply(kind, decode_record(kind, payload))
+
+        if kind == REC_END_TURN and self.game.turn_number % self.snapshot_every == 0:
+            self._take_snapshot()
+        return kind
+
+    def _apply(self, kind, rec):
+        g = self.game
+        units = g.units
+        if kind == REC_MOVE:
+            uid, path = rec
+            u = units[uid]
+            g.start_unit_path(u, path)
+            u.snap_to(*path[-1])
+            g.animating_unit = None
+            g.board_version += 1
+        elif kind == REC_ATTACK:
+            g.attack(units[rec[0]], units[rec[1]])
+        elif kind == REC_WAIT:
+            g.finish_unit_turn(units[rec[0]])
+        elif kind == REC_END_TURN:
+            g.end_turn()
+        elif kind == REC_SELECT:
+            g.selected = units[rec[0]]
+
+    def run(self):
+        while self.offset < len(self.data):
+            self.step()
+        return self.game
+
+    def seek(self, turn):
+        # Jump to the closest snapshot at or before the target whenever that is
+        # behind us or ahead of where we are, then fast-forward records.
+        i = bisect.bisect_right(self._snap_turns, turn) - 1
+        snap_turn = self._snap_turns[max(i, 0)]
+        if turn < self.game.turn_number or snap_turn > self.game.turn_number:
+            self.offset, self.applied, state = self._snaps[snap_turn]
+            self._restore(state)
+
+        while not self.done() and self.game.turn_number < turn:
+            self.step()
+        return self.game
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay a binary action log headlessly.")
+    ap.add_argument("log")
+    ap.add_argument("--turn", type=int, default=None, help="stop at the start of this turn")
+    args = ap.parse_args(argv)
+
+    started = time.perf_counter()
+    engine = ReplayEngine.load(args.log)
+    game = engine.run() if args.turn is None else engine.seek(args.turn)
+    secs = time.perf_counter() - started
+
+    winner = "none" if game.winner is None else team_name(game.winner)
+    print(
+        f"{engine.applied} records in {secs * 1000:.1f}ms; turn {game.turn_number}, "
+        f"{team_name(game.turn_team)} to move, winner {winner}, hash {game.hash:016x}"
+    )
+    for team in (0, 1):
+        alive = game.units_alive(team)
+        print(f"  {team_name(team)}: {len(alive)} alive, {sum(u.hp for u in alive)} hp")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import heapq
+import random
+import time
+from collections import deque
+
+from .selfplay import DEFAULT_MAX_TURNS, HEADLESS_STEP_MS, LAYOUTS, MAPS, make_game
+
+DEFAULT_SLICE_MS = 2.0
+DEFAULT_MAX_ACTIVE = 256
+STRIDE_ONE = 1 << 20
+
+POLICIES = ("round_robin", "priority")
+
+
+class ScheduledMatch:
+    __slots__ = (
+        "match_id", "seed", "layout", "map", "priority", "max_turns",
+        "game", "pass_value", "turns", "steps", "ai_ms", "run_ms",
+        "winner", "done", "_last_turn",
+    )
+
+    def __init__(self, match_id, seed, layout=0, map_kind=0, priority=1,
+                 max_turns=DEFAULT_MAX_TURNS):
+        self.match_id = match_id
+        self.seed = seed
+        self.layout = layout
+        self.map = map_kind
+        self.priority = max(1, int(priority))
+        self.max_turns = max_turns
+        self.game = None
+        self.pass_value = 0
+        self.turns = 0
+        self.steps = 0
+        self.ai_ms = 0.0
+        self.run_ms = 0.0
+        self.winner = None
+        self.done = False
+        self._last_turn = 1
+
+    @property
+    def stride(self):
+        return STRIDE_ONE // self.priority
+
+    def activate(self):
+        self.game = make_game(self.seed, self.layout, self.map)
+        self._last_turn = self.game.turn_number
+
+    def _finish(self):
+        self.winner = self.game.winner
+        self.done = True
+        # Finished matches keep only their counters.
+        self.game = None
+
+    def run_slice(self, slice_ms):
+        g = self.game
+        started = time.perf_counter()
+        deadline = started + slice_ms / 1000.0
+        while True:
+            t0 = time.perf_counter()
+            in_ai = g.in_ai_turn
+            g.update(HEADLESS_STEP_MS)
+            t1 = time.perf_counter()
+            if in_ai or g.in_ai_turn:
+                self.ai_ms += (t1 - t0) * 1000.0
+            self.steps += 1
+
+            if g.turn_number != self._last_turn:
+                self.turns += g.turn_number - self._last_turn
+                self._last_turn = g.turn_number
+
+            if g.winner is not None or g.turn_number > self.max_turns:
+                break
+            if t1 >= deadline:
+                break
+
+        self.run_ms += (time.perf_counter() - started) * 1000.0
+        if g.winner is not None or g.turn_number > self.max_turns:
+            self._finish()
+
+    def stats(self):
+        secs = self.run_ms / 1000.0
+        return {
+            "match_id": self.match_id,
+            "turns": self.turns,
+            "steps": self.steps,
+            "winner": self.winner,
+            "turns_per_sec": self.turns / secs if secs > 0 else 0.0,
+            "ai_ms_per_turn": self.ai_ms / self.turns if self.turns else 0.0,
+        }
+
+
+class MatchScheduler:
+    def __init__(self, policy="round_robin", slice_ms=DEFAULT_SLICE_MS,
+                 max_active=DEFAULT_MAX_ACTIVE):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}")
+        self.policy = policy
+        self.slice_ms = slice_ms
+        self.max_active = max_active
+        self.pending = deque()
+        self.finished = []
+        self._rr = deque()
+        self._heap = []
+        self._active = 0
+        self._seq = 0
+        self._global_pass = 0
+        self.wall_ms = 0.0
+
+    def add(self, match):
+        self.pending.append(match)
+        return match
+
+    def add_seeded(self, count, seed=0, layouts=LAYOUTS, maps=MAPS, priority=1,
+                   max_turns=DEFAULT_MAX_TURNS):
+        rng = random.Random(seed)
+        base = len(self.pending) + self._active + len(self.finished)
+        for i in range(count):
+            self.add(ScheduledMatch(
+                base + i,
+                rng.getrandbits(63),
+                LAYOUTS.index(layouts[i % len(layouts)]),
+                MAPS.index(maps[(i // len(layouts)) % len(maps)]),
+                priority=priority,
+                max_turns=max_turns,
+            ))
+
+    def _enqueue(self, m):
+        if self.policy == "round_robin":
+            self._rr.append(m)
+        else:
+            self._seq += 1
+            heapq.heappush(self._heap, (m.pass_value, self._seq, m))
+
+    def _admit(self):
+        # Games are only built when they get a slot, so queued matches cost a
+        # handful of ints each.
+        while self.pending and self._active < self.max_active:
+            m = self.pending.popleft()
+            m.activate()
+            m.pass_value = self._global_pass
+            self._active += 1
+            self._enqueue(m)
+
+    def _next(self):
+        if self.policy == "round_robin":
+            return self._rr.popleft() if self._rr else None
+        if not self._heap:
+            return None
+        m = heapq.heappop(self._heap)[2]
+        self._global_pass = m.pass_value
+        return m
+
+    def tick(self):
+        self._admit()
+        m = self._next()
+        if m is None:
+            return 0
+        m.run_slice(self.slice_ms)
+        if m.done:
+            self._active -= 1
+            self.finished.append(m)
+        else:
+            m.pass_value += m.stride
+            self._enqueue(m)
+        return 1
+
+    def idle(self):
+        return not self.pending and self._active == 0
+
+    def run(self, max_wall_ms=None):
+        started = time.perf_counter()
+        while not self.idle():
+            self.tick()
+            if max_wall_ms is not None and (time.perf_counter() - started) * 1000.0 >= max_wall_ms:
+                break
+        self.wall_ms += (time.perf_counter() - started) * 1000.0
+
+    def running(self):
+        if self.policy == "round_robin":
+            return list(self._rr)
+        return [entry[2] for entry in self._heap]
+
+    def report(self):
+        matches = self.finished + self.running()
+        turns = sum(m.turns for m in matches)
+        ai_ms = sum(m.ai_ms for m in matches)
+        secs = self.wall_ms / 1000.0
+        return {
+            "matches": len(matches),
+            "finished": len(self.finished),
+            "turns": turns,
+            "turns_per_sec": turns / secs if secs > 0 else 0.0,
+            "ai_ms_per_turn": ai_ms / turns if turns else 0.0,
+            "per_match": [m.stats() for m in matches],
+        }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Step many headless matches in one process.")
+    ap.add_argument("--matches", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--policy", choices=POLICIES, default="round_robin")
+    ap.add_argument("--slice-ms", type=float, default=DEFAULT_SLICE_MS)
+    ap.add_argument("--max-active", type=int, default=DEFAULT_MAX_ACTIVE)
+    ap.add_argument("--verbose", action="store_true", help="print per-match stats")
+    args = ap.parse_args(argv)
+
+    sched = MatchScheduler(args.policy, args.slice_ms, args.max_active)
+    sched.add_seeded(args.matches, seed=args.seed)
+    sched.run()
+
+    rep = sched.report()
+    print(
+        f"{rep['finished']}/{rep['matches']} matches, {rep['turns']} turns in "
+        f"{sched.wall_ms / 1000.0:.2f}s: {rep['turns_per_sec']:.1f} turns/s, "
+        f"{rep['ai_ms_per_turn']:.2f} AI ms/turn"
+    )
+    if args.verbose:
+        for st in rep["per_match"]:
+            print(
+                f"  #{st['match_id']}: {st['turns']} turns, winner {st['winner']}, "
+                f"{st['turns_per_sec']:.1f} turns/s, {st['ai_ms_per_turn']:.2f} AI ms/turn"
+            )
+
+
+if __name__ == "__main__":
+    main()
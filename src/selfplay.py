@@ -0,0 +1,368 @@
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+from .defs import TILES, TERRAIN, compile_defs
+from .game import Game
+from .grid import Grid
+from .mapgen import generate, spawn_units
+from .units import UNIT_DEFS, Unit
+
+HEADLESS_STEP_MS = 1000
+DEFAULT_MAX_TURNS = 200
+ROW_GROUP_SIZE = 4096
+
+LAYOUTS = ("default", "mirror", "random")
+MAPS = ("preset", "scatter", "open", "noise")
+
+MAGIC = b"TGSP"
+FORMAT_VERSION = 1
+
+_BASE_COLUMNS = [
+    ("match_id", "I"),
+    ("seed", "Q"),
+    ("layout", "B"),
+    ("map", "B"),
+    ("override", "H"),
+    ("winner", "b"),
+    ("turns", "H"),
+    ("tt_probes", "I"),
+    ("tt_hits", "I"),
+]
+
+_WORKER_OVERRIDES = []
+_DEFAULT_UNIT_DEFS = None
+_DEFAULT_TILES = None
+
+
+def damage_column(kind):
+    return "dmg_" + kind
+
+
+def result_columns(kinds):
+    return _BASE_COLUMNS + [(damage_column(k), "I") for k in kinds]
+
+
+def _apply_overrides(override):
+    UNIT_DEFS.clear()
+    UNIT_DEFS.update(copy.deepcopy(_DEFAULT_UNIT_DEFS))
+    TILES.clear()
+    TILES.update(copy.deepcopy(_DEFAULT_TILES))
+
+    if override:
+        for kind, fields in override.get("units", {}).items():
+            UNIT_DEFS.setdefault(kind, {}).update(fields)
+        for tile, fields in override.get("tiles", {}).items():
+            TILES.setdefault(tile, {}).update(fields)
+    compile_defs()
+
+
+def _worker_init(overrides):
+    global _WORKER_OVERRIDES, _DEFAULT_UNIT_DEFS, _DEFAULT_TILES
+    _WORKER_OVERRIDES = overrides
+    _DEFAULT_UNIT_DEFS = copy.deepcopy(UNIT_DEFS)
+    _DEFAULT_TILES = copy.deepcopy(TILES)
+
+
+def _passable(grid, x, y):
+    return TERRAIN.move_cost[TERRAIN.ids[grid.tiles[y][x]]] < 999
+
+
+def _scatter_map(grid, rng, density):
+    weights = (("FOREST", 0.5), ("HILL", 0.35), ("WATER", 0.15))
+    for y in range(grid.h):
+        for x in range(grid.w):
+            if rng.random() >= density:
+                continue
+            r = rng.random()
+            acc = 0.0
+            for name, wgt in weights:
+                acc += wgt
+                if r < acc:
+                    grid.tiles[y][x] = name
+                    break
+
+
+def build_map(grid, map_kind, rng):
+    if map_kind == "preset":
+        return
+    if map_kind == "noise":
+        generate(grid.w, grid.h, seed=rng.getrandbits(63)).apply(grid)
+        return
+    for row in grid.tiles:
+        for x in range(len(row)):
+            row[x] = "PLAIN"
+    if map_kind == "scatter":
+        _scatter_map(grid, rng, 0.2)
+
+
+def _zone_cells(grid, team):
+    band = max(1, grid.w // 3)
+    xs = range(0, band) if team == 0 else range(grid.w - band, grid.w)
+    return [(x, y) for x in xs for y in range(grid.h) if _passable(grid, x, y)]
+
+
+def build_units(grid, layout, rng):
+    if layout == "default":
+        return spawn_units(grid)
+
+    kinds = sorted(UNIT_DEFS)
+    n = 6 + rng.randrange(7)
+    if layout == "mirror":
+        roster = [rng.choice(kinds) for _ in range(n)]
+        rosters = (roster, roster)
+    else:
+        rosters = (
+            [rng.choice(kinds) for _ in range(n)],
+            [rng.choice(kinds) for _ in range(n)],
+        )
+
+    units = []
+    for team in (0, 1):
+        cells = _zone_cells(grid, team)
+        rng.shuffle(cells)
+        for kind, (x, y) in zip(rosters[team], cells):
+            units.append(Unit(team=team, kind=kind, x=x, y=y, hp=UNIT_DEFS[kind]["max_hp"]))
+    return units
+
+
+def make_game(seed, layout_i=0, map_i=0):
+    rng = random.Random(seed)
+    grid = Grid(load_assets=False)
+    build_map(grid, MAPS[map_i], rng)
+    units = build_units(grid, LAYOUTS[layout_i], rng)
+    return Game(None, units=units, grid=grid, ai_teams=(0, 1), headless=True, seed=seed)
+
+
+def run_match(task):
+    match_id, seed, layout_i, map_i, override_i, max_turns = task
+    _apply_overrides(_WORKER_OVERRIDES[override_i] if _WORKER_OVERRIDES else None)
+
+    game = make_game(seed, layout_i, map_i)
+    while game.winner is None and game.turn_number <= max_turns:
+        game.update(HEADLESS_STEP_MS)
+
+    row = {
+        "match_id": match_id,
+        "seed": seed,
+        "layout": layout_i,
+        "map": map_i,
+        "override": override_i,
+        "winner": -1 if game.winner is None else game.winner,
+        "turns": min(game.turn_number, 0xFFFF),
+    }
+    stats = game.tt.stats()
+    row["tt_probes"] = stats["probes"]
+    row["tt_hits"] = stats["hits"]
+    for kind, dmg in game.damage_dealt.items():
+        row[damage_column(kind)] = dmg
+    return row
+
+
+class ColumnarWriter:
+    def __init__(self, path, columns, group_size=ROW_GROUP_SIZE):
+        self.columns = columns
+        self.group_size = group_size
+        self.rows = 0
+        self._buf = {name: array(code) for name, code in columns}
+        self._pending = 0
+        self._f = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        self._f.write(MAGIC)
+        self._f.write(struct.pack("<HH", FORMAT_VERSION, len(self.columns)))
+        for name, code in self.columns:
+            raw = name.encode("utf-8")
+            self._f.write(struct.pack("<B", len(raw)))
+            self._f.write(raw)
+            self._f.write(code.encode("ascii"))
+
+    def append(self, row):
+        for name, _ in self.columns:
+            self._buf[name].append(row.get(name, 0))
+        self._pending += 1
+        self.rows += 1
+        if self._pending >= self.group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        self._f.write(struct.pack("<I", self._pending))
+        for name, code in self.columns:
+            col = self._buf[name]
+            if sys.byteorder != "little":
+                col.byteswap()
+            col.tofile(self._f)
+            self._buf[name] = array(code)
+        self._pending = 0
+        self._f.flush()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+
+def read_columns(path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path}: not a self-play results file")
+    version, ncols = struct.unpack_from("<HH", data, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported version {version}")
+
+    off = 8
+    columns = []
+    for _ in range(ncols):
+        n = data[off]
+        off += 1
+        name = data[off:off + n].decode("utf-8")
+        off += n
+        code = chr(data[off])
+        off += 1
+        columns.append((name, code))
+
+    out = {name: array(code) for name, code in columns}
+    while off < len(data):
+        (nrows,) = struct.unpack_from("<I", data, off)
+        off += 4
+        for name, code in columns:
+            size = nrows * array(code).itemsize
+            chunk = array(code)
+            chunk.frombytes(data[off:off + size])
+            if sys.byteorder != "little":
+                chunk.byteswap()
+            out[name].extend(chunk)
+            off += size
+    return out
+
+
+def wilson_interval(wins, n, z=1.96):
+    if n == 0:
+        return (0.0, 0.0)
+    p = wins / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+
+def aggregate(cols, group_by="override"):
+    kinds = [name[4:] for name in cols if name.startswith("dmg_")]
+    groups = {}
+    keys = cols[group_by]
+    for i in range(len(keys)):
+        groups.setdefault(keys[i], []).append(i)
+
+    report = {}
+    for key, rows in sorted(groups.items()):
+        n = len(rows)
+        winners = [cols["winner"][i] for i in rows]
+        entry = {"matches": n, "draws": winners.count(-1)}
+        for team in (0, 1):
+            wins = winners.count(team)
+            lo, hi = wilson_interval(wins, n)
+            entry[f"team{team}_win_rate"] = wins / n
+            entry[f"team{team}_ci95"] = (lo, hi)
+        entry["mean_turns"] = sum(cols["turns"][i] for i in rows) / n
+        if "tt_probes" in cols:
+            probes = sum(cols["tt_probes"][i] for i in rows)
+            entry["tt_hit_rate"] = sum(cols["tt_hits"][i] for i in rows) / max(probes, 1)
+        for kind in kinds:
+            col = cols[damage_column(kind)]
+            entry[f"mean_dmg_{kind}"] = sum(col[i] for i in rows) / n
+        report[key] = entry
+    return report
+
+
+def make_tasks(matches, seed, layouts, maps, n_overrides, max_turns):
+    rng = random.Random(seed)
+    for match_id in range(matches):
+        yield (
+            match_id,
+            rng.getrandbits(63),
+            LAYOUTS.index(layouts[match_id % len(layouts)]),
+            MAPS.index(maps[(match_id // len(layouts)) % len(maps)]),
+            match_id % n_overrides,
+            max_turns,
+        )
+
+
+def run_batch(out_path, matches, workers=None, seed=0, layouts=LAYOUTS, maps=MAPS,
+              overrides=None, max_turns=DEFAULT_MAX_TURNS):
+    overrides = list(overrides) if overrides else [None]
+    workers = workers or os.cpu_count() or 1
+    kinds = sorted(set(UNIT_DEFS) | {k for o in overrides if o for k in o.get("units", {})})
+    writer = ColumnarWriter(out_path, result_columns(kinds))
+
+    tasks = make_tasks(matches, seed, layouts, maps, len(overrides), max_turns)
+    # Small chunks keep every worker busy to the end; large enough ones keep
+    # IPC overhead negligible next to a match.
+    chunksize = max(1, min(64, matches // (workers * 16)))
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_worker_init, initargs=(overrides,)) as pool:
+        for row in pool.imap_unordered(run_match, tasks, chunksize=chunksize):
+            writer.append(row)
+    writer.close()
+    return writer.rows, time.perf_counter() - started
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless self-play for balance testing.")
+    ap.add_argument("--matches", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS)
+    ap.add_argument("--layout", action="append", choices=LAYOUTS)
+    ap.add_argument("--map", action="append", choices=MAPS)
+    ap.add_argument(
+        "--override",
+        action="append",
+        help='JSON like \'{"units": {"ARCHER": {"atk": 25}}, "tiles": {"HILL": {"def_bonus": 3}}}\'',
+    )
+    ap.add_argument("--out", default="selfplay.tgsp")
+    ap.add_argument("--report", metavar="FILE", help="only aggregate an existing results file")
+    args = ap.parse_args(argv)
+
+    path = args.report or args.out
+    if not args.report:
+        overrides = [json.loads(o) for o in args.override] if args.override else None
+        rows, secs = run_batch(
+            args.out,
+            args.matches,
+            workers=args.workers,
+            seed=args.seed,
+            layouts=args.layout or LAYOUTS,
+            maps=args.map or MAPS,
+            overrides=overrides,
+            max_turns=args.max_turns,
+        )
+        print(f"{rows} matches in {secs:.1f}s ({rows / max(secs, 1e-9):.1f}/s) -> {args.out}")
+
+    for key, entry in aggregate(read_columns(path)).items():
+        lo, hi = entry["team0_ci95"]
+        print(
+            f"override {key}: n={entry['matches']} green={entry['team0_win_rate']:.3f} "
+            f"[{lo:.3f}, {hi:.3f}] draws={entry['draws']} turns={entry['mean_turns']:.1f}"
+        )
+        if "tt_hit_rate" in entry:
+            print(f"    tt hit rate: {entry['tt_hit_rate']:.3f}")
+        for name, value in entry.items():
+            if name.startswith("mean_dmg_"):
+                print(f"    {name[9:]}: {value:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import json
+
+from .game import AI_TEAM, Game
+
+HEADLESS_STEP_MS = 1000
+DEFAULT_PORT = 7777
+
+
+def encode(msg):
+    return (json.dumps(msg, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def unit_state(u):
+    return (u.x, u.y, u.hp, 1 if u.acted else 0, 1 if getattr(u, "has_moved", False) else 0)
+
+
+class Match:
+    def __init__(self, name, ai_teams=(AI_TEAM,)):
+        self.name = name
+        self.game = Game(None, ai_teams=ai_teams, headless=True)
+        self.teams = tuple(sorted({u.team for u in self.game.units}))
+        self.clients = {}
+        self.seq = 0
+        # What each team was last sent: unit rows by index, None if hidden.
+        self._sent_units = {}
+        self._sent_meta = {}
+        self.ai_task = None
+
+    def _meta(self):
+        g = self.game
+        return (g.turn_team, g.turn_number, g.winner)
+
+    def _view(self, team):
+        # Enemies in fog are left out so a client cannot read the board.
+        g = self.game
+        g.sync_visibility()
+        rows = []
+        for u in g.units:
+            if u.team != team and not (u.is_alive() and g.can_see(team, u.x, u.y)):
+                rows.append(None)
+            else:
+                rows.append((u.kind, u.team, *unit_state(u)))
+        return rows
+
+    def full_state(self, team):
+        g = self.game
+        rows = self._view(team)
+        self._sent_units[team] = rows
+        self._sent_meta[team] = self._meta()
+        return {
+            "type": "state",
+            "match": self.name,
+            "seq": self.seq,
+            "w": g.grid.w,
+            "h": g.grid.h,
+            "tiles": g.grid.tiles,
+            "units": [[i, *row] for i, row in enumerate(rows) if row is not None],
+            "turn_team": g.turn_team,
+            "turn_number": g.turn_number,
+            "winner": g.winner,
+            "ai_teams": sorted(g.ai_teams),
+        }
+
+    def make_delta(self, team):
+        rows = self._view(team)
+        sent = self._sent_units[team]
+        changed = []
+        hidden = []
+        for i, row in enumerate(rows):
+            if i < len(sent) and sent[i] == row:
+                continue
+            if row is None:
+                hidden.append(i)
+            else:
+                changed.append([i, *row])
+        self._sent_units[team] = rows
+
+        meta = self._meta()
+        if not changed and not hidden and meta == self._sent_meta[team]:
+            return None
+        self._sent_meta[team] = meta
+        msg = {"type": "delta", "seq": self.seq, "units": changed, "hidden": hidden}
+        msg["turn_team"], msg["turn_number"], msg["winner"] = meta
+        return msg
+
+    async def send(self, writer, msg):
+        try:
+            writer.write(encode(msg))
+            await writer.drain()
+        except (ConnectionError, RuntimeError):
+            self.clients.pop(writer, None)
+
+    async def sync(self):
+        msgs = {}
+        for team in set(self.clients.values()):
+            msg = self.make_delta(team)
+            if msg:
+                msgs[team] = msg
+        if not msgs:
+            return
+        self.seq += 1
+        for writer, team in list(self.clients.items()):
+            msg = msgs.get(team)
+            if msg:
+                msg["seq"] = self.seq
+                await self.send(writer, msg)
+
+    def apply(self, team, msg):
+        g = self.game
+        op = msg.get("op")
+        if g.winner is not None:
+            return "match is over"
+        if team != g.turn_team or team in g.ai_teams:
+            return "not your turn"
+
+        if op == "end_turn":
+            g.end_turn()
+            return None
+
+        try:
+            unit = g.units[int(msg["unit"])]
+        except (KeyError, IndexError, TypeError, ValueError):
+            return "bad unit"
+        if unit.team != team or not unit.is_alive() or unit.acted:
+            return "unit cannot act"
+
+        g.ensure_flags(unit)
+        g.selected = unit
+        g.compute_reachable_and_attackables(unit)
+
+        if op == "wait":
+            g.finish_unit_turn(unit)
+            return None
+
+        try:
+            cell = (int(msg["x"]), int(msg["y"]))
+        except (KeyError, TypeError, ValueError):
+            return "bad cell"
+
+        if op == "attack":
+            if cell not in g.attackables:
+                return "target not attackable"
+            g.attack(unit, g.unit_at(*cell))
+            return None
+
+        if op == "move":
+            if unit.has_moved:
+                return "unit already moved"
+            if cell not in g.reachable or g.unit_at(*cell) is not None:
+                return "cell not reachable"
+            path = g.find_path(unit.pos(), cell)
+            if not path:
+                return "no path"
+            g.move_unit_now(unit, path)
+            return None
+
+        return f"unknown op {op!r}"
+
+    async def run_ai(self):
+        # The AI is stepped in the same small increments the renderer would
+        # use, yielding between steps so other matches and sockets stay live.
+        g = self.game
+        try:
+            while g.winner is None and g.turn_team in g.ai_teams:
+                g.update(HEADLESS_STEP_MS)
+                await self.sync()
+                await asyncio.sleep(0)
+        finally:
+            self.ai_task = None
+
+    def kick_ai(self):
+        g = self.game
+        if self.ai_task is None and g.winner is None and g.turn_team in g.ai_teams:
+            self.ai_task = asyncio.get_running_loop().create_task(self.run_ai())
+
+
+class MatchServer:
+    def __init__(self, ai_teams=(AI_TEAM,)):
+        # AI seats are set by the server, never by a joining client.
+        self.ai_teams = tuple(ai_teams)
+        self.matches = {}
+
+    def get_match(self, name):
+        m = self.matches.get(name)
+        if m is None:
+            m = Match(name, self.ai_teams)
+            self.matches[name] = m
+        return m
+
+    async def handle_client(self, reader, writer):
+        match = None
+        team = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    msg = None
+                if not isinstance(msg, dict):
+                    writer.write(encode({"type": "error", "msg": "bad json"}))
+                    continue
+
+                if msg.get("op") == "join":
+                    if match is not None:
+                        self.leave(match, writer)
+                        match = None
+                    joined = self.get_match(str(msg.get("match", "default")))
+                    try:
+                        team = int(msg.get("team", 0))
+                    except (TypeError, ValueError):
+                        team = None
+                    if team not in joined.teams or team in joined.game.ai_teams:
+                        self.leave(joined, writer)
+                        writer.write(encode({"type": "error", "msg": "bad team"}))
+                        await writer.drain()
+                        continue
+                    match = joined
+                    # Flush pending changes so other clients of this team
+                    # are not left behind when the team's view is reset.
+                    await match.sync()
+                    match.clients[writer] = team
+                    await match.send(writer, match.full_state(team))
+                    match.kick_ai()
+                    continue
+
+                if match is None:
+                    writer.write(encode({"type": "error", "msg": "join a match first"}))
+                    continue
+
+                err = match.apply(team, msg)
+                if err:
+                    writer.write(encode({"type": "error", "msg": err}))
+                    await writer.drain()
+                    continue
+                await match.sync()
+                match.kick_ai()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if match is not None:
+                self.leave(match, writer)
+            writer.close()
+
+    def leave(self, match, writer):
+        # A match nobody is connected to is dropped, cancelling its AI.
+        match.clients.pop(writer, None)
+        if match.clients:
+            return
+        if match.ai_task is not None:
+            match.ai_task.cancel()
+        if self.matches.get(match.name) is match:
+            del self.matches[match.name]
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_client, host, port)
+
+
+async def serve(host, port, ai_teams=(AI_TEAM,)):
+    server = await MatchServer(ai_teams).start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Host networked matches.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument(
+        "--ai-team", type=int, action="append", choices=(0, 1),
+        help=f"team played by the server (default {AI_TEAM})",
+    )
+    args = ap.parse_args(argv)
+    ai_teams = tuple(sorted(set(args.ai_team))) if args.ai_team else (AI_TEAM,)
+    if len(ai_teams) > 1:
+        ap.error("at least one team must be left to players")
+    asyncio.run(serve(args.host, args.port, ai_teams))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+
+from .game import AI_TEAM, Game
+from .grid import Grid
+from .units import Unit, get_arrow_sprite
+
+MAGIC = b"TGSS"
+FORMAT_VERSION = 1
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+SEC_META = 1
+SEC_GRID = 2
+SEC_UNITS = 3
+SEC_PATHS = 4
+SEC_PROJECTILES = 5
+SEC_AI_QUEUE = 6
+
+AI_PHASES = ("idle", "next_unit", "act", "post_move", "moving")
+
+FULL_EVERY_TURNS = 20
+
+_HEAD = struct.Struct("<4sHBI")
+_SEC = struct.Struct("<BI")
+_META = struct.Struct("<BIbBiBhhhQQ")
+
+UNIT_COLUMNS = (
+    ("kind", "H"),
+    ("team", "B"),
+    ("x", "H"),
+    ("y", "H"),
+    ("hp", "h"),
+    ("flags", "B"),
+    ("px", "d"),
+    ("py", "d"),
+    ("tpx", "d"),
+    ("tpy", "d"),
+)
+
+PROJECTILE_COLUMNS = ("x", "y", "tx", "ty", "vx", "vy", "life")
+
+F_ACTED = 1
+F_MOVED = 2
+F_MOVING = 4
+F_ATTACKING = 8
+
+
+def _le(arr):
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+def _names_blob(names):
+    raw = "\n".join(names).encode("utf-8")
+    return struct.pack("<I", len(raw)) + raw
+
+
+def _read_names(data, off):
+    (n,) = struct.unpack_from("<I", data, off)
+    off += 4
+    raw = bytes(data[off:off + n]).decode("utf-8")
+    return (raw.split("\n") if raw else []), off + n
+
+
+def _col(data, off, code, count):
+    a = array(code)
+    size = a.itemsize * count
+    a.frombytes(data[off:off + size])
+    return _le(a), off + size
+
+
+def _index_of(game, obj):
+    if obj is None:
+        return -1
+    return game.unit_index(obj)
+
+
+def unit_row(u, kind_ids):
+    flags = (
+        (F_ACTED if u.acted else 0)
+        | (F_MOVED if getattr(u, "has_moved", False) else 0)
+        | (F_MOVING if u.moving else 0)
+        | (F_ATTACKING if u.attacking else 0)
+    )
+    return (
+        kind_ids[u.kind], u.team, u.x, u.y, u.hp, flags,
+        u._px, u._py, u._target_px, u._target_py,
+    )
+
+
+def _encode_meta(game):
+    return _META.pack(
+        game.turn_team,
+        game.turn_number,
+        -1 if game.winner is None else game.winner,
+        AI_PHASES.index(game.ai_phase),
+        int(game.ai_timer_ms),
+        1 if game.in_ai_turn else 0,
+        _index_of(game, game.ai_current),
+        _index_of(game, game.selected),
+        _index_of(game, game.animating_unit),
+        game.seed & 0xFFFFFFFFFFFFFFFF,
+        game.hash,
+    )
+
+
+def _encode_grid(grid):
+    tile_names = sorted({t for row in grid.tiles for t in row})
+    tile_ids = {t: i for i, t in enumerate(tile_names)}
+    paint_names = sorted({k for row in grid.paint for k in row})
+    paint_ids = {k: i for i, k in enumerate(paint_names)}
+
+    out = bytearray(struct.pack("<HHHH", grid.w, grid.h, grid.paint_w, grid.paint_h))
+    out += _names_blob(tile_names)
+    out += bytes(tile_ids[t] for row in grid.tiles for t in row)
+    out += _names_blob(paint_names)
+    out += bytes(paint_ids[k] for row in grid.paint for k in row)
+    return bytes(out)
+
+
+def _encode_unit_rows(indices, rows, kind_names):
+    out = bytearray(_names_blob(kind_names))
+    out += struct.pack("<I", len(rows))
+    out += _le(array("H", indices)).tobytes()
+    for ci, (_, code) in enumerate(UNIT_COLUMNS):
+        out += _le(array(code, [r[ci] for r in rows])).tobytes()
+    return bytes(out)
+
+
+def _encode_paths(game):
+    out = bytearray()
+    moving = [(i, u._path) for i, u in enumerate(game.units) if u.moving and u._path]
+    out += struct.pack("<I", len(moving))
+    for i, path in moving:
+        out += struct.pack("<HH", i, len(path))
+        out += _le(array("H", [v for cell in path for v in cell])).tobytes()
+    return bytes(out)
+
+
+def _encode_projectiles(projectiles):
+    out = bytearray(struct.pack("<I", len(projectiles)))
+    for name in PROJECTILE_COLUMNS:
+        out += _le(array("f", [p[name] for p in projectiles])).tobytes()
+    return bytes(out)
+
+
+def _encode_ai_queue(game):
+    idx = [_index_of(game, u) for u in game.ai_queue]
+    return struct.pack("<I", len(idx)) + _le(array("h", idx)).tobytes()
+
+
+def _pack(kind, base_turn, sections):
+    out = bytearray(_HEAD.pack(MAGIC, FORMAT_VERSION, kind, base_turn))
+    for sec_id, blob in sections:
+        out += _SEC.pack(sec_id, len(blob))
+        out += blob
+    return bytes(out)
+
+
+def _kinds(game):
+    names = sorted({u.kind for u in game.units})
+    return names, {k: i for i, k in enumerate(names)}
+
+
+def save_snapshot(game):
+    kind_names, kind_ids = _kinds(game)
+    rows = [unit_row(u, kind_ids) for u in game.units]
+    return _pack(KIND_FULL, game.turn_number, [
+        (SEC_META, _encode_meta(game)),
+        (SEC_GRID, _encode_grid(game.grid)),
+        (SEC_UNITS, _encode_unit_rows(range(len(rows)), rows, kind_names)),
+        (SEC_PATHS, _encode_paths(game)),
+        (SEC_PROJECTILES, _encode_projectiles(game.projectiles)),
+        (SEC_AI_QUEUE, _encode_ai_queue(game)),
+    ])
+
+
+def save_delta(game, base_turn, prev_rows, prev_grid_version=None):
+    kind_names, kind_ids = _kinds(game)
+    rows = [unit_row(u, kind_ids) for u in game.units]
+    changed = [
+        i for i, r in enumerate(rows)
+        if i >= len(prev_rows) or prev_rows[i] != r
+    ]
+
+    sections = [(SEC_META, _encode_meta(game))]
+    # The grid is only encoded when its version moved since the last save.
+    if game.grid.version != prev_grid_version:
+        sections.append((SEC_GRID, _encode_grid(game.grid)))
+    sections += [
+        (SEC_UNITS, _encode_unit_rows(changed, [rows[i] for i in changed], kind_names)),
+        (SEC_PATHS, _encode_paths(game)),
+        (SEC_PROJECTILES, _encode_projectiles(game.projectiles)),
+        (SEC_AI_QUEUE, _encode_ai_queue(game)),
+    ]
+    return _pack(KIND_DELTA, base_turn, sections), rows, game.grid.version
+
+
+def read_sections(data):
+    data = memoryview(data)
+    magic, version, kind, base_turn = _HEAD.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+
+    off = _HEAD.size
+    sections = {}
+    while off < len(data):
+        sec_id, n = _SEC.unpack_from(data, off)
+        off += _SEC.size
+        sections[sec_id] = data[off:off + n]
+        off += n
+    return kind, base_turn, sections
+
+
+def _decode_grid(blob, grid):
+    w, h, pw, ph = struct.unpack_from("<HHHH", blob, 0)
+    off = 8
+    tile_names, off = _read_names(blob, off)
+    raw = bytes(blob[off:off + w * h])
+    off += w * h
+    paint_names, off = _read_names(blob, off)
+    praw = bytes(blob[off:off + pw * ph])
+
+    grid.w, grid.h, grid.paint_w, grid.paint_h = w, h, pw, ph
+    grid.tiles = [[tile_names[b] for b in raw[y * w:(y + 1) * w]] for y in range(h)]
+    grid.paint = [[paint_names[b] for b in praw[y * pw:(y + 1) * pw]] for y in range(ph)]
+    grid.version += 1
+
+
+def _decode_units(blob):
+    kind_names, off = _read_names(blob, 0)
+    (n,) = struct.unpack_from("<I", blob, off)
+    off += 4
+    idx, off = _col(blob, off, "H", n)
+    cols = []
+    for _, code in UNIT_COLUMNS:
+        c, off = _col(blob, off, code, n)
+        cols.append(c)
+    return kind_names, idx, cols
+
+
+def _apply_units(game, blob):
+    kind_names, idx, cols = _decode_units(blob)
+    kinds, teams, xs, ys, hps, flags, pxs, pys, tpxs, tpys = cols
+    for j, i in enumerate(idx):
+        kind = kind_names[kinds[j]]
+        if i < len(game.units):
+            u = game.units[i]
+            u.kind = kind
+            u.team = teams[j]
+            u.x, u.y, u.hp = xs[j], ys[j], hps[j]
+        else:
+            u = Unit(team=teams[j], kind=kind, x=xs[j], y=ys[j], hp=hps[j])
+            game.units.append(u)
+        f = flags[j]
+        u.acted = bool(f & F_ACTED)
+        u.has_moved = bool(f & F_MOVED)
+        u.moving = bool(f & F_MOVING)
+        u.attacking = bool(f & F_ATTACKING)
+        u._path = []
+        u._px, u._py = pxs[j], pys[j]
+        u._target_px, u._target_py = tpxs[j], tpys[j]
+
+
+def _apply_paths(game, blob):
+    (n,) = struct.unpack_from("<I", blob, 0)
+    off = 4
+    for _ in range(n):
+        i, ln = struct.unpack_from("<HH", blob, off)
+        off += 4
+        flat, off = _col(blob, off, "H", ln * 2)
+        game.units[i]._path = [(flat[k], flat[k + 1]) for k in range(0, len(flat), 2)]
+
+
+def _apply_projectiles(game, blob):
+    (n,) = struct.unpack_from("<I", blob, 0)
+    off = 4
+    cols = {}
+    for name in PROJECTILE_COLUMNS:
+        cols[name], off = _col(blob, off, "f", n)
+
+    game.projectiles = []
+    for k in range(n):
+        p = {name: cols[name][k] for name in PROJECTILE_COLUMNS}
+        p["life"] = int(p["life"])
+        # img is None without assets; the arrow still flies and is saved.
+        p["img"] = get_arrow_sprite(p["tx"] - p["x"], p["ty"] - p["y"])
+        game.projectiles.append(p)
+
+
+def _apply_meta(game, blob):
+    (turn_team, turn_number, winner, phase, timer, in_ai, ai_cur, sel, anim,
+     seed, _hash) = _META.unpack_from(blob, 0)
+    units = game.units
+
+    def unit_or_none(i):
+        return units[i] if 0 <= i < len(units) else None
+
+    game.turn_team = turn_team
+    game.turn_number = turn_number
+    game.winner = None if winner < 0 else winner
+    game.ai_phase = AI_PHASES[phase]
+    game.ai_timer_ms = timer
+    game.in_ai_turn = bool(in_ai)
+    game.ai_current = unit_or_none(ai_cur)
+    game.animating_unit = unit_or_none(anim)
+    game.seed = seed
+
+    game.clear_selection()
+    selected = unit_or_none(sel)
+    if selected is not None:
+        game.selected = selected
+        game.compute_reachable_and_attackables(selected)
+
+
+def _apply_ai_queue(game, blob):
+    (n,) = struct.unpack_from("<I", blob, 0)
+    idx, _ = _col(blob, 4, "h", n)
+    game.ai_queue = deque(game.units[i] for i in idx if 0 <= i < len(game.units))
+
+
+def apply_snapshot(game, data):
+    kind, base_turn, sections = read_sections(data)
+    if SEC_GRID in sections:
+        _decode_grid(sections[SEC_GRID], game.grid)
+        game.tt.clear()
+    if kind == KIND_FULL:
+        game.units = []
+    # Undo records hold the units and state from before the load.
+    game.undo.clear()
+    _apply_units(game, sections[SEC_UNITS])
+    _apply_paths(game, sections[SEC_PATHS])
+    _apply_projectiles(game, sections[SEC_PROJECTILES])
+    _apply_meta(game, sections[SEC_META])
+    _apply_ai_queue(game, sections[SEC_AI_QUEUE])
+    game.recompute_hash()
+    game.influence.rebuild()
+    game.pathfinder.rebuild()
+    game.visibility.rebuild()
+    game.camera.resize_world(game.grid.w, game.grid.h)
+    return game
+
+
+def load_snapshot(data, ui=None, headless=False, ai_teams=None, events=None):
+    kind, _, _ = read_sections(data)
+    if kind != KIND_FULL:
+        raise ValueError("cannot start from a delta snapshot")
+
+    grid = Grid(load_assets=not headless)
+    game = Game(
+        ui,
+        units=[],
+        grid=grid,
+        ai_teams=(AI_TEAM,) if ai_teams is None else ai_teams,
+        headless=headless,
+        events=events,
+    )
+    return apply_snapshot(game, data)
+
+
+class AutoSaver:
+    def __init__(self, directory, full_every=FULL_EVERY_TURNS):
+        self.directory = directory
+        self.full_every = full_every
+        self._base_turn = None
+        self._rows = []
+        self._grid_version = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, turn, kind):
+        ext = "full" if kind == KIND_FULL else "delta"
+        return os.path.join(self.directory, f"turn_{turn:05d}.{ext}")
+
+    def save(self, game):
+        turn = game.turn_number
+        if self._base_turn is None or turn - self._base_turn >= self.full_every:
+            data = save_snapshot(game)
+            kind_names, kind_ids = _kinds(game)
+            self._rows = [unit_row(u, kind_ids) for u in game.units]
+            self._grid_version = game.grid.version
+            self._base_turn = turn
+            kind = KIND_FULL
+        else:
+            data, self._rows, self._grid_version = save_delta(
+                game, self._base_turn, self._rows, self._grid_version
+            )
+            kind = KIND_DELTA
+
+        path = self.path_for(turn, kind)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def latest_chain(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("turn_"))
+        chain = []
+        for name in names:
+            if name.endswith(".full"):
+                chain = [name]
+            elif name.endswith(".delta") and chain:
+                chain.append(name)
+        return [os.path.join(self.directory, n) for n in chain]
+
+    def load_latest(self, ui=None, headless=False, ai_teams=None, events=None):
+        chain = self.latest_chain()
+        if not chain:
+            return None
+        with open(chain[0], "rb") as f:
+            game = load_snapshot(
+                f.read(), ui=ui, headless=headless, ai_teams=ai_teams, events=events
+            )
+        for path in chain[1:]:
+            with open(path, "rb") as f:
+                apply_snapshot(game, f.read())
+        return game
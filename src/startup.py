@@ -0,0 +1,52 @@
+import argparse
+import sys
+import time
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.phases.append((label, (now - self.last) * 1000))
+        self.last = now
+
+    def report(self):
+        lines = [f"  {label:<14}{ms:8.1f}ms" for label, ms in self.phases]
+        lines.append(f"  {'total':<14}{(self.last - self.started) * 1000:8.1f}ms")
+        return lines
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Time a headless start: imports and Game setup.")
+    ap.add_argument("--map-seed", type=int, help="generate a map instead of the preset")
+    ap.add_argument("--size", type=int, default=64, help="generated map side in cells")
+    args = ap.parse_args(argv)
+
+    timer = StartupTimer()
+    from .game import Game
+    from .grid import Grid
+    from .mapgen import generate
+    timer.mark("import")
+
+    grid = Grid(load_assets=False)
+    units = None
+    if args.map_seed is not None:
+        gen = generate(args.size, args.size, seed=args.map_seed)
+        gen.apply(grid)
+        units = gen.make_units()
+        timer.mark("map")
+    Game(None, units=units, grid=grid, ai_teams=(), headless=True)
+    timer.mark("game")
+
+    print("startup:")
+    for line in timer.report():
+        print(line)
+    print(f"  pygame loaded: {'yes' if 'pygame' in sys.modules else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
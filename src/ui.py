@@ -1,5 +1,5 @@
 import pygame
-from .constants import SCREEN_W, SCREEN_H, UI_H, DARK, WHITE, GRAY
+from .constants import UI_H, DARK, WHITE, GRAY
 
 class UI:
     def __init__(self):
@@ -8,7 +8,8 @@ class UI:
         self.small = pygame.font.SysFont("consolas", 18)
 
     def draw_panel(self, surf, lines):
-        panel = pygame.Rect(0, SCREEN_H - UI_H, SCREEN_W, UI_H)
+        w, h = surf.get_size()
+        panel = pygame.Rect(0, h - UI_H, w, UI_H)
         pygame.draw.rect(surf, DARK, panel)
 
         y = panel.y + 10
@@ -0,0 +1,133 @@
+from collections import deque, namedtuple
+
+DEFAULT_DEPTH = 64
+
+UnitState = namedtuple("UnitState", "x y hp acted has_moved")
+MetaState = namedtuple("MetaState", "turn_team turn_number winner damage_dealt")
+# units holds (unit, before, after) for changed units only; meta is a
+# (before, after) pair or None when turn and winner did not change.
+Action = namedtuple("Action", "label units meta")
+
+
+def unit_state(u):
+    # A walking unit is recorded at its destination, like the hash.
+    x, y = u._path[-1] if u.moving and u._path else (u.x, u.y)
+    return UnitState(x, y, u.hp, u.acted, getattr(u, "has_moved", False))
+
+
+def meta_state(game):
+    return MetaState(
+        game.turn_team, game.turn_number, game.winner,
+        tuple(sorted(game.damage_dealt.items())),
+    )
+
+
+class UndoStack:
+    def __init__(self, game, depth=DEFAULT_DEPTH):
+        self.game = game
+        self.done = deque(maxlen=depth)
+        self.undone = []
+        self._open = None
+
+    def begin(self, label):
+        # Opens a record for one player command. It stays open until the next
+        # command so that what the command sets off (walk, auto-wait, end of
+        # turn, the AI's reply) is undone together with it.
+        self.commit()
+        self._open = (label, {}, meta_state(self.game))
+        self.undone.clear()
+
+    def touch(self, unit):
+        if self._open is None:
+            return
+        touched = self._open[1]
+        if id(unit) not in touched:
+            touched[id(unit)] = (unit, unit_state(unit))
+
+    def commit(self):
+        if self._open is None:
+            return
+        label, touched, meta_before = self._open
+        self._open = None
+        units = []
+        for u, before in touched.values():
+            after = unit_state(u)
+            if after != before:
+                units.append((u, before, after))
+        meta_after = meta_state(self.game)
+        meta = (meta_before, meta_after) if meta_after != meta_before else None
+        if units or meta:
+            self.done.append(Action(label, tuple(units), meta))
+
+    def clear(self):
+        self._open = None
+        self.done.clear()
+        self.undone.clear()
+
+    def can_undo(self):
+        return self._open is not None or bool(self.done)
+
+    def can_redo(self):
+        return bool(self.undone)
+
+    def undo(self):
+        self.commit()
+        if not self.done:
+            return None
+        action = self.done.pop()
+        self._apply(action, 1)
+        self.undone.append(action)
+        return action
+
+    def redo(self):
+        if not self.undone:
+            return None
+        action = self.undone.pop()
+        self._apply(action, 2)
+        self.done.append(action)
+        return action
+
+    def _apply(self, action, side):
+        g = self.game
+        # In-flight effects belong to the action being reverted or replayed;
+        # they are settled first so no walk or arrow outlives its state.
+        if g.animating_unit is not None:
+            u = g.animating_unit
+            if u._path:
+                u.snap_to(*u._path[-1])
+            g.animating_unit = None
+        g.projectiles.clear()
+
+        hp_changed = False
+        for rec in action.units:
+            u = rec[0]
+            state = rec[side]
+            g._xor_unit(u)
+            if (u.x, u.y) != (state.x, state.y) or u.moving:
+                u.snap_to(state.x, state.y)
+            if u.hp != state.hp:
+                hp_changed = True
+            u.hp = state.hp
+            u.acted = state.acted
+            u.has_moved = state.has_moved
+            u.attacking = False
+            u._attack_frame_i = 0
+            g._xor_unit(u)
+        if hp_changed:
+            g.hp_version += 1
+        g.board_version += 1
+
+        if action.meta is not None:
+            meta = action.meta[side - 1]
+            if meta.turn_team != g.turn_team:
+                g.hash ^= g.zobrist.turn_key(g.turn_team) ^ g.zobrist.turn_key(meta.turn_team)
+            g.turn_team = meta.turn_team
+            g.turn_number = meta.turn_number
+            g.winner = meta.winner
+            g.damage_dealt = dict(meta.damage_dealt)
+
+        g.clear_selection()
+        g.in_ai_turn = False
+        g.ai_phase = "idle"
+        g.ai_queue.clear()
+        g.ai_current = None
@@ -1,169 +1,185 @@
 import os
-import pygame
 from dataclasses import dataclass, field
+from .camera import ZOOM_CACHE
 from .constants import TILE_SIZE
+from .defs import UNIT_DEFS, UNITS
 import math
 
 _ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets")
 
 HP_Y_OFFSET_PX = 16
 SPRITE_GAP_PX = 2
-
-UNIT_DEFS = {
-    "SOLDIER": {
-        "max_hp": 100,
-        "move": 4,
-        "atk": 40,
-        "armor": 0,
-        "sprite": "soldier.png",
-        "sprite_mode": "native",
-        "anchor": "feet",
-        "attack_sheet": "soldier-attack.png",
-        "attack_frames": 2,
-        "attack_range": 1,
-        "target_height_px": int(TILE_SIZE * 0.65),
-    },
-    "ARCHER": {
-        "max_hp": 100,
-        "move": 4,
-        "atk": 20,
-        "armor": 0,
-        "sprite": "Archer.png",
-        "sprite_mode": "native",
-        "anchor": "feet",
-        "attack_sheet": "Archer-attack.png",
-        "attack_frames": 3,
-        "attack_range": 4,
-        "target_height_px": int(TILE_SIZE * 0.65),
-    },
-}
+# Below this zoom scale the HP numbers are unreadable and are not drawn.
+HP_MIN_SCALE = 0.5
 
 _ASSET_CACHE = {}
 _ARROW_BASE = None
 _ARROW_ROT_CACHE = {}
+_ASSETS_ENABLED = False
+
+# Derived sprite variants: (source, flipped, done).
+_VARIANTS = {
+    "flipped": ("base", True, False),
+    "done": ("base", False, True),
+    "done_flipped": ("base", True, True),
+    "attack_flipped": ("attack", True, False),
+    "attack_done": ("attack", False, True),
+    "attack_done_flipped": ("attack", True, True),
+}
 
 
 def init_assets():
-    def load_image(filename):
-        path = os.path.join(_ASSETS_DIR, filename)
-        return pygame.image.load(path).convert_alpha()
+    # Turns sprite loading on. Nothing is read here: each unit kind, its
+    # variants and the arrow are loaded the first time they are drawn.
+    global _ASSETS_ENABLED, _ARROW_BASE
+    _ASSETS_ENABLED = True
+    _ASSET_CACHE.clear()
+    _ARROW_BASE = None
+    _ARROW_ROT_CACHE.clear()
+    ZOOM_CACHE.clear()
+
+
+def _load_image(filename):
+    import pygame
+
+    path = os.path.join(_ASSETS_DIR, filename)
+    return pygame.image.load(path).convert_alpha()
+
+
+def _scale_to_height(img, target_h):
+    import pygame
 
-    def load_sprite(kind, filename, mode):
-        img = load_image(filename)
+    if img.get_height() > 0 and img.get_height() != target_h:
+        scale = target_h / img.get_height()
+        new_w = max(1, int(round(img.get_width() * scale)))
+        img = pygame.transform.scale(img, (new_w, int(target_h)))
+    return img
 
 
-        if mode == "tile":
-            img = pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE))
-            return img
+def _load_sprite(kind, filename, mode):
+    import pygame
 
-        target_h = UNIT_DEFS.get(kind, {}).get("target_height_px")
-        if target_h and img.get_height() > 0 and img.get_height() != target_h:
-            scale = target_h / img.get_height()
-            new_w = max(1, int(round(img.get_width() * scale)))
-            img = pygame.transform.scale(img, (new_w, int(target_h)))
+    img = _load_image(filename)
 
-        return img
+    if mode == "tile":
+        return pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE))
 
-    def load_arrow_base():
-        global _ARROW_BASE
+    target_h = UNIT_DEFS.get(kind, {}).get("target_height_px")
+    if target_h:
+        img = _scale_to_height(img, target_h)
+    return img
 
-        img = load_image("arrow.png")
-        print("arrow loaded", img.get_size())
 
-        target_h = max(1, int(round(TILE_SIZE * 0.8)))
-        if img.get_height() > 0 and img.get_height() != target_h:
-            scale = target_h / img.get_height()
-            new_w = max(1, int(round(img.get_width() * scale)))
-            img = pygame.transform.scale(img, (new_w, int(target_h)))
+def _load_attack_sheet_scaled(kind, filename, frame_count):
+    import pygame
 
-        _ARROW_BASE = img
-        _ARROW_ROT_CACHE.clear()
+    sheet = _load_image(filename)
+    sheet_w = sheet.get_width()
+    sheet_h = sheet.get_height()
 
-    def load_attack_sheet_scaled(kind, filename, frame_count):
-        sheet = load_image(filename)
-        sheet_w = sheet.get_width()
-        sheet_h = sheet.get_height()
+    vertical = (sheet_h % frame_count == 0) and (sheet_h >= sheet_w)
+    if vertical:
+        frame_w = sheet_w
+        frame_h = sheet_h // frame_count
+    else:
+        frame_w = sheet_w // frame_count
+        frame_h = sheet_h
 
-        vertical = (sheet_h % frame_count == 0) and (sheet_h >= sheet_w)
+    target_h = UNIT_DEFS.get(kind, {}).get("target_height_px")
+    if not target_h:
+        target_h = frame_h
+
+    frames = []
+    for i in range(frame_count):
         if vertical:
-            frame_w = sheet_w
-            frame_h = sheet_h // frame_count
+            src = pygame.Rect(0, i * frame_h, frame_w, frame_h)
         else:
-            frame_w = sheet_w // frame_count
-            frame_h = sheet_h
-
-        target_h = UNIT_DEFS.get(kind, {}).get("target_height_px")
-        if not target_h:
-            target_h = frame_h
-
-        frames = []
-        for i in range(frame_count):
-            if vertical:
-                src = pygame.Rect(0, i * frame_h, frame_w, frame_h)
-            else:
-                src = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
-
-            frame = sheet.subsurface(src).copy()
-            scale = target_h / frame_h
-            new_w = max(1, int(round(frame_w * scale)))
-            frame = pygame.transform.scale(frame, (new_w, int(target_h)))
-            frames.append(frame)
-
-        return frames
-
-    def make_done_variant(img):
-        done = img.copy()
-        done.fill((160, 160, 160, 255), special_flags=pygame.BLEND_RGB_MULT)
-        done.set_alpha(185)
-        return done
+            src = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
+
+        frame = sheet.subsurface(src).copy()
+        scale = target_h / frame_h
+        new_w = max(1, int(round(frame_w * scale)))
+        frame = pygame.transform.scale(frame, (new_w, int(target_h)))
+        frames.append(frame)
+
+    return frames
+
+
+def _derive(img, flip, done):
+    import pygame
+
+    if flip:
+        img = pygame.transform.flip(img, True, False)
+    if done:
+        img = img.copy()
+        img.fill((160, 160, 160, 255), special_flags=pygame.BLEND_RGB_MULT)
+        img.set_alpha(185)
+    return img
+
+
+def _load_kind(kind):
+    d = UNIT_DEFS[kind]
+    entry = {
+        "base": _load_sprite(kind, d["sprite"], d.get("sprite_mode", "native")),
+        "attack": None,
+        "anchor": d.get("anchor", "feet"),
+    }
+    sheet = d.get("attack_sheet")
+    frame_count = d.get("attack_frames", 0)
+    if sheet and frame_count:
+        entry["attack"] = _load_attack_sheet_scaled(kind, sheet, frame_count)
+    return entry
 
-    _ASSET_CACHE.clear()
 
-    load_arrow_base()
-
-    for kind, d in UNIT_DEFS.items():
-        base = load_sprite(kind, d["sprite"], d.get("sprite_mode", "native"))
-
-        flipped = pygame.transform.flip(base, True, False)
-
-        entry = {
-            "base": base,
-            "flipped": flipped,
-            "done": make_done_variant(base),
-            "done_flipped": make_done_variant(flipped),
-            "attack": None,
-            "attack_flipped": None,
-            "attack_done": None,
-            "attack_done_flipped": None,
-            "anchor": d.get("anchor", "feet"),
-        }
-
-        sheet = d.get("attack_sheet")
-        frame_count = d.get("attack_frames", 0)
-        if sheet and frame_count:
-            frames = load_attack_sheet_scaled(kind, sheet, frame_count)
-            frames_flipped = [pygame.transform.flip(f, True, False) for f in frames]
-            entry["attack"] = frames
-            entry["attack_flipped"] = frames_flipped
-            entry["attack_done"] = [make_done_variant(f) for f in frames]
-            entry["attack_done_flipped"] = [make_done_variant(f) for f in frames_flipped]
-
-        _ASSET_CACHE[kind] = entry
+def drop_sprites(kinds):
+    # Forgets loaded sprites of these kinds at every zoom level; they are
+    # read again the next time they are drawn.
+    for kind in kinds:
+        _ASSET_CACHE.pop(kind, None)
+    ZOOM_CACHE.clear(lambda key: key[0] == "unit" and key[1] in kinds)
+
 
 def _get_asset_entry(kind):
-    return _ASSET_CACHE.get(kind)
+    entry = _ASSET_CACHE.get(kind)
+    if entry is None and _ASSETS_ENABLED and kind in UNIT_DEFS:
+        entry = _ASSET_CACHE[kind] = _load_kind(kind)
+    return entry
+
+
+def _variant(entry, name):
+    img = entry.get(name)
+    if img is None and name in _VARIANTS:
+        source, flip, done = _VARIANTS[name]
+        base = entry[source]
+        if base is None:
+            return None
+        if isinstance(base, list):
+            img = [_derive(f, flip, done) for f in base]
+        else:
+            img = _derive(base, flip, done)
+        entry[name] = img
+    return img
+
 
-def get_arrow_sprite(dx, dy):
+def get_arrow_sprite(dx, dy, level=0):
+    global _ARROW_BASE
     if _ARROW_BASE is None:
-        return None
+        if not _ASSETS_ENABLED:
+            return None
+        _ARROW_BASE = _scale_to_height(_load_image("arrow.png"), max(1, int(round(TILE_SIZE * 0.8))))
 
     angle = -math.degrees(math.atan2(dy, dx))
 
     key = int(round(angle))
     if key not in _ARROW_ROT_CACHE:
+        import pygame
+
         _ARROW_ROT_CACHE[key] = pygame.transform.rotate(_ARROW_BASE, key)
 
-    return _ARROW_ROT_CACHE[key]
+    img = _ARROW_ROT_CACHE[key]
+    if level:
+        return ZOOM_CACHE.get(("arrow", key), level, lambda: img)
+    return img
 
 @dataclass
 class Unit:
@@ -194,27 +210,27 @@ class Unit:
 
     @property
     def max_hp(self):
-        return UNIT_DEFS[self.kind]["max_hp"]
+        return UNITS.max_hp[UNITS.ids[self.kind]]
 
     @property
     def move_points(self):
-        return UNIT_DEFS[self.kind]["move"]
-    
+        return UNITS.move[UNITS.ids[self.kind]]
+
     @property
     def attack_range(self):
-        return UNIT_DEFS[self.kind].get("attack_range", 1)
-    
+        return UNITS.attack_range[UNITS.ids[self.kind]]
+
     @property
     def atk(self):
-        return UNIT_DEFS[self.kind].get("atk", 20)
+        return UNITS.atk[UNITS.ids[self.kind]]
 
     @property
-    def armor(self):
-        return UNIT_DEFS[self.kind].get("armor", 0)
+    def sight(self):
+        return UNITS.sight[UNITS.ids[self.kind]]
 
     @property
-    def attack_range(self):
-        return UNIT_DEFS[self.kind].get("attack_range", 1)
+    def armor(self):
+        return UNITS.armor[UNITS.ids[self.kind]]
 
     def pos(self):
         return (self.x, self.y)
@@ -274,6 +290,14 @@ class Unit:
         self._target_px = float(tx)
         self._target_py = float(ty)
 
+    def snap_to(self, x, y):
+        self.x, self.y = x, y
+        self._path = []
+        self.moving = False
+        self._px, self._py = (float(v) for v in self._cell_center(x, y))
+        self._target_px = self._px
+        self._target_py = self._py
+
     def update(self, dt_ms):
         if not self.moving:
             return
@@ -305,9 +329,16 @@ class Unit:
         self._px += (dx / dist) * step
         self._py += (dy / dist) * step
 
-    def draw(self, surf, font_small, active_team):
-        cx = int(self._px)
-        cy = int(self._py)
+    def draw(self, surf, font_small, active_team, camera=None):
+        if camera is None:
+            level = 0
+            scale = 1.0
+            cx = int(self._px)
+            cy = int(self._py)
+        else:
+            level = camera.level
+            scale = camera.scale
+            cx, cy = camera.world_to_screen(self._px, self._py)
 
         is_enemy = (self.team == 1)
         entry = _get_asset_entry(self.kind)
@@ -317,53 +348,34 @@ class Unit:
         use_done = (self.acted and self.team == active_team)
 
         if self.attacking and entry["attack"]:
-            frames = entry["attack_flipped"] if is_enemy else entry["attack"]
+            variant = "attack_done" if use_done else "attack"
+            if is_enemy:
+                variant += "_flipped"
+            frames = _variant(entry, variant)
             i = min(self._attack_frame_i, len(frames) - 1)
-            if use_done:
-                frames_done = entry["attack_done_flipped"] if is_enemy else entry["attack_done"]
-                img = frames_done[i]
-            else:
-                img = frames[i]
+            base = frames[i]
         else:
-            base = entry["flipped"] if is_enemy else entry["base"]
-            if use_done:
-                img = entry["done_flipped"] if is_enemy else entry["done"]
-            else:
-                img = base
-
-        surf.blit(
-            img,
-            img.get_rect(
-                midbottom=(cx, cy + TILE_SIZE // 2 - (HP_Y_OFFSET_PX + SPRITE_GAP_PX))
-            ),
-        )
+            variant = "done" if use_done else "base"
+            if is_enemy:
+                variant = "done_flipped" if use_done else "flipped"
+            i = 0
+            base = _variant(entry, variant)
+
+        img = ZOOM_CACHE.get(("unit", self.kind, variant, i), level, lambda: base)
+
+        feet = int((TILE_SIZE // 2 - (HP_Y_OFFSET_PX + SPRITE_GAP_PX)) * scale)
+        surf.blit(img, img.get_rect(midbottom=(cx, cy + feet)))
+
+        if scale < HP_MIN_SCALE:
+            return
 
         green = (0, 220, 0)
         red = (235, 40, 40)
         hp_color = red if is_enemy else green
 
         hp_txt = font_small.render(str(self.hp), True, hp_color)
-        hp_rect = hp_txt.get_rect(center=(cx, cy + TILE_SIZE // 2 - 8))
+        hp_rect = hp_txt.get_rect(center=(cx, cy + int((TILE_SIZE // 2 - 8) * scale)))
         surf.blit(hp_txt, hp_rect)
 
 def team_name(team):
     return "GREEN" if team == 0 else "RED"
-
-def make_starting_units():
-    return [
-        Unit(team=0, kind="ARCHER", x=0, y=4, hp=100),
-        Unit(team=0, kind="ARCHER", x=0, y=5, hp=100),
-        Unit(team=0, kind="ARCHER", x=0, y=6, hp=100),
-        Unit(team=0, kind="ARCHER", x=1, y=4, hp=100),
-        Unit(team=0, kind="ARCHER", x=1, y=5, hp=100),
-        Unit(team=0, kind="ARCHER", x=1, y=6, hp=100),
-        Unit(team=0, kind="ARCHER", x=2, y=4, hp=100),
-        Unit(team=0, kind="ARCHER", x=2, y=5, hp=100),
-        Unit(team=0, kind="ARCHER", x=2, y=6, hp=100),
-        Unit(team=1, kind="SOLDIER", x=8, y=4, hp=100),
-        Unit(team=1, kind="SOLDIER", x=8, y=5, hp=100),
-        Unit(team=1, kind="SOLDIER", x=8, y=6, hp=100),
-        Unit(team=1, kind="SOLDIER", x=9, y=4, hp=100),
-        Unit(team=1, kind="SOLDIER", x=9, y=5, hp=100),
-        Unit(team=1, kind="SOLDIER", x=9, y=6, hp=100),
-    ]
\ No newline at end of file
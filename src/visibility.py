@@ -0,0 +1,197 @@
+FOG_ALPHA = 150
+
+_OCTANTS = (
+    (1, 0, 0, -1, -1, 0, 0, 1),
+    (0, 1, -1, 0, 0, -1, 1, 0),
+    (0, 1, 1, 0, 0, -1, -1, 0),
+    (1, 0, 0, 1, -1, 0, 0, -1),
+)
+
+
+def _cast_light(opaque, w, h, cx, cy, row, start, end, radius, xx, xy, yx, yy, out):
+    if start < end:
+        return
+    radius_sq = radius * radius
+    new_start = start
+    for j in range(row, radius + 1):
+        dx = -j - 1
+        dy = -j
+        blocked = False
+        while dx <= 0:
+            dx += 1
+            mx = cx + dx * xx + dy * xy
+            my = cy + dx * yx + dy * yy
+            l_slope = (dx - 0.5) / (dy + 0.5)
+            r_slope = (dx + 0.5) / (dy - 0.5)
+            if start < r_slope:
+                continue
+            if end > l_slope:
+                break
+
+            inside = 0 <= mx < w and 0 <= my < h
+            if inside and dx * dx + dy * dy <= radius_sq:
+                out.add(my * w + mx)
+
+            cell_opaque = (not inside) or opaque[my * w + mx]
+            if blocked:
+                if cell_opaque:
+                    new_start = r_slope
+                    continue
+                blocked = False
+                start = new_start
+            elif cell_opaque and j < radius:
+                blocked = True
+                _cast_light(opaque, w, h, cx, cy, j + 1, start, l_slope, radius,
+                            xx, xy, yx, yy, out)
+                new_start = r_slope
+        if blocked:
+            break
+
+
+def field_of_view(opaque, w, h, cx, cy, radius):
+    out = {cy * w + cx}
+    for oct_i in range(8):
+        _cast_light(
+            opaque, w, h, cx, cy, 1, 1.0, 0.0, radius,
+            _OCTANTS[0][oct_i], _OCTANTS[1][oct_i], _OCTANTS[2][oct_i], _OCTANTS[3][oct_i],
+            out,
+        )
+    return out
+
+
+class Visibility:
+    def __init__(self, game, teams=(0, 1)):
+        self.game = game
+        self.teams = tuple(teams)
+        self.version = 0
+        self.rebuild()
+
+    def _terrain(self):
+        grid = self.game.grid
+        self.w = grid.w
+        self.h = grid.h
+        self.cells = grid.terrain_cells()
+        self.opaque = self.cells.opaque
+        self.sight_bonus = self.cells.sight_bonus
+
+    def rebuild(self):
+        self._terrain()
+        n = self.w * self.h
+        self.counts = {t: [0] * n for t in self.teams}
+        self.visible = {t: bytearray(n) for t in self.teams}
+        self.changed = {t: set(range(n)) for t in self.teams}
+        self._fov = {}
+        self._sig = {}
+        for i, u in enumerate(self.game.units):
+            self._add(i, u)
+        self.version += 1
+
+    def _signature(self, u):
+        if not u.is_alive():
+            return None
+        return (u.x, u.y, u.team, u.sight)
+
+    def _add(self, idx, u):
+        sig = self._signature(u)
+        self._sig[idx] = sig
+        if sig is None or u.team not in self.counts:
+            self._fov[idx] = None
+            return
+
+        i0 = u.y * self.w + u.x
+        self.cells.ensure(u.x, u.y, u.x, u.y)
+        radius = u.sight + self.sight_bonus[i0]
+        self.cells.ensure(u.x - radius, u.y - radius, u.x + radius, u.y + radius)
+        cells = field_of_view(self.opaque, self.w, self.h, u.x, u.y, radius)
+        counts = self.counts[u.team]
+        vis = self.visible[u.team]
+        changed = self.changed[u.team]
+        for i in cells:
+            if counts[i] == 0:
+                vis[i] = 1
+                changed.add(i)
+            counts[i] += 1
+        self._fov[idx] = (u.team, cells)
+
+    def _remove(self, idx):
+        fov = self._fov.get(idx)
+        if not fov:
+            return
+        team, cells = fov
+        counts = self.counts[team]
+        vis = self.visible[team]
+        changed = self.changed[team]
+        for i in cells:
+            counts[i] -= 1
+            if counts[i] == 0:
+                vis[i] = 0
+                changed.add(i)
+        self._fov[idx] = None
+
+    def sync(self):
+        grid = self.game.grid
+        if grid.w != self.w or grid.h != self.h:
+            self.rebuild()
+            return
+
+        dirty = False
+        for i, u in enumerate(self.game.units):
+            if self._sig.get(i, ()) != self._signature(u):
+                self._remove(i)
+                self._add(i, u)
+                dirty = True
+        if dirty:
+            self.version += 1
+
+    def is_visible(self, team, x, y):
+        return self.visible[team][y * self.w + x] == 1
+
+    def take_changed(self, team):
+        cells = self.changed[team]
+        self.changed[team] = set()
+        return cells
+
+
+class FogLayer:
+    def __init__(self, visibility, team):
+        self.visibility = visibility
+        self.team = team
+        self.surf = None
+        self._key = None
+
+    def draw(self, surf, camera):
+        # The layer covers the view, not the map, so its size does not grow
+        # with the map. A camera move repaints the view; otherwise only cells
+        # whose visibility flipped since the last frame are redrawn.
+        import pygame
+
+        vis = self.visibility
+        size = (camera.view_w, camera.view_h)
+        if self.surf is None or self.surf.get_size() != size:
+            self.surf = pygame.Surface(size, pygame.SRCALPHA)
+            self._key = None
+
+        visible = vis.visible[self.team]
+        changed = vis.take_changed(self.team)
+        x0, y0, x1, y1 = camera.visible_cells()
+        t = camera.tile
+        ox, oy = camera.ox, camera.oy
+        key = (camera.key, vis.w, vis.h)
+        if key != self._key:
+            self._key = key
+            self.surf.fill((0, 0, 0, FOG_ALPHA))
+            for y in range(y0, y1):
+                row = y * vis.w
+                for x in range(x0, x1):
+                    if visible[row + x]:
+                        self.surf.fill((0, 0, 0, 0), (x * t - ox, y * t - oy, t, t))
+        else:
+            for i in changed:
+                x = i % vis.w
+                y = i // vis.w
+                if not (x0 <= x < x1 and y0 <= y < y1):
+                    continue
+                alpha = 0 if visible[i] else FOG_ALPHA
+                self.surf.fill((0, 0, 0, alpha), (x * t - ox, y * t - oy, t, t))
+
+        surf.blit(self.surf, (0, 0))
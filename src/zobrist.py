@@ -0,0 +1,122 @@
+MASK64 = (1 << 64) - 1
+
+HP_BUCKET_SIZE = 10
+
+DEFAULT_SEED = 0x9E3779B97F4A7C15
+
+TT_DEFAULT_BITS = 16
+
+
+def _splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+class ZobristKeys:
+    def __init__(self, seed=DEFAULT_SEED):
+        self.seed = seed & MASK64
+        self._kind_ids = {}
+        self.turn_keys = (
+            _splitmix64(self.seed ^ 0xA5A5A5A5),
+            _splitmix64(self.seed ^ 0x5A5A5A5A),
+        )
+
+    def _kind_id(self, kind):
+        kid = self._kind_ids.get(kind)
+        if kid is None:
+            kid = 0
+            for ch in kind:
+                kid = (kid * 131 + ord(ch)) & 0xFFFFFFFF
+            self._kind_ids[kind] = kid
+        return kid
+
+    def piece_key(self, x, y, kind, team, hp, acted):
+        bucket = hp // HP_BUCKET_SIZE if hp > 0 else 0
+        packed = (
+            (self._kind_id(kind) << 32)
+            | ((x & 0x3FF) << 22)
+            | ((y & 0x3FF) << 12)
+            | ((bucket & 0xFF) << 4)
+            | ((team & 0x7) << 1)
+            | (1 if acted else 0)
+        )
+        return _splitmix64(packed ^ self.seed)
+
+    def unit_key(self, unit):
+        if not unit.is_alive():
+            return 0
+        # A unit that is still walking is hashed at the cell it committed to.
+        x, y = unit._path[-1] if unit.moving and unit._path else (unit.x, unit.y)
+        return self.piece_key(x, y, unit.kind, unit.team, unit.hp, unit.acted)
+
+    def turn_key(self, team):
+        return self.turn_keys[team & 1]
+
+    def derive(self, h, salt):
+        return _splitmix64((h ^ (salt * 0xD6E8FEB86659FD93)) & MASK64)
+
+    def full_hash(self, units, turn_team):
+        h = self.turn_key(turn_team)
+        for u in units:
+            h ^= self.unit_key(u)
+        return h
+
+
+class TranspositionTable:
+    # Always-replace table; each slot holds the last value stored for any key
+    # hashing to it.
+    def __init__(self, bits=TT_DEFAULT_BITS):
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.keys = [0] * self.size
+        self.values = [None] * self.size
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key):
+        self.probes += 1
+        i = key & self.mask
+        if self.keys[i] == key and self.values[i] is not None:
+            self.hits += 1
+            return self.values[i]
+        return None
+
+    def store(self, key, value):
+        i = key & self.mask
+        if self.values[i] is not None and self.keys[i] != key:
+            self.overwrites += 1
+        self.keys[i] = key
+        self.values[i] = value
+        self.stores += 1
+
+    def clear(self):
+        for i in range(self.size):
+            self.keys[i] = 0
+            self.values[i] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def hit_rate(self):
+        if self.probes == 0:
+            return 0.0
+        return self.hits / self.probes
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hit_rate(),
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
@@ -0,0 +1,15 @@
+from src.events import AttackEvent, EventLog, MemorySink, TurnEvent
+from src.game import Game
+
+
+def test_sinks_get_every_event_in_order():
+    sink = MemorySink()
+    events = EventLog([sink], batch=4)
+    game = Game(None, ai_teams=(0, 1), headless=True, seed=2, events=events)
+    while game.winner is None and game.turn_number <= 20:
+        game.update(1000)
+    events.close()
+
+    assert sink.events == events.recent()
+    kinds = {type(ev) for ev in sink.events}
+    assert AttackEvent in kinds and TurnEvent in kinds
@@ -0,0 +1,91 @@
+import heapq
+import random
+
+from src.game import Game
+from src.grid import Grid
+from src.hpa import IMPASSABLE_COST
+from src.mapgen import generate
+
+
+def _game(size=64, seed=3):
+    gen = generate(size, size, seed=seed)
+    grid = Grid(load_assets=False, tiles=gen.tiles())
+    return Game(None, units=gen.make_units(), grid=grid, ai_teams=(0, 1), headless=True)
+
+
+def _blocked(game, team):
+    return {(u.x, u.y) for u in game.units if u.is_alive() and u.team != team}
+
+
+def _best_cost(game, start, goal, team):
+    grid = game.grid
+    blocked = _blocked(game, team) - {goal}
+    dist = {start: 0}
+    heap = [(0, start)]
+    while heap:
+        d, cur = heapq.heappop(heap)
+        if cur == goal:
+            return d
+        if d > dist[cur]:
+            continue
+        for n in grid.neighbors4(*cur):
+            if grid.move_cost(*n) >= IMPASSABLE_COST or n in blocked:
+                continue
+            nd = d + grid.move_cost(*n)
+            if nd < dist.get(n, 1 << 30):
+                dist[n] = nd
+                heapq.heappush(heap, (nd, n))
+    return None
+
+
+def _check(game, start, goal, team):
+    path = game.pathfinder.find_path(start, goal, team)
+    best = _best_cost(game, start, goal, team)
+    if best is None:
+        assert path == []
+        return 0
+    assert path and path[-1] == goal
+    blocked = _blocked(game, team) - {goal}
+    cost = 0
+    cur = start
+    for cell in path:
+        assert abs(cell[0] - cur[0]) + abs(cell[1] - cur[1]) == 1
+        assert game.grid.move_cost(*cell) < IMPASSABLE_COST
+        assert cell not in blocked
+        cost += game.grid.move_cost(*cell)
+        cur = cell
+    assert cost >= best
+    return cost / best
+
+
+def test_long_paths_are_valid_and_near_optimal():
+    game = _game()
+    grid = game.grid
+    rng = random.Random(1)
+    open_cells = [
+        (x, y) for y in range(grid.h) for x in range(grid.w)
+        if grid.move_cost(x, y) < IMPASSABLE_COST and game.unit_at(x, y) is None
+    ]
+    ratios = []
+    while len(ratios) < 40:
+        start, goal = rng.choice(open_cells), rng.choice(open_cells)
+        if abs(start[0] - goal[0]) + abs(start[1] - goal[1]) > game.pathfinder.cs:
+            ratio = _check(game, start, goal, 0)
+            if ratio:
+                ratios.append(ratio)
+    assert sum(ratios) / len(ratios) < 1.05
+
+
+def test_paths_follow_terrain_edits():
+    game = _game()
+    grid = game.grid
+    start = next(u.pos() for u in game.units if u.team == 0)
+    goal = next(
+        (x, y) for x in range(grid.w - 8, grid.w) for y in range(grid.h)
+        if grid.move_cost(x, y) < IMPASSABLE_COST and game.unit_at(x, y) is None
+    )
+    path = game.pathfinder.find_path(start, goal, 0)
+    assert path
+    for x, y in path[len(path) // 3:len(path) // 2]:
+        game.set_tile(x, y, "WATER")
+    assert _check(game, start, goal, 0) > 0
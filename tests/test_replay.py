@@ -0,0 +1,45 @@
+import io
+
+from src.actionlog import ActionLog
+from src.game import Game
+from src.replay import ReplayEngine
+
+
+def _state(game):
+    units = [(u.kind, u.team, u.x, u.y, u.hp, u.acted) for u in game.units]
+    return (game.hash, game.turn_team, game.turn_number, game.winner, units)
+
+
+def _record(game, max_turn):
+    buf = io.BytesIO()
+    game.action_log = ActionLog(buf, game, game.seed)
+    while game.winner is None and game.turn_number <= max_turn:
+        game.update(1000)
+    game.action_log.flush()
+    game.action_log = None
+    return buf.getvalue()
+
+
+def test_replay_reaches_the_recorded_state():
+    game = Game(None, ai_teams=(0, 1), headless=True, seed=7)
+    data = _record(game, 15)
+    assert _state(ReplayEngine(data).run()) == _state(game)
+
+
+def test_log_started_mid_turn_replays_from_that_state():
+    game = Game(None, ai_teams=(0, 1), headless=True, seed=5)
+    while not (game.turn_number >= 3 and game.animating_unit is None
+               and any(u.acted for u in game.units)):
+        game.update(1000)
+    start = game.turn_number
+    data = _record(game, start + 8)
+
+    engine = ReplayEngine(data, snapshot_every=2)
+    assert engine.game.turn_number == start
+    assert _state(engine.run()) == _state(game)
+
+    engine.seek(start + 1)
+    back = _state(engine.game)
+    engine.seek(start + 6)
+    engine.seek(start + 1)
+    assert _state(engine.game) == back
@@ -0,0 +1,24 @@
+from src import selfplay
+
+
+def _tasks(count, seed=3, overrides=1):
+    return list(selfplay.make_tasks(
+        count, seed, selfplay.LAYOUTS, selfplay.MAPS, overrides, selfplay.DEFAULT_MAX_TURNS
+    ))
+
+
+def _rows(tasks):
+    return {row["match_id"]: row for row in map(selfplay.run_match, tasks)}
+
+
+def test_match_rows_do_not_depend_on_earlier_matches():
+    selfplay._worker_init([])
+    tasks = _tasks(24)
+    assert _rows(tasks) == _rows(reversed(tasks))
+
+
+def test_override_sweep_does_not_leak_between_matches():
+    selfplay._worker_init([None, {"units": {"SOLDIER": {"atk": 35}}}])
+    tasks = _tasks(16, overrides=2)
+    assert _rows(tasks) == _rows(reversed(tasks))
+    selfplay._worker_init([])
@@ -0,0 +1,41 @@
+from src.game import Game
+from src.snapshot import AutoSaver, load_snapshot, save_snapshot
+
+
+def _state(game):
+    units = [(u.kind, u.team, u.x, u.y, u.hp, u.acted) for u in game.units]
+    return (game.hash, game.turn_team, game.turn_number, game.winner, units)
+
+
+def test_full_snapshot_round_trip_plays_on_identically():
+    game = Game(None, ai_teams=(0, 1), headless=True, seed=4)
+    for _ in range(25):
+        game.update(1000)
+    loaded = load_snapshot(save_snapshot(game), headless=True, ai_teams=(0, 1))
+    assert _state(loaded) == _state(game)
+
+    for _ in range(60):
+        game.update(1000)
+        loaded.update(1000)
+    assert _state(loaded) == _state(game)
+
+
+def test_delta_chain_restores_the_latest_turn(tmp_path):
+    saver = AutoSaver(str(tmp_path), full_every=3)
+    game = Game(None, ai_teams=(0, 1), headless=True, seed=2)
+    turn = None
+    while game.winner is None and game.turn_number <= 8:
+        if game.turn_number != turn and game.animating_unit is None:
+            turn = game.turn_number
+            if turn == 8:
+                # After the last full save, so only a delta carries it.
+                game.set_tile(0, 0, "HILL" if game.grid.tiles[0][0] == "FOREST" else "FOREST")
+            saver.save(game)
+        game.update(1000)
+
+    chain = saver.latest_chain()
+    assert chain[0].endswith(".full") and len(chain) > 1
+    saver.save(game)
+    loaded = saver.load_latest(headless=True, ai_teams=(0, 1))
+    assert _state(loaded) == _state(game)
+    assert loaded.grid.tiles == game.grid.tiles
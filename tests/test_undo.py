@@ -0,0 +1,53 @@
+from src.game import Game
+
+
+def _walk(game):
+    unit = next(u for u in game.units if u.team == game.turn_team)
+    game.try_select(unit.pos())
+    cells = [c for c in game.reachable if c != unit.pos() and game.unit_at(*c) is None]
+    dest = max(cells, key=lambda c: abs(c[0] - unit.x) + abs(c[1] - unit.y))
+    game.try_move_or_attack(dest)
+    return unit, dest
+
+
+def _flags(unit):
+    return (unit.pos(), unit.acted, getattr(unit, "has_moved", False))
+
+
+def test_undo_and_redo_a_move():
+    game = Game(None, ai_teams=(), headless=True)
+    unit = next(u for u in game.units if u.team == game.turn_team)
+    before = (_flags(unit), game.hash)
+    unit, dest = _walk(game)
+    while game.animating_unit is not None:
+        game.update(16)
+    after = (_flags(unit), game.hash)
+    assert unit.pos() == dest
+
+    game.undo_action()
+    assert (_flags(unit), game.hash) == before
+    assert not game.undo.can_undo() and game.undo.can_redo()
+    game.redo_action()
+    assert (_flags(unit), game.hash) == after
+
+
+def test_undo_mid_walk_redoes_the_finished_move():
+    game = Game(None, ai_teams=(), headless=True)
+    unit, dest = _walk(game)
+    game.update(16)
+    assert game.animating_unit is unit
+
+    game.undo_action()
+    assert game.animating_unit is None and not _flags(unit)[2]
+    game.redo_action()
+    # The walk would have ended in an auto-wait or an attack choice.
+    assert unit.pos() == dest and (unit.acted or game.attackables)
+
+
+def test_board_edit_clears_the_history():
+    game = Game(None, ai_teams=(), headless=True)
+    _walk(game)
+    game.settle_walk()
+    assert game.undo.can_undo()
+    game.set_tile(0, 0, game.grid.tiles[0][0])
+    assert not game.undo.can_undo() and not game.undo.can_redo()
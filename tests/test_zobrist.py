@@ -0,0 +1,24 @@
+from src.game import Game
+from src.zobrist import TranspositionTable
+
+
+def test_incremental_hash_matches_full_recompute():
+    game = Game(None, ai_teams=(0, 1), headless=True, seed=1)
+    seen = {game.hash}
+    while game.winner is None and game.turn_number <= 12:
+        game.update(1000)
+        assert game.hash == game.zobrist.full_hash(game.units, game.turn_team)
+        seen.add(game.hash)
+    assert len(seen) > 10
+
+
+def test_table_probe_only_hits_the_stored_key():
+    tt = TranspositionTable(bits=4)
+    tt.store(0x1234, "a")
+    assert tt.probe(0x1234) == "a"
+    # Same slot, different key.
+    assert tt.probe(0x1234 + 16) is None
+    tt.store(0x1234 + 16, "b")
+    assert tt.probe(0x1234) is None
+    stats = tt.stats()
+    assert (stats["probes"], stats["hits"], stats["overwrites"]) == (3, 1, 1)